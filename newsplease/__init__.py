@@ -1,18 +1,41 @@
+import asyncio
 import datetime
+import logging
 import os
 import sys
+import threading
 import urllib
+from multiprocessing import Pool
 
 from bs4.dammit import EncodingDetector
+from lxml import etree
 from six.moves import urllib
 
 sys.path.append(os.path.dirname(os.path.realpath(__file__)))
 
 from newsplease.pipeline.extractor import article_extractor
+from newsplease.pipeline.extractor.parsed_document import ParsedDocument
 from newsplease.crawler.items import NewscrawlerItem
 from dotmap import DotMap
 from newsplease.pipeline.pipelines import ExtractedInformationStorage
-from newsplease.crawler.simple_crawler import SimpleCrawler
+from newsplease.crawler.simple_crawler import SimpleCrawler, DEFAULT_MAX_WORKERS
+from newsplease.crawler.async_crawler import AsyncCrawler, DEFAULT_CONCURRENCY, DEFAULT_LIMIT_PER_HOST
+
+DEFAULT_EXTRACTORS = ('newspaper_extractor', 'readability_extractor', 'date_extractor', 'lang_detect_extractor')
+
+# extractors used in library mode, see NewsPlease.configure
+_extractors = DEFAULT_EXTRACTORS
+
+LOGGER = logging.getLogger(__name__)
+
+# article extractor of a worker process of NewsPlease.from_html_batch
+_batch_extractor = None
+# prefilter of a worker process of NewsPlease.from_warc_batch
+_batch_prefilter = None
+
+# errors of documents that cannot be decoded or parsed. Such documents are extracted as None, all other errors hint at
+# a bug and are raised.
+DOCUMENT_ERRORS = (ValueError, etree.LxmlError)
 
 
 class NewsPlease:
@@ -20,6 +43,20 @@ class NewsPlease:
     Access news-please functionality via this interface
     """
 
+    @staticmethod
+    def configure(extractors=None):
+        """
+        Sets the extractors that are used by all following calls in library mode. The extractors are initialized once
+        per process and reused afterwards; calling this function initializes them right away, so that the first
+        extraction does not have to.
+        :param extractors: List of extractor names, e.g., ['newspaper_extractor', 'date_extractor']. If None, the
+        default extractors are used.
+        :return:
+        """
+        global _extractors
+        _extractors = tuple(extractors) if extractors else DEFAULT_EXTRACTORS
+        article_extractor.get_extractor(_extractors)
+
     @staticmethod
     def from_warc(warc_record):
         """
@@ -27,37 +64,185 @@ class NewsPlease:
         extractor.
         :return:
         """
-        raw_stream = warc_record.raw_stream.read()
+        return NewsPlease.from_warc_payload(*NewsPlease.read_warc_record(warc_record))
+
+    @staticmethod
+    def from_warc_payload(payload, content_type=None, url=None, download_date=None, parsed_document=None):
+        """
+        Extracts relevant information from a WARC record that has already been read, see read_warc_record.
+        :param payload: The raw payload of the record (bytes)
+        :param content_type: The HTTP Content-Type header of the record
+        :param url:
+        :param download_date: The WARC-Date of the record
+        :param parsed_document: The ParsedDocument of the payload, see parse_warc_payload. If given, the payload is not
+        decoded and parsed again.
+        :return:
+        """
+        if parsed_document is None:
+            parsed_document = NewsPlease.parse_warc_payload(payload, content_type)
+        return NewsPlease.from_html(parsed_document.body, url=url, download_date=download_date,
+                                    parsed_document=parsed_document)
+
+    @staticmethod
+    def parse_warc_payload(payload, content_type=None):
+        """
+        Decodes the raw payload of a WARC record into a ParsedDocument, which can be inspected before the extraction,
+        e.g., by a DatePrefilter, and then be passed to from_warc_payload. The html is parsed lazily and at most once.
+        :param payload: The raw payload of the record (bytes)
+        :param content_type: The HTTP Content-Type header of the record
+        :return: A ParsedDocument
+        """
+        return ParsedDocument(NewsPlease._decode_warc_payload(payload, content_type))
+
+    @staticmethod
+    def from_warc_batch(records, processes=None, ordered=True, chunksize=1, skip_errors=False, prefilter=None):
+        """
+        Extracts relevant information from many WARC records using a pool of worker processes, see from_html_batch.
+        The records have to be read before, e.g., by read_warc_record, since warcio records cannot be sent to other
+        processes. Decoding and extraction happen in the workers.
+        :param records: An iterable of (payload, content_type, url, download_date) tuples
+        :param processes: Number of worker processes, if None the number of CPUs is used
+        :param ordered: If True, articles are yielded in the order of records. Else, in the order they are finished.
+        :param chunksize: Number of records sent to a worker at once
+        :param skip_errors: If True, unexpected errors of the extraction are logged and yield (None, None) instead of
+        being raised
+        :param prefilter: An object with a method discard(url, download_date, parsed_document), e.g., a DatePrefilter,
+        that the workers call before the extraction. It is sent to each worker once, so it has to be picklable.
+        :return: A generator of (url, NewsArticle) tuples. The article is None if the record could not be decoded or
+        parsed and False if the prefilter discarded it.
+        """
+        return NewsPlease._extract_documents(records, processes, ordered, chunksize, worker=_extract_warc_payload,
+                                             skip_errors=skip_errors, prefilter=prefilter)
+
+    @staticmethod
+    def read_warc_record(warc_record):
+        """
+        Reads everything the extraction needs from a WARC record into plain values.
+        :param warc_record:
+        :return: A tuple of the raw payload (bytes), the HTTP Content-Type header, the target url and the WARC date
+        """
+        payload = warc_record.raw_stream.read()
+        content_type = None
+        try:
+            content_type = warc_record.http_headers.get_header('Content-Type')
+        except:
+            pass
+        url = warc_record.rec_headers.get_header('WARC-Target-URI')
+        download_date = warc_record.rec_headers.get_header('WARC-Date')
+        return payload, content_type, url, download_date
+
+    @staticmethod
+    def _decode_warc_payload(payload, content_type):
+        """
+        Decodes the raw payload of a WARC record using the charset of the Content-Type header, the encoding declared
+        in the HTML or utf-8.
+        :param payload:
+        :param content_type:
+        :return: The html as string
+        """
         encoding = None
         try:
-            encoding = warc_record.http_headers.get_header('Content-Type').split(';')[1].split('=')[1]
+            encoding = content_type.split(';')[1].split('=')[1]
         except:
             pass
         if not encoding:
-            encoding = EncodingDetector.find_declared_encoding(raw_stream, is_html=True)
+            encoding = EncodingDetector.find_declared_encoding(payload, is_html=True)
         if not encoding:
             # assume utf-8
             encoding = 'utf-8'
 
-        html = raw_stream.decode(encoding)
-        url = warc_record.rec_headers.get_header('WARC-Target-URI')
-        download_date = warc_record.rec_headers.get_header('WARC-Date')
-        article = NewsPlease.from_html(html, url=url, download_date=download_date)
-        return article
-    
+        try:
+            return payload.decode(encoding)
+        except LookupError:
+            raise ValueError('unknown encoding: %s' % encoding)
+
     @staticmethod
-    def from_html(html, url=None, download_date=None):
+    def from_html(html, url=None, download_date=None, parsed_document=None):
         """
         Extracts relevant information from an HTML page given as a string. This function does not invoke scrapy but only
         uses the article extractor. If you have the original URL make sure to provide it as this helps NewsPlease
         to extract the publishing date and title.
         :param html:
         :param url:
+        :param parsed_document: The ParsedDocument of the html, if it has already been created, so that all extractors
+        reuse it
         :return:
         """
-        extractor = article_extractor.Extractor(
-            ['newspaper_extractor', 'readability_extractor', 'date_extractor', 'lang_detect_extractor'])
+        extractor = article_extractor.get_extractor(_extractors)
+        return NewsPlease._extract(extractor, html, url, download_date, parsed_document)
+
+    @staticmethod
+    def from_html_batch(documents, processes=None, ordered=True, chunksize=1):
+        """
+        Extracts relevant information from many HTML pages using a pool of worker processes. Each worker initializes
+        the article extractor only once and reuses it for all documents it processes. Articles are yielded as soon as
+        they are extracted, so the documents are never held in memory all at once.
+        :param documents: An iterable of (html, url, download_date) tuples, url and download_date may be None
+        :param processes: Number of worker processes, if None the number of CPUs is used
+        :param ordered: If True, articles are yielded in the order of documents. Else, in the order they are finished.
+        :param chunksize: Number of documents sent to a worker at once, larger values reduce the IPC overhead
+        :return: A generator of NewsArticle objects. A document that could not be parsed yields None, other errors of
+        the extraction are raised.
+        """
+        for _, article in NewsPlease._extract_documents(documents, processes, ordered, chunksize):
+            yield article
+
+    @staticmethod
+    def _extract_documents(documents, processes=None, ordered=True, chunksize=1, worker=None, skip_errors=False,
+                           prefilter=None):
+        """
+        Extracts (html, url, download_date) tuples on a pool of worker processes, see from_html_batch.
+        :param worker: The function extracting a single document in a worker process, _extract_batch_document if None
+        :param skip_errors: If True, unexpected errors of the extraction are logged and yield (None, None) instead of
+        being raised
+        :param prefilter: The prefilter of the workers, see from_warc_batch
+        :return: A generator of (url, NewsArticle) tuples. The article is None if the html is None or could not be
+        parsed.
+        """
+        # Pool.imap reads its input as fast as it can, so limit the number of documents that are in flight
+        pending = threading.Semaphore(2 * (processes or os.cpu_count() or 1) * chunksize)
+        stopped = threading.Event()
 
+        def feed():
+            for document in documents:
+                pending.acquire()
+                if stopped.is_set():
+                    return
+                yield document
+
+        with Pool(processes, initializer=_init_batch_worker, initargs=(_extractors, prefilter)) as pool:
+            imap = pool.imap if ordered else pool.imap_unordered
+            results = imap(worker or _extract_batch_document, feed(), chunksize)
+            try:
+                while True:
+                    try:
+                        result = next(results)
+                    except StopIteration:
+                        break
+                    except Exception:
+                        # the iterator of the pool is still usable after an error of a single document
+                        if not skip_errors:
+                            raise
+                        LOGGER.exception('extraction failed')
+                        result = None, None
+                    pending.release()
+                    yield result
+            finally:
+                # wake up the feeding thread in case the caller stopped iterating early
+                stopped.set()
+                pending.release()
+
+    @staticmethod
+    def _extract(extractor, html, url=None, download_date=None, parsed_document=None):
+        """
+        Runs the given article extractor on an HTML page and converts the result into a NewsArticle.
+        :param extractor: An article_extractor.Extractor
+        :param html:
+        :param url:
+        :param download_date:
+        :param parsed_document: The ParsedDocument of the html, if it has already been created
+        :return: A NewsArticle object
+        """
         title_encoded = ''.encode()
         if not url:
             url = ''
@@ -76,6 +261,11 @@ class NewsPlease:
         item['filename'] = filename
         item['download_date'] = download_date
         item['modified_date'] = download_date
+        # only added by the pipeline of the crawler
+        item['entities'] = None
+        item['count_comment'] = None
+        if parsed_document is not None:
+            item['parsed_document'] = parsed_document
         item = extractor.extract(item)
         
         tmp_article = ExtractedInformationStorage.extract_relevant_info(item)
@@ -98,13 +288,19 @@ class NewsPlease:
             return None
 
     @staticmethod
-    def from_urls(urls, timeout=None):
+    def from_urls(urls, timeout=None, concurrency=None):
         """
         Crawls articles from the urls and extracts relevant information.
         :param urls:
         :param timeout: in seconds, if None, the urllib default is used
-        :return: A dict containing given URLs as keys, and extracted information as corresponding values.
+        :param concurrency: if set, the urls are downloaded by from_urls_async with at most this many downloads at a
+        time. Must not be used from within a running event loop, await from_urls_async there instead.
+        :return: A dict containing given URLs as keys, and extracted information (or None if the download failed) as
+        corresponding values.
         """
+        if concurrency:
+            return asyncio.run(NewsPlease.from_urls_async(urls, timeout=timeout, concurrency=concurrency))
+
         results = {}
         download_date = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
 
@@ -115,14 +311,63 @@ class NewsPlease:
         elif len(urls) == 1:
             url = urls[0]
             html = SimpleCrawler.fetch_url(url, timeout=timeout)
-            results[url] = NewsPlease.from_html(html, url, download_date)
+            results[url] = NewsPlease.from_html(html, url, download_date) if html is not None else None
         else:
-            results = SimpleCrawler.fetch_urls(urls)
+            results = SimpleCrawler.fetch_urls(urls, timeout=timeout)
             for url in results:
-                results[url] = NewsPlease.from_html(results[url], url, download_date)
+                if results[url] is not None:
+                    results[url] = NewsPlease.from_html(results[url], url, download_date)
 
         return results
 
+    @staticmethod
+    async def from_urls_async(urls, timeout=None, concurrency=DEFAULT_CONCURRENCY, limit_per_host=DEFAULT_LIMIT_PER_HOST):
+        """
+        Crawls articles from the urls on the running event loop and extracts relevant information. All downloads share
+        a pool of keep-alive connections and a DNS cache. Requires aiohttp.
+        :param urls:
+        :param timeout: in seconds per url, if None there is no limit
+        :param concurrency: maximum number of downloads at a time
+        :param limit_per_host: maximum number of connections to a single host
+        :return: A dict containing given URLs as keys, and extracted information (or None if the download failed) as
+        corresponding values.
+        """
+        download_date = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        crawler = AsyncCrawler(concurrency=concurrency, limit_per_host=limit_per_host, timeout=timeout)
+        results = await crawler.fetch_urls(urls)
+
+        # the extraction is CPU bound, run it outside of the event loop to keep the loop responsive
+        loop = asyncio.get_running_loop()
+        urls_downloaded = [url for url, html in results.items() if html is not None]
+        articles = await asyncio.gather(*[loop.run_in_executor(None, NewsPlease.from_html, results[url], url,
+                                                               download_date) for url in urls_downloaded])
+        results.update(zip(urls_downloaded, articles))
+
+        return results
+
+    @staticmethod
+    def iter_urls(urls, timeout=None, download_workers=DEFAULT_MAX_WORKERS, extraction_processes=None,
+                  queue_size=None):
+        """
+        Crawls articles from the urls and extracts relevant information, overlapping both: while a pool of download
+        threads fetches the next urls, a pool of worker processes extracts the ones already downloaded. The queue
+        between both stages is bounded, so downloading pauses if the extraction cannot keep up.
+        :param urls:
+        :param timeout: in seconds, if None, the urllib default is used
+        :param download_workers: maximum number of downloads at a time
+        :param extraction_processes: number of extraction processes, if None the number of CPUs is used
+        :param queue_size: maximum number of downloads, running or finished, that wait for their extraction. If None,
+        twice the number of download workers.
+        :return: A generator of (url, NewsArticle) tuples in the order they are finished. The article is None if the url
+        could not be downloaded or extracted.
+        """
+        download_date = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        with SimpleCrawler(max_workers=download_workers, timeout=timeout) as crawler:
+            downloads = crawler.iter_urls(urls, max_pending=queue_size or 2 * download_workers)
+            documents = ((html, url, download_date) for url, html in downloads)
+            for url, article in NewsPlease._extract_documents(documents, extraction_processes, ordered=False):
+                yield url, article
+
     @staticmethod
     def from_file(path):
         """
@@ -136,3 +381,56 @@ class NewsPlease:
         urls = list(filter(None, content))
 
         return NewsPlease.from_urls(urls)
+
+
+def _init_batch_worker(extractors, prefilter=None):
+    """
+    Initializes the article extractor of a worker process of NewsPlease.from_html_batch
+    :param extractors: The extractors configured in the parent process
+    :param prefilter: The prefilter of NewsPlease.from_warc_batch, if any
+    """
+    global _batch_extractor, _batch_prefilter
+    _batch_extractor = article_extractor.get_extractor(extractors)
+    _batch_prefilter = prefilter
+
+
+def _extract_batch_document(document):
+    """
+    Extracts a single (html, url, download_date) tuple within a worker process of NewsPlease.from_html_batch
+    :param document:
+    :return: A tuple of the url and a NewsArticle object, or None if there is no html or it could not be parsed
+    """
+    html, url, download_date = document
+    if html is None:
+        return url, None
+    try:
+        return url, NewsPlease._extract(_batch_extractor, html, url=url, download_date=download_date)
+    except DOCUMENT_ERRORS as error:
+        LOGGER.warning('document could not be parsed: %s (%r)', url, error)
+        return url, None
+    except Exception:
+        LOGGER.exception('extraction failed: %s', url)
+        raise
+
+
+def _extract_warc_payload(record):
+    """
+    Extracts a single (payload, content_type, url, download_date) tuple within a worker process of
+    NewsPlease.from_warc_batch
+    :param record:
+    :return: A tuple of the url and a NewsArticle object, None if the record could not be decoded or parsed or False if
+    the prefilter discarded it
+    """
+    payload, content_type, url, download_date = record
+    try:
+        document = NewsPlease.parse_warc_payload(payload, content_type)
+        if _batch_prefilter is not None and _batch_prefilter.discard(url, download_date, document):
+            return url, False
+        return url, NewsPlease._extract(_batch_extractor, document.body, url=url, download_date=download_date,
+                                        parsed_document=document)
+    except DOCUMENT_ERRORS as error:
+        LOGGER.warning('record could not be decoded or parsed: %s (%r)', url, error)
+        return url, None
+    except Exception:
+        LOGGER.exception('extraction failed: %s', url)
+        raise
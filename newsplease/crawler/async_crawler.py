@@ -0,0 +1,112 @@
+import asyncio
+import logging
+
+from .response_decoder import decode_content
+from .simple_crawler import CHUNK_SIZE, HEADERS, MAX_FILE_SIZE, MIN_FILE_SIZE, is_html_content_type, is_too_large
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+LOGGER = logging.getLogger(__name__)
+
+# unlike SimpleCrawler, connections are kept alive and reused
+ASYNC_HEADERS = {key: value for key, value in HEADERS.items() if key != 'Connection'}
+
+# maximum number of downloads at a time, across all hosts
+DEFAULT_CONCURRENCY = 32
+# maximum number of connections to a single host
+DEFAULT_LIMIT_PER_HOST = 4
+# seconds resolved host names are cached
+DEFAULT_DNS_CACHE_TTL = 300
+
+
+class AsyncCrawler(object):
+    """
+    Downloads the html content of many urls concurrently on an asyncio event loop. All downloads share one pool of
+    keep-alive connections and a DNS cache; the number of concurrent downloads is bounded globally and per host.
+    """
+
+    def __init__(self, concurrency=DEFAULT_CONCURRENCY, limit_per_host=DEFAULT_LIMIT_PER_HOST, timeout=None,
+                 dns_cache_ttl=DEFAULT_DNS_CACHE_TTL):
+        """
+        :param concurrency: maximum number of downloads at a time
+        :param limit_per_host: maximum number of connections to a single host, 0 for no limit
+        :param timeout: in seconds per url, if None there is no limit
+        :param dns_cache_ttl: in seconds, if None resolved host names are cached forever
+        """
+        if aiohttp is None:
+            raise ModuleNotFoundError("Using AsyncCrawler requires aiohttp")
+        self.concurrency = concurrency
+        self.limit_per_host = limit_per_host
+        self.timeout = timeout
+        self.dns_cache_ttl = dns_cache_ttl
+
+    def create_session(self):
+        """
+        Creates the client session all downloads share. It has to be created within a running event loop.
+        :return: aiohttp.ClientSession
+        """
+        connector = aiohttp.TCPConnector(limit=self.concurrency, limit_per_host=self.limit_per_host,
+                                         ttl_dns_cache=self.dns_cache_ttl, ssl=False)
+        return aiohttp.ClientSession(connector=connector, headers=ASYNC_HEADERS,
+                                     timeout=aiohttp.ClientTimeout(total=self.timeout))
+
+    async def fetch_url(self, session, url):
+        """
+        Crawls the html content of the parameter url
+        :param session: the client session, see create_session
+        :param url:
+        :return: html of the url or None
+        """
+        try:
+            async with session.get(url, allow_redirects=True) as response:
+                if response.status != 200:
+                    LOGGER.error('not a 200 response: %s', response.status)
+                    return None
+                if not is_html_content_type(response.headers.get('Content-Type')):
+                    LOGGER.error('not html: %s %s', url, response.headers.get('Content-Type'))
+                    return None
+                if is_too_large(response.headers.get('Content-Length')):
+                    LOGGER.error('too large: %s %s', url, response.headers.get('Content-Length'))
+                    return None
+
+                # read by streaming chunks so we can stop downloading as soon as MAX_FILE_SIZE is reached
+                content = bytearray()
+                async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                    content.extend(chunk)
+                    if len(content) > MAX_FILE_SIZE:
+                        LOGGER.error('too large: %s', url)
+                        return None
+                encoding = response.charset
+        except aiohttp.InvalidURL:
+            LOGGER.error('malformed URL: %s', url)
+        except aiohttp.TooManyRedirects:
+            LOGGER.error('too many redirects: %s', url)
+        except aiohttp.ClientSSLError as err:
+            LOGGER.error('SSL: %s %s', url, err)
+        except (aiohttp.ClientError, asyncio.TimeoutError, OSError) as err:
+            LOGGER.error('connection/timeout error: %s %s', url, err)
+        else:
+            if len(content) < MIN_FILE_SIZE:
+                LOGGER.error('too small/incorrect: %s %s', url, len(content))
+            else:
+                return decode_content(bytes(content), encoding)
+        return None
+
+    async def fetch_urls(self, urls):
+        """
+        Crawls the html content of all given urls concurrently. Returns when all requests are processed.
+        :param urls:
+        :return: A dict containing given URLs as keys, and their html or None as corresponding values.
+        """
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def fetch(session, url):
+            async with semaphore:
+                return url, await self.fetch_url(session, url)
+
+        async with self.create_session() as session:
+            results = await asyncio.gather(*[fetch(session, url) for url in urls])
+        return dict(results)
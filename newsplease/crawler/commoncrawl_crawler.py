@@ -6,41 +6,42 @@ not otherwise specified.
 """
 import logging
 import os
-import subprocess
-import time
 from functools import partial
-from multiprocessing import Pool
-import datetime
+from multiprocessing import Pool, Queue, TimeoutError
+from queue import Empty
 
 from dateutil import parser
 from scrapy.utils.log import configure_logging
 
 from ..crawler.commoncrawl_extractor import CommonCrawlExtractor
+from ..crawler.commoncrawl_index import CC_BASE_URL, DEFAULT_CACHE_TTL, CommonCrawlNewsIndex
+from ..crawler.commoncrawl_state import DEFAULT_STATE_FILENAME, ExtractionStateStore
+from ..crawler.commoncrawl_statistics import FORMAT_JSON, ExtractionStatistics
 
 __author__ = "Felix Hamborg"
 __copyright__ = "Copyright 2017"
 __credits__ = ["Sebastian Nagel"]
 
 # commoncrawl.org
-__cc_base_url = 'https://commoncrawl.s3.amazonaws.com/'
+__cc_base_url = CC_BASE_URL
 
-# log file of fully extracted WARC files
-__log_pathname_fully_extracted_warcs = None
+# download dir for warc files
+__local_download_dir_warc = None
+
+# database of fully and partially extracted WARC files
+__state_pathname = None
 
 # logging
 logging.basicConfig(level=logging.INFO)
 __logger = logging.getLogger(__name__)
 
-__number_of_warc_files_on_cc = 0
-
 __extern_callback_on_warc_completed = None
-__counter_article_passed = 0
-__counter_article_discarded = 0
-__counter_article_error = 0
-__counter_article_total = 0
-__counter_warc_skipped = 0
-__counter_warc_processed = 0
-__start_time = time.time()
+# statistics of all extraction processes, only updated in the main process
+__statistics = None
+# queue of the metrics that the extraction processes report while they extract a WARC file, see __put_progress
+__progress_queue = None
+# seconds the main process waits for a WARC file to complete before it reads the progress of the extraction processes
+__progress_poll_interval = 1
 
 
 def __setup(local_download_dir_warc, log_level):
@@ -51,8 +52,16 @@ def __setup(local_download_dir_warc, log_level):
     if not os.path.exists(local_download_dir_warc):
         os.makedirs(local_download_dir_warc)
 
-    global __log_pathname_fully_extracted_warcs
-    __log_pathname_fully_extracted_warcs = os.path.join(local_download_dir_warc, 'fullyextractedwarcs.list')
+    global __local_download_dir_warc
+    __local_download_dir_warc = local_download_dir_warc
+
+    global __state_pathname
+    __state_pathname = os.path.join(local_download_dir_warc, DEFAULT_STATE_FILENAME)
+
+    # import the log file of fully extracted WARC files of previous versions
+    state_store = ExtractionStateStore(__state_pathname)
+    state_store.import_fully_extracted_list(os.path.join(local_download_dir_warc, 'fullyextractedwarcs.list'))
+    state_store.close()
 
     # make loggers quite
     configure_logging({"LOG_LEVEL": "ERROR"})
@@ -90,121 +99,90 @@ def __get_download_url(name):
     """
     return __cc_base_url + name
 
-def __iterate_by_month(start_date, end_date, month_step=1):
-    current_date = start_date
-    while current_date < end_date:
-        yield current_date
-        carry, new_month = divmod(current_date.month - 1 + month_step, 12)
-        new_month += 1
-        current_date = current_date.replace(year=current_date.year + carry,
-                                            month=new_month)
-
-
-def __get_remote_index(warc_files_start_date):
+def __get_remote_index(warc_files_start_date, index_source=None, index_cache_ttl=DEFAULT_CACHE_TTL):
     """
     Gets the index of news crawl files from commoncrawl.org and returns an array of names
+    :param warc_files_start_date: if None, all files of the news crawl are listed
+    :param index_source: see CommonCrawlNewsIndex
+    :param index_cache_ttl: see CommonCrawlNewsIndex
     :return:
     """
-    temp_filename = ".tmpaws.txt"
-
-    if os.name == 'nt':
-        awk_parameter = '"{ print $4 }"'
-    else:
-        awk_parameter = "'{ print $4 }'"
+    cc_news_index = CommonCrawlNewsIndex(source=index_source,
+                                         cache_dir=os.path.join(__local_download_dir_warc, 'index'),
+                                         cache_ttl=index_cache_ttl)
+    return cc_news_index.get_warc_paths(warc_files_start_date)
 
-    # get the remote info
 
-    cmd = ''
-    if warc_files_start_date:
-        # cleanup
-        try:
-            os.remove(temp_filename)
-        except OSError:
-            pass
-
-        warc_dates = __iterate_by_month(warc_files_start_date, datetime.datetime.today())
-        for date in warc_dates:
-            year = date.strftime('%Y')
-            month = date.strftime('%m')
-            cmd += "aws s3 ls --recursive s3://commoncrawl/crawl-data/CC-NEWS/%s/%s/ --no-sign-request >> %s && " % (year, month, temp_filename)
-
-    else:
-        cmd = "aws s3 ls --recursive s3://commoncrawl/crawl-data/CC-NEWS/ --no-sign-request > %s && " % temp_filename
+def __get_fully_extracted_warc_urls():
+    """
+    Reads the urls of all previously, fully extracted WARC files
+    :return: A set of urls
+    """
+    state_store = ExtractionStateStore(__state_pathname)
+    try:
+        return state_store.get_fully_extracted_warc_urls()
+    finally:
+        state_store.close()
 
-    cmd += "awk %s %s " % (awk_parameter, temp_filename)
 
-    __logger.info('executing: %s', cmd)
-    exitcode, stdout_data = subprocess.getstatusoutput(cmd)
+def __callback_on_warc_completed(metrics):
+    """
+    Internal callback on completion of one WARC file, invoked in the main process with the metrics reported by the
+    extraction process. Calculating some statistics on processing speed.
+    :param metrics: see CommonCrawlExtractor.get_metrics
+    :return:
+    """
+    if not metrics:
+        return
+    __statistics.add(metrics)
 
-    if exitcode > 0:
-        raise Exception(stdout_data)
+    # invoke the external callback
+    if __extern_callback_on_warc_completed:
+        snapshot = __statistics.snapshot()
+        __extern_callback_on_warc_completed(metrics['warc_url'], snapshot['articles_passed'],
+                                            snapshot['articles_discarded'], snapshot['articles_error'],
+                                            snapshot['articles_total'], snapshot['warc_files_processed'])
 
-    try:
-        os.remove(temp_filename)
-    except OSError:
-        pass
 
-    lines = stdout_data.splitlines()
-    return lines
+def __callback_on_progress(metrics):
+    """
+    Internal callback on the progress within one WARC file, invoked in the main process
+    :param metrics: see CommonCrawlExtractor.get_metrics
+    :return:
+    """
+    __statistics.update(metrics)
 
 
-def __get_list_of_fully_extracted_warc_urls():
+def __init_extraction_process(progress_queue):
     """
-    Reads in the log file that contains a list of all previously, fully extracted WARC urls
+    Initializes an extraction process of the pool
+    :param progress_queue: queue to the main process
     :return:
     """
-    if not os.path.isfile(__log_pathname_fully_extracted_warcs):
-        return []
+    global __progress_queue
+    __progress_queue = progress_queue
 
-    with open(__log_pathname_fully_extracted_warcs) as log_file:
-        list_warcs = log_file.readlines()
-    # remove break lines
-    list_warcs = [x.strip() for x in list_warcs]
 
-    return list_warcs
+def __put_progress(metrics):
+    """
+    Sends the progress within one WARC file from an extraction process to the main process
+    :param metrics: see CommonCrawlExtractor.get_metrics
+    :return:
+    """
+    __progress_queue.put(metrics)
 
 
-def __callback_on_warc_completed(warc_path, counter_article_passed, counter_article_discarded, counter_article_error,
-                                 counter_article_total):
+def __read_progress(progress_queue):
     """
-    Internal callback on completion of one WARC file. Calculating some statistics on processing speed.
-    :param warc_path:
-    :param counter_article_passed:
-    :param counter_article_discarded:
-    :param counter_article_error:
-    :param counter_article_total:
+    Passes all progress that the extraction processes have sent so far to the statistics
+    :param progress_queue:
     :return:
     """
-    # have to use the global keyword in order to assign a value to a global variable (see https://stackoverflow.com/a/9936482)
-    global __counter_article_passed
-    global __counter_article_discarded
-    global __counter_article_error
-    global __counter_article_total
-    global __counter_warc_processed
-    # global __counter_warc_skipped
-
-    elapsed_secs = time.time() - __start_time
-
-    __counter_article_discarded += counter_article_discarded
-    __counter_article_error += counter_article_error
-    __counter_article_passed += counter_article_passed
-    __counter_article_total += counter_article_total
-    __counter_warc_processed += 1
-
-    sec_per_article = elapsed_secs / counter_article_total
-    h_per_warc = elapsed_secs / __counter_warc_processed / 3600
-    remaining_warcs = __number_of_warc_files_on_cc - (__counter_warc_processed + __counter_warc_skipped)
-
-    __logger.info("warc processing statistics")
-    __logger.info("warc files skipped = %i, processed = %i, remaining = %i, total = %i", __counter_warc_skipped,
-                  __counter_warc_processed, remaining_warcs, __number_of_warc_files_on_cc)
-    __logger.info("global [s/article] = %f", sec_per_article)
-    __logger.info("global [h/warc] = %.3f", h_per_warc)
-    __logger.info("estimated remaining time [h] = %f", remaining_warcs / h_per_warc)
-
-    # invoke the external callback
-    __extern_callback_on_warc_completed(warc_path, __counter_article_passed, __counter_article_discarded,
-                                        __counter_article_error, __counter_article_total, __counter_warc_processed)
+    while True:
+        try:
+            __callback_on_progress(progress_queue.get_nowait())
+        except Empty:
+            return
 
 
 def __start_commoncrawl_extractor(warc_download_url, callback_on_article_extracted=None,
@@ -216,7 +194,9 @@ def __start_commoncrawl_extractor(warc_download_url, callback_on_article_extract
                                   log_level=logging.ERROR,
                                   delete_warc_after_extraction=True,
                                   continue_process=True,
-                                  log_pathname_fully_extracted_warcs=None):
+                                  state_pathname=None,
+                                  stream_warc=False, record_extraction_processes=1, keep_record_order=True,
+                                  prefilter_date=True, sink=None, callback_on_progress=None):
     """
     Starts a single CommonCrawlExtractor
     :param warc_download_url:
@@ -231,7 +211,13 @@ def __start_commoncrawl_extractor(warc_download_url, callback_on_article_extract
     :param continue_after_error:
     :param show_download_progress:
     :param log_level:
-    :return:
+    :param stream_warc:
+    :param record_extraction_processes:
+    :param keep_record_order:
+    :param prefilter_date:
+    :param sink:
+    :param callback_on_progress:
+    :return: The metrics of the WARC file, see CommonCrawlExtractor.get_metrics
     """
     commoncrawl_extractor = CommonCrawlExtractor()
     commoncrawl_extractor.extract_from_commoncrawl(warc_download_url, callback_on_article_extracted,
@@ -245,7 +231,14 @@ def __start_commoncrawl_extractor(warc_download_url, callback_on_article_extract
                                                    show_download_progress=show_download_progress,
                                                    log_level=log_level,
                                                    delete_warc_after_extraction=delete_warc_after_extraction,
-                                                   log_pathname_fully_extracted_warcs=__log_pathname_fully_extracted_warcs)
+                                                   state_pathname=state_pathname,
+                                                   stream_warc=stream_warc,
+                                                   record_extraction_processes=record_extraction_processes,
+                                                   keep_record_order=keep_record_order,
+                                                   prefilter_date=prefilter_date,
+                                                   sink=sink,
+                                                   callback_on_progress=callback_on_progress)
+    return commoncrawl_extractor.get_metrics()
 
 
 def crawl_from_commoncrawl(callback_on_article_extracted, callback_on_warc_completed=None, valid_hosts=None,
@@ -253,7 +246,10 @@ def crawl_from_commoncrawl(callback_on_article_extracted, callback_on_warc_compl
                            reuse_previously_downloaded_files=True, local_download_dir_warc=None, 
                            continue_after_error=True, show_download_progress=False,
                            number_of_extraction_processes=4, log_level=logging.ERROR,
-                           delete_warc_after_extraction=True, continue_process=True):
+                           delete_warc_after_extraction=True, continue_process=True, stream_warc=False,
+                           record_extraction_processes=1, keep_record_order=True, prefilter_date=True,
+                           index_source=None, index_cache_ttl=DEFAULT_CACHE_TTL, statistics_pathname=None,
+                           statistics_format=FORMAT_JSON, sink=None):
     """
     Crawl and extract articles form the news crawl provided by commoncrawl.org. For each article that was extracted
     successfully the callback function callback_on_article_extracted is invoked where the first parameter is the
@@ -271,6 +267,24 @@ def crawl_from_commoncrawl(callback_on_article_extracted, callback_on_warc_compl
     :param continue_after_error:
     :param show_download_progress:
     :param log_level:
+    :param stream_warc: if True, WARC files are extracted while they are downloaded instead of being saved to
+    local_download_dir_warc first. A WARC file whose extraction was interrupted is resumed from its last checkpoint.
+    :param record_extraction_processes: if greater than 1, the records of each WARC file are extracted by a pool of this
+    many processes. WARC files are then processed one after another, i.e., number_of_extraction_processes is ignored.
+    :param keep_record_order: if True, articles extracted by several processes are passed to
+    callback_on_article_extracted in the order of their records. Else, in the order they are finished.
+    :param prefilter_date: if True and a date range is set, records whose WARC-Date or date found by the DateExtractor
+    show that they were published outside of the range are discarded without running the other extractors
+    :param index_source: where the monthly lists of WARC files are read from, if None from commoncrawl.org. A string is
+    used as local directory of the same layout as commoncrawl.org, see CommonCrawlNewsIndex.
+    :param index_cache_ttl: seconds the list of WARC files of the current month is cached in local_download_dir_warc
+    :param statistics_pathname: if set, the statistics of all extraction processes (throughput, time per stage,
+    estimated remaining time) are written to this file after each WARC file and every few seconds while WARC files
+    are extracted
+    :param statistics_format: 'json' or 'prometheus' (text format, e.g., for the textfile collector of node exporter)
+    :param sink: if set, all articles that pass the filter criteria are written in batches to this ArticleSink, e.g.,
+    JsonLinesSink('./cc_download_articles'). Each extraction process writes files of its own. Then,
+    callback_on_article_extracted may be None.
     :return:
     """
     __setup(local_download_dir_warc, log_level)
@@ -278,15 +292,13 @@ def crawl_from_commoncrawl(callback_on_article_extracted, callback_on_warc_compl
     global __extern_callback_on_warc_completed
     __extern_callback_on_warc_completed = callback_on_warc_completed
 
-    cc_news_crawl_names = __get_remote_index(warc_files_start_date)
-    global __number_of_warc_files_on_cc
-    __number_of_warc_files_on_cc = len(cc_news_crawl_names)
-    __logger.info('found %i files at commoncrawl.org', __number_of_warc_files_on_cc)
+    cc_news_crawl_names = __get_remote_index(warc_files_start_date, index_source, index_cache_ttl)
+    __logger.info('found %i files at commoncrawl.org', len(cc_news_crawl_names))
 
     # multiprocessing (iterate the list of crawl_names, and for each: download and process it)
     __logger.info('creating extraction process pool with %i processes', number_of_extraction_processes)
     warc_download_urls = []
-    fully_extracted_warc_urls = __get_list_of_fully_extracted_warc_urls()
+    fully_extracted_warc_urls = __get_fully_extracted_warc_urls()
     for name in cc_news_crawl_names:
         warc_download_url = __get_download_url(name)
         if continue_process:
@@ -294,9 +306,6 @@ def crawl_from_commoncrawl(callback_on_article_extracted, callback_on_warc_compl
             # been changed!)
             if warc_download_url in fully_extracted_warc_urls:
                 __logger.info('skipping WARC because fully extracted: %s' % warc_download_url)
-                global __counter_warc_skipped
-                __counter_warc_skipped += 1
-                pass
             else:
                 warc_download_urls.append(warc_download_url)
 
@@ -304,35 +313,55 @@ def crawl_from_commoncrawl(callback_on_article_extracted, callback_on_warc_compl
             # if not continue process, then always add
             warc_download_urls.append(warc_download_url)
 
+    global __statistics
+    __statistics = ExtractionStatistics(len(cc_news_crawl_names),
+                                        len(cc_news_crawl_names) - len(warc_download_urls),
+                                        pathname=statistics_pathname, export_format=statistics_format)
+
+    # the processes of a Pool cannot start processes of their own, so parallelize either across or within WARC files
+    if record_extraction_processes > 1 and number_of_extraction_processes > 1:
+        __logger.info('extracting the records of one WARC file at a time with %i processes, ignoring '
+                      'number_of_extraction_processes', record_extraction_processes)
+        number_of_extraction_processes = 1
+
+    extract_warc = partial(__start_commoncrawl_extractor,
+                           callback_on_article_extracted=callback_on_article_extracted,
+                           valid_hosts=valid_hosts,
+                           start_date=start_date, end_date=end_date,
+                           strict_date=strict_date,
+                           reuse_previously_downloaded_files=reuse_previously_downloaded_files,
+                           local_download_dir_warc=local_download_dir_warc,
+                           continue_after_error=continue_after_error,
+                           show_download_progress=show_download_progress,
+                           log_level=log_level,
+                           delete_warc_after_extraction=delete_warc_after_extraction,
+                           state_pathname=__state_pathname,
+                           stream_warc=stream_warc,
+                           record_extraction_processes=record_extraction_processes,
+                           keep_record_order=keep_record_order,
+                           prefilter_date=prefilter_date,
+                           sink=sink)
+
     # run the crawler in the current, single process if number of extraction processes is set to 1
     if number_of_extraction_processes > 1:
-        with Pool(number_of_extraction_processes) as extraction_process_pool:
-            extraction_process_pool.map(partial(__start_commoncrawl_extractor,
-                                                callback_on_article_extracted=callback_on_article_extracted,
-                                                callback_on_warc_completed=__callback_on_warc_completed,
-                                                valid_hosts=valid_hosts,
-                                                start_date=start_date, end_date=end_date,
-                                                strict_date=strict_date,
-                                                reuse_previously_downloaded_files=reuse_previously_downloaded_files,
-                                                local_download_dir_warc=local_download_dir_warc,
-                                                continue_after_error=continue_after_error,
-                                                show_download_progress=show_download_progress,
-                                                log_level=log_level,
-                                                delete_warc_after_extraction=delete_warc_after_extraction,
-                                                log_pathname_fully_extracted_warcs=__log_pathname_fully_extracted_warcs),
-                                        warc_download_urls)
+        progress_queue = Queue()
+        with Pool(number_of_extraction_processes, initializer=__init_extraction_process,
+                  initargs=(progress_queue,)) as extraction_process_pool:
+            # each process sends the metrics of its WARC file while extracting it and returns them once it is
+            # completed, so that the statistics are aggregated here
+            results = extraction_process_pool.imap_unordered(partial(extract_warc,
+                                                                     callback_on_progress=__put_progress),
+                                                             warc_download_urls)
+            while True:
+                try:
+                    metrics = results.next(timeout=__progress_poll_interval)
+                except TimeoutError:
+                    __read_progress(progress_queue)
+                    continue
+                except StopIteration:
+                    break
+                __read_progress(progress_queue)
+                __callback_on_warc_completed(metrics)
     else:
         for warc_download_url in warc_download_urls:
-            __start_commoncrawl_extractor(warc_download_url,
-                                          callback_on_article_extracted=callback_on_article_extracted,
-                                          callback_on_warc_completed=__callback_on_warc_completed,
-                                          valid_hosts=valid_hosts,
-                                          start_date=start_date, end_date=end_date,
-                                          strict_date=strict_date,
-                                          reuse_previously_downloaded_files=reuse_previously_downloaded_files,
-                                          local_download_dir_warc=local_download_dir_warc,
-                                          continue_after_error=continue_after_error,
-                                          show_download_progress=show_download_progress,
-                                          log_level=log_level,
-                                          delete_warc_after_extraction=delete_warc_after_extraction,
-                                          log_pathname_fully_extracted_warcs=__log_pathname_fully_extracted_warcs)
+            __callback_on_warc_completed(extract_warc(warc_download_url, callback_on_progress=__callback_on_progress))
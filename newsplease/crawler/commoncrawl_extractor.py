@@ -2,11 +2,11 @@
 """
 Provides functionality to crawl and extract news articles from a single WARC file from commoncrawl.org. Filter criteria, such as publish date
 and host list, can be defined. Currently, the WARC file will be downloaded to the path WORKINGDIR/cc_download_warc, if
-not otherwise specified.
+not otherwise specified, or, if streaming is enabled, extracted directly from the HTTP response.
 """
+import collections
 import logging
 import os
-import subprocess
 import sys
 import time
 
@@ -18,6 +18,9 @@ from six.moves import urllib
 from warcio.archiveiterator import ArchiveIterator
 
 from .. import NewsPlease
+from .commoncrawl_index import CC_BASE_URL
+from .commoncrawl_state import DEFAULT_STATE_FILENAME, ExtractionStateStore
+from .record_filter import DatePrefilter, HostMatcher
 
 __author__ = "Felix Hamborg"
 __copyright__ = "Copyright 2017"
@@ -37,6 +40,12 @@ class CommonCrawlExtractor:
     __filter_end_date = None
     # if date filtering is string, e.g., if we could not detect the date of an article, we will discard the article
     __filter_strict_date = True
+    # if True, records whose date is outside of the date range are discarded before extracting the article, see
+    # DatePrefilter
+    __prefilter_date = True
+    # compiled filters, see __setup
+    __host_matcher = None
+    __date_prefilter = None
     # if True, the script checks whether a file has been downloaded already and uses that file instead of downloading
     # again. Note that there is no check whether the file has been downloaded completely or is valid!
     __reuse_previously_downloaded_files = True
@@ -45,16 +54,39 @@ class CommonCrawlExtractor:
     # log level
     __log_level = logging.INFO
     __delete_warc_after_extraction = True
-    __log_pathname_fully_extracted_warcs = None
+    # path name of the database of fully and partially extracted WARC files, see ExtractionStateStore
+    __state_pathname = None
+    __state_store = None
+    # if True, the WARC file is extracted while it is downloaded instead of being saved to disk first
+    __stream_warc = False
+    # number of records after which the position in a WARC file is saved, so that it can be resumed
+    __checkpoint_interval = 100
+    # number of processes extracting the records of the WARC file, if 1 the records are extracted by this process
+    __record_extraction_processes = 1
+    # if True, articles extracted by several processes are passed to the callback in the order of their records
+    __keep_record_order = True
+
+    # seconds spent per stage (download, read, filter, extract, callback), number of records and bytes read
+    __stage_seconds = None
+    __counter_record = 0
+    __counter_bytes = 0
+    # metrics of the completed WARC file, see get_metrics
+    __metrics = None
 
     # commoncrawl.org
-    __cc_base_url = 'https://commoncrawl.s3.amazonaws.com/'
-    __cc_news_crawl_names = None
+    __cc_base_url = CC_BASE_URL
 
     # event handler called when an article was extracted successfully and passed all filter criteria
     __callback_on_article_extracted = None
+    # batched output of the articles that passed all filter criteria, see commoncrawl_sinks
+    __sink = None
     # event handler called when a warc file is fully processed
     __callback_on_warc_completed = None
+    # event handler called regularly with the metrics of the warc file while it is processed
+    __callback_on_progress = None
+    # seconds between two calls of __callback_on_progress
+    __progress_interval = 10
+    __last_progress_time = 0
     # if the download progress is shown
     __show_download_progress = False
 
@@ -70,6 +102,18 @@ class CommonCrawlExtractor:
         if not os.path.exists(self.__local_download_dir_warc):
             os.makedirs(self.__local_download_dir_warc)
 
+        self.__state_store = ExtractionStateStore(
+            self.__state_pathname or os.path.join(self.__local_download_dir_warc, DEFAULT_STATE_FILENAME))
+
+        self.__stage_seconds = collections.Counter()
+        self.__counter_record = 0
+        self.__counter_bytes = 0
+        self.__metrics = None
+        self.__last_progress_time = time.time()
+
+        self.__host_matcher = HostMatcher(self.__filter_valid_hosts)
+        self.__date_prefilter = DatePrefilter(self.__filter_start_date, self.__filter_end_date, self.__filter_strict_date)
+
         # make loggers quite
         configure_logging({"LOG_LEVEL": "ERROR"})
         logging.getLogger('requests').setLevel(logging.CRITICAL)
@@ -84,14 +128,41 @@ class CommonCrawlExtractor:
         self.__logger = logging.getLogger(__name__)
         self.__logger.setLevel(self.__log_level)
 
-    def __register_fully_extracted_warc_file(self, warc_url):
+    def __measure(self, stage, start_time):
         """
-        Saves the URL warc_url in the log file for fully extracted WARC URLs
-        :param warc_url:
+        Adds the time since start_time to the time spent in the stage
+        :param stage:
+        :param start_time:
+        :return: The current time
+        """
+        now = time.time()
+        self.__stage_seconds[stage] += now - start_time
+        return now
+
+    def __on_article_passed(self, article):
+        """
+        Passes an article that passed all filter criteria to the callback and the sink
+        :param article:
+        :return: True if the sink has written all articles durably, so that a checkpoint can be saved. Else False.
+        """
+        start_time = time.time()
+        if self.__callback_on_article_extracted:
+            self.__callback_on_article_extracted(article)
+        written = self.__sink.write(article) if self.__sink else False
+        self.__measure('callback', start_time)
+        return written
+
+    def __is_checkpoint_due(self, counter_record, sink_written):
+        """
+        Returns true if the position within the WARC file should be saved. With a sink, this is the case whenever the
+        sink has written its articles durably, so that a resumed extraction neither skips nor duplicates articles.
+        :param counter_record: number of records processed
+        :param sink_written: see __on_article_passed
         :return:
         """
-        with open(self.__log_pathname_fully_extracted_warcs, 'a') as log_file:
-            log_file.write(warc_url + '\n')
+        if self.__sink:
+            return sink_written
+        return counter_record % self.__checkpoint_interval == 0
 
     def __filter_record(self, warc_record, article=None):
         """
@@ -100,36 +171,78 @@ class CommonCrawlExtractor:
         :return: A tuple of (True or False) and an article (might be None)
         """
         # filter by host
-        if self.__filter_valid_hosts:
-            url = warc_record.rec_headers.get_header('WARC-Target-URI')
-
-            # very simple check, check if one of the required host names is contained in the url of the WARC transaction
-            # better would be to extract the host name from the WARC transaction Target URI and then check for equality
-            # because currently something like g.co?forward_url=facebook.com would yield a positive filter test for
-            # facebook.com even though the actual host is g.co
-            for valid_host in self.__filter_valid_hosts:
-                if valid_host in url:
-                    break
-            else:
-                return False, article
+        if not self.__filter_host(warc_record.rec_headers.get_header('WARC-Target-URI')):
+            return False, article
 
         # filter by date
         if self.__filter_start_date or self.__filter_end_date:
             if not article:
-                article = NewsPlease.from_warc(warc_record)
+                # try the cheap signals first, extract the article only if they do not rule out the record. The
+                # extraction reuses the html that the prefilter parsed.
+                payload, content_type, url, download_date = NewsPlease.read_warc_record(warc_record)
+                parsed_document = NewsPlease.parse_warc_payload(payload, content_type)
+                if self.__prefilter_record(url, download_date, parsed_document):
+                    return False, article
+                start_time = time.time()
+                article = NewsPlease.from_warc_payload(payload, content_type, url, download_date, parsed_document)
+                self.__measure('extract', start_time)
+
+            return self.__filter_date(warc_record, article), article
+
+        return True, article
+
+    def __filter_host(self, url):
+        """
+        Returns true if the url passes the host filter
+        :param url:
+        :return:
+        """
+        return self.__host_matcher.matches(url)
+
+    def __prefilter_record(self, url, download_date, parsed_document=None):
+        """
+        Returns true if the record can be discarded by its date without extracting the article, see DatePrefilter
+        :param url: the WARC-Target-URI of the record
+        :param download_date: the WARC-Date of the record
+        :param parsed_document: see NewsPlease.parse_warc_payload, if None only the WARC-Date is checked
+        :return:
+        """
+        if not self.__prefilter_date:
+            return False
+        start_time = time.time()
+        discard = self.__date_prefilter.discard(url, download_date, parsed_document)
+        self.__measure('filter', start_time)
+        return discard
+
+    def __get_worker_prefilter(self):
+        """
+        Returns the DatePrefilter that the worker processes apply to the parsed html, if any
+        :return:
+        """
+        if self.__prefilter_date and (self.__filter_start_date or self.__filter_end_date):
+            return self.__date_prefilter
+        return None
 
+    def __filter_date(self, warc_record, article):
+        """
+        Returns true if the publishing date of the article passes the date filter
+        :param warc_record:
+        :param article:
+        :return:
+        """
+        if self.__filter_start_date or self.__filter_end_date:
             publishing_date = self.__get_publishing_date(warc_record, article)
             if not publishing_date:
                 if self.__filter_strict_date:
-                    return False, article
+                    return False
             else:  # here we for sure have a date
                 # is article published too early?
                 if self.__filter_start_date and publishing_date < self.__filter_start_date:
-                    return False, article
+                    return False
                 if self.__filter_end_date and publishing_date > self.__filter_end_date:
-                    return False, article
+                    return False
 
-        return True, article
+        return True
 
     def __get_publishing_date(self, warc_record, article):
         """
@@ -150,38 +263,6 @@ class CommonCrawlExtractor:
         """
         return self.__cc_base_url + name
 
-    def __get_remote_index(self):
-        """
-        Gets the index of news crawl files from commoncrawl.org and returns an array of names
-        :return:
-        """
-        temp_filename = "tmpaws.txt"
-
-        if os.name == 'nt':
-            awk_parameter = '"{ print $4 }"'
-        else:
-            awk_parameter = "'{ print $4 }'"
-
-        # get the remote info
-        cmd = "aws s3 ls --recursive s3://commoncrawl/crawl-data/CC-NEWS/ --no-sign-request > %s && " \
-              "awk %s %s " % (temp_filename, awk_parameter, temp_filename)
-
-        self.__logger.info('executing: %s', cmd)
-        exitcode, stdout_data = subprocess.getstatusoutput(cmd)
-
-        if exitcode > 0:
-            raise Exception(stdout_data)
-
-        print(stdout_data)
-
-        try:
-            os.remove(temp_filename)
-        except OSError:
-            pass
-
-        lines = stdout_data.splitlines()
-        return lines
-
     def __on_download_progress_update(self, blocknum, blocksize, totalsize):
         """
         Prints some download progress information
@@ -223,76 +304,322 @@ class CommonCrawlExtractor:
 
             # download
             self.__logger.info('downloading %s (local: %s)', url, local_filepath)
+            start_time = time.time()
             urllib.request.urlretrieve(url, local_filepath, reporthook=self.__on_download_progress_update)
+            self.__measure('download', start_time)
             self.__logger.info('download completed, local file: %s', local_filepath)
             return local_filepath
 
+    def __read_checkpoint(self, warc_url):
+        """
+        Reads the byte offset up to which a WARC file has been extracted
+        :param warc_url:
+        :return: The offset or 0 if the WARC file has not been extracted partially
+        """
+        return self.__state_store.get_record_offset(warc_url)
+
+    def __write_checkpoint(self, warc_url, offset):
+        """
+        Saves the byte offset up to which a WARC file has been extracted
+        :param warc_url:
+        :param offset: offset of the first record that has not been extracted yet
+        :return:
+        """
+        self.__state_store.set_record_offset(warc_url, offset)
+
+    def __process_warc_gz_url(self, url):
+        """
+        Extracts all transactions of a remote WARC file while it is downloaded, without saving it to disk. If a
+        previous run stopped within the file, the download is resumed from the last checkpoint.
+        :param url:
+        :return:
+        """
+        offset = self.__read_checkpoint(url)
+        request = urllib.request.Request(url)
+        if offset:
+            request.add_header('Range', 'bytes=%i-' % offset)
+
+        self.__logger.info('streaming %s (offset: %i)', url, offset)
+        with urllib.request.urlopen(request) as response:
+            if offset and response.status != 206:
+                self.__logger.info('server does not support ranges, extracting from the start: %s', url)
+                offset = 0
+            counters = self.__process_warc_gz_stream(response, start_offset=offset, checkpoint_url=url)
+
+        self.__on_warc_completed(*counters)
+
     def __process_warc_gz_file(self, path_name):
+        """
+        Extracts all transactions of a local WARC file. If a previous run stopped within the file, the extraction is
+        resumed from the last checkpoint.
+        :param path_name:
+        :return:
+        """
+        offset = self.__read_checkpoint(self.__warc_download_url)
+        with open(path_name, 'rb') as stream:
+            if offset:
+                self.__logger.info('resuming %s at offset %i', path_name, offset)
+                stream.seek(offset)
+            counters = self.__process_warc_gz_stream(stream, start_offset=offset,
+                                                     checkpoint_url=self.__warc_download_url)
+
+        # cleanup
+        if self.__delete_warc_after_extraction:
+            os.remove(path_name)
+
+        self.__on_warc_completed(*counters)
+
+    def __on_warc_completed(self, counter_article_passed, counter_article_discarded, counter_article_error,
+                            counter_article_total):
+        """
+        Registers the WARC file as fully extracted and notifies the user
+        :return:
+        """
+        if self.__sink:
+            # the WARC file must not be registered before all of its articles are written
+            self.__sink.close()
+        self.__state_store.set_fully_extracted(self.__warc_download_url)
+        self.__metrics = self.__get_current_metrics(counter_article_passed, counter_article_discarded,
+                                                    counter_article_error, counter_article_total)
+        if self.__callback_on_warc_completed:
+            self.__callback_on_warc_completed(self.__warc_download_url, counter_article_passed,
+                                              counter_article_discarded, counter_article_error, counter_article_total)
+
+    def __get_current_metrics(self, counter_article_passed, counter_article_discarded, counter_article_error,
+                              counter_article_total):
+        """
+        Returns the metrics of the WARC file so far, see get_metrics
+        :return:
+        """
+        return {
+            'warc_url': self.__warc_download_url,
+            'passed': counter_article_passed,
+            'discarded': counter_article_discarded,
+            'error': counter_article_error,
+            'total': counter_article_total,
+            'records': self.__counter_record,
+            'bytes': self.__counter_bytes,
+            'stages': dict(self.__stage_seconds),
+        }
+
+    def __report_progress(self, counter_article_passed, counter_article_discarded, counter_article_error,
+                          counter_article_total):
+        """
+        Passes the metrics of the WARC file so far to the progress callback, at most every __progress_interval seconds
+        :return:
+        """
+        if not self.__callback_on_progress or time.time() - self.__last_progress_time < self.__progress_interval:
+            return
+        self.__callback_on_progress(self.__get_current_metrics(counter_article_passed, counter_article_discarded,
+                                                               counter_article_error, counter_article_total))
+        self.__last_progress_time = time.time()
+
+    def __process_warc_gz_stream(self, stream, start_offset=0, checkpoint_url=None):
         """
         Iterates all transactions in one WARC file and for each transaction tries to extract an article object.
         Afterwards, each article is checked against the filter criteria and if all are passed, the function
         on_valid_article_extracted is invoked with the article object.
-        :param path_name:
-        :return:
+        :param stream: file-like object of the (gzipped) WARC file
+        :param start_offset: offset of stream within the WARC file
+        :param checkpoint_url: if set, the position within the WARC file is saved regularly for this url
+        :return: A tuple of the counters of passed, discarded, erroneous and all articles
         """
+        if self.__record_extraction_processes > 1:
+            return self.__process_warc_gz_stream_parallel(stream, start_offset, checkpoint_url)
+
         counter_article_total = 0
         counter_article_passed = 0
         counter_article_discarded = 0
         counter_article_error = 0
+        counter_record = 0
         start_time = time.time()
 
-        with open(path_name, 'rb') as stream:
-            for record in ArchiveIterator(stream):
-                try:
-                    if record.rec_type == 'response':
-                        counter_article_total += 1
-
-                        # if the article passes filter tests, we notify the user
-                        filter_pass, article = self.__filter_record(record)
-                        if filter_pass:
-                            if not article:
-                                article = NewsPlease.from_warc(record)
-                            counter_article_passed += 1
-
-                            self.__logger.info('article pass (%s; %s; %s)', article.source_domain, article.date_publish,
+        archive_iterator = ArchiveIterator(stream)
+        # the iterator decompresses and parses the next record (and downloads it, if streamed) when it is advanced
+        read_start_time = time.time()
+        for record in archive_iterator:
+            self.__measure('read', read_start_time)
+            sink_written = False
+            try:
+                if record.rec_type == 'response':
+                    counter_article_total += 1
+
+                    # if the article passes filter tests, we notify the user
+                    filter_pass, article = self.__filter_record(record)
+                    if filter_pass:
+                        if not article:
+                            extract_start_time = time.time()
+                            article = NewsPlease.from_warc(record)
+                            self.__measure('extract', extract_start_time)
+                        counter_article_passed += 1
+
+                        self.__logger.info('article pass (%s; %s; %s)', article.source_domain, article.date_publish,
+                                           article.title)
+                        sink_written = self.__on_article_passed(article)
+                    else:
+                        counter_article_discarded += 1
+
+                        if article:
+                            self.__logger.info('article discard (%s; %s; %s)', article.source_domain,
+                                               article.date_publish,
                                                article.title)
-                            self.__callback_on_article_extracted(article)
                         else:
-                            counter_article_discarded += 1
-
-                            if article:
-                                self.__logger.info('article discard (%s; %s; %s)', article.source_domain,
-                                                   article.date_publish,
-                                                   article.title)
-                            else:
-                                self.__logger.info('article discard (%s)',
-                                                   record.rec_headers.get_header('WARC-Target-URI'))
-
-                        if counter_article_total % 10 == 0:
-                            elapsed_secs = time.time() - start_time
-                            secs_per_article = elapsed_secs / counter_article_total
-                            self.__logger.info('statistics')
-                            self.__logger.info('pass = %i, discard = %i, error = %i, total = %i',
-                                               counter_article_passed,
-                                               counter_article_discarded, counter_article_error, counter_article_total)
-                            self.__logger.info('extraction from current WARC file started %s; %f s/article',
-                                               human(start_time), secs_per_article)
-                except:
-                    if self.__continue_after_error:
-                        self.__logger.error('Unexpected error: %s (%s)', *sys.exc_info()[0:2])
-                        self.__logger.error(sys.exc_info()[2], exc_info=True)
-                        counter_article_error += 1
-                        pass
-                    else:
-                        raise
+                            self.__logger.info('article discard (%s)',
+                                               record.rec_headers.get_header('WARC-Target-URI'))
+
+                    if counter_article_total % 10 == 0:
+                        elapsed_secs = time.time() - start_time
+                        secs_per_article = elapsed_secs / counter_article_total
+                        self.__logger.info('statistics')
+                        self.__logger.info('pass = %i, discard = %i, error = %i, total = %i',
+                                           counter_article_passed,
+                                           counter_article_discarded, counter_article_error, counter_article_total)
+                        self.__logger.info('extraction from current WARC file started %s; %f s/article',
+                                           human(start_time), secs_per_article)
+            except:
+                if self.__continue_after_error:
+                    self.__logger.error('Unexpected error: %s (%s)', *sys.exc_info()[0:2])
+                    self.__logger.error(sys.exc_info()[2], exc_info=True)
+                    counter_article_error += 1
+                    pass
+                else:
+                    raise
+
+            counter_record += 1
+            self.__counter_record += 1
+            record_end_offset = archive_iterator.get_record_offset() + archive_iterator.get_record_length()
+            self.__counter_bytes = record_end_offset
+            if checkpoint_url and self.__is_checkpoint_due(counter_record, sink_written):
+                self.__write_checkpoint(checkpoint_url, start_offset + record_end_offset)
+            self.__report_progress(counter_article_passed, counter_article_discarded, counter_article_error,
+                                   counter_article_total)
+            read_start_time = time.time()
+
+        return counter_article_passed, counter_article_discarded, counter_article_error, counter_article_total
+
+    def __process_warc_gz_stream_parallel(self, stream, start_offset=0, checkpoint_url=None):
+        """
+        Like __process_warc_gz_stream, but the articles are extracted by a pool of worker processes. This process only
+        reads the records, applies the host filter and ships the raw payloads to the workers, which parse them, apply
+        the date prefilter and extract the articles. The date filter and the callback are applied in this process as
+        the articles come back, either in the order of their records or in the order they are finished.
+        :param stream: file-like object of the (gzipped) WARC file
+        :param start_offset: offset of stream within the WARC file
+        :param checkpoint_url: if set, the position within the WARC file is saved regularly for this url. Only
+        supported if the record order is kept.
+        :return: A tuple of the counters of passed, discarded, erroneous and all articles
+        """
+        counter_article_passed = 0
+        counter_article_discarded = 0
+        counter_article_error = 0
+        counter_article_extracted = 0
+        start_time = time.time()
+        # updated by the thread that feeds the worker pool
+        read_counters = {'total': 0, 'discarded': 0}
+        # end offsets of the records sent to the workers, in the order they were sent
+        record_end_offsets = collections.deque()
 
-        # cleanup
-        if self.__delete_warc_after_extraction:
-            os.remove(path_name)
+        if checkpoint_url and not self.__keep_record_order:
+            self.__logger.info('checkpoints are not supported if the record order is not kept: %s', checkpoint_url)
+            checkpoint_url = None
 
-        self.__register_fully_extracted_warc_file(self.__warc_download_url)
-        self.__callback_on_warc_completed(self.__warc_download_url, counter_article_passed, counter_article_discarded,
-                                          counter_article_error, counter_article_total)
+        archive_iterator = ArchiveIterator(stream)
+        # errors of reading the WARC file, which are raised after the workers are done
+        read_errors = []
+
+        def read_records():
+            try:
+                for record_values in read_record_values():
+                    yield record_values
+            except Exception as error:
+                # raised in the thread that feeds the worker pool, which would only report it as a single failed task
+                read_errors.append(error)
+
+        def read_record_values():
+            read_start_time = time.time()
+            for record in archive_iterator:
+                self.__counter_record += 1
+                if record.rec_type != 'response':
+                    self.__counter_bytes = archive_iterator.get_record_offset() + archive_iterator.get_record_length()
+                    self.__measure('read', read_start_time)
+                    read_start_time = time.time()
+                    continue
+                read_counters['total'] += 1
+
+                url = record.rec_headers.get_header('WARC-Target-URI')
+                record_values = NewsPlease.read_warc_record(record) if self.__filter_host(url) else None
+                record_end_offset = archive_iterator.get_record_offset() + archive_iterator.get_record_length()
+                self.__counter_bytes = record_end_offset
+                self.__measure('read', read_start_time)
+
+                # the html is parsed and prefiltered by the workers, this thread only checks the WARC-Date
+                if record_values is None or self.__prefilter_record(url, record_values[3]):
+                    read_counters['discarded'] += 1
+                    self.__logger.info('article discard (%s)', url)
+                else:
+                    if checkpoint_url:
+                        record_end_offsets.append(start_offset + record_end_offset)
+                    yield record_values
+                read_start_time = time.time()
+
+        self.__logger.info('extracting records with %i processes', self.__record_extraction_processes)
+        # time waiting for the workers, while this process reads the next records
+        extract_start_time = time.time()
+        for url, article in NewsPlease.from_warc_batch(read_records(), processes=self.__record_extraction_processes,
+                                                        ordered=self.__keep_record_order,
+                                                        skip_errors=self.__continue_after_error,
+                                                        prefilter=self.__get_worker_prefilter()):
+            self.__measure('extract', extract_start_time)
+            counter_article_extracted += 1
+            sink_written = False
+            try:
+                if article is False:
+                    counter_article_discarded += 1
+                    self.__logger.info('article discard (%s)', url)
+                elif article is None:
+                    raise RuntimeError('extraction failed: %s' % url)
+                elif self.__filter_date(None, article):
+                    counter_article_passed += 1
+
+                    self.__logger.info('article pass (%s; %s; %s)', article.source_domain, article.date_publish,
+                                       article.title)
+                    sink_written = self.__on_article_passed(article)
+                else:
+                    counter_article_discarded += 1
+
+                    self.__logger.info('article discard (%s; %s; %s)', article.source_domain, article.date_publish,
+                                       article.title)
+            except:
+                if self.__continue_after_error:
+                    self.__logger.error('Unexpected error: %s (%s)', *sys.exc_info()[0:2])
+                    self.__logger.error(sys.exc_info()[2], exc_info=True)
+                    counter_article_error += 1
+                else:
+                    raise
+
+            if checkpoint_url:
+                offset = record_end_offsets.popleft()
+                if self.__is_checkpoint_due(counter_article_extracted, sink_written):
+                    self.__write_checkpoint(checkpoint_url, offset)
+
+            if counter_article_extracted % 10 == 0:
+                elapsed_secs = time.time() - start_time
+                self.__logger.info('statistics')
+                self.__logger.info('pass = %i, discard = %i, error = %i, total = %i',
+                                   counter_article_passed, counter_article_discarded + read_counters['discarded'],
+                                   counter_article_error, read_counters['total'])
+                self.__logger.info('extraction from current WARC file started %s; %f s/article',
+                                   human(start_time), elapsed_secs / counter_article_extracted)
+            self.__report_progress(counter_article_passed, counter_article_discarded + read_counters['discarded'],
+                                   counter_article_error, read_counters['total'])
+            extract_start_time = time.time()
+
+        if read_errors:
+            # the WARC file was not read completely, so it must not be registered as fully extracted
+            raise read_errors[0]
+
+        return counter_article_passed, counter_article_discarded + read_counters['discarded'], counter_article_error, \
+            read_counters['total']
 
     def __run(self):
         """
@@ -303,8 +630,24 @@ class CommonCrawlExtractor:
         """
         self.__setup()
 
-        local_path_name = self.__download(self.__warc_download_url)
-        self.__process_warc_gz_file(local_path_name)
+        try:
+            if self.__stream_warc:
+                self.__process_warc_gz_url(self.__warc_download_url)
+            else:
+                local_path_name = self.__download(self.__warc_download_url)
+                self.__process_warc_gz_file(local_path_name)
+        finally:
+            if self.__sink:
+                self.__sink.close()
+            self.__state_store.close()
+
+    def get_metrics(self):
+        """
+        Returns the metrics of the WARC file after it has been fully extracted
+        :return: dict of the counters of passed, discarded, erroneous and all articles, the number of records and
+        (compressed) bytes read and the seconds spent per stage, or None if the WARC file was not fully extracted
+        """
+        return self.__metrics
 
     def extract_from_commoncrawl(self, warc_download_url, callback_on_article_extracted,
                                  callback_on_warc_completed=None,
@@ -313,12 +656,15 @@ class CommonCrawlExtractor:
                                  strict_date=True, reuse_previously_downloaded_files=True, local_download_dir_warc=None,
                                  continue_after_error=True, show_download_progress=False,
                                  log_level=logging.ERROR, delete_warc_after_extraction=True,
-                                 log_pathname_fully_extracted_warcs=None):
+                                 state_pathname=None, stream_warc=False,
+                                 record_extraction_processes=1, keep_record_order=True, prefilter_date=True,
+                                 sink=None, callback_on_progress=None):
         """
         Crawl and extract articles form the news crawl provided by commoncrawl.org. For each article that was extracted
         successfully the callback function callback_on_article_extracted is invoked where the first parameter is the
         article object.
-        :param log_pathname_fully_extracted_warcs:
+        :param state_pathname: path name of the database of fully and partially extracted WARC files, if None it is
+        saved in local_download_dir_warc
         :param delete_warc_after_extraction:
         :param warc_download_url:
         :param callback_on_article_extracted:
@@ -332,6 +678,19 @@ class CommonCrawlExtractor:
         :param continue_after_error:
         :param show_download_progress:
         :param log_level:
+        :param stream_warc: if True, the WARC file is extracted while it is downloaded and not saved to disk. If the
+        extraction stops within the file, it is resumed from the last checkpoint (as are downloaded WARC files).
+        :param record_extraction_processes: if greater than 1, this process only reads the WARC file and the articles
+        are extracted by a pool of this many worker processes
+        :param keep_record_order: if True, articles extracted by several processes are passed to
+        callback_on_article_extracted in the order of their records. Else, in the order they are finished.
+        :param prefilter_date: if True and a date range is set, records whose WARC-Date or date found by the
+        DateExtractor show that they were published outside of the range are discarded without running the other
+        extractors
+        :param sink: if set, all articles that pass the filter criteria are written to this ArticleSink, e.g., a
+        JsonLinesSink. Then, callback_on_article_extracted may be None.
+        :param callback_on_progress: if set, it is invoked every few seconds while the WARC file is extracted, with the
+        metrics of the WARC file so far (see get_metrics), e.g., to monitor the progress within large WARC files
         :return:
         """
         self.__warc_download_url = warc_download_url
@@ -345,9 +704,15 @@ class CommonCrawlExtractor:
         self.__continue_after_error = continue_after_error
         self.__callback_on_article_extracted = callback_on_article_extracted
         self.__callback_on_warc_completed = callback_on_warc_completed
+        self.__callback_on_progress = callback_on_progress
         self.__show_download_progress = show_download_progress
         self.__log_level = log_level
         self.__delete_warc_after_extraction = delete_warc_after_extraction
-        self.__log_pathname_fully_extracted_warcs = log_pathname_fully_extracted_warcs
+        self.__state_pathname = state_pathname
+        self.__stream_warc = stream_warc
+        self.__record_extraction_processes = record_extraction_processes or 1
+        self.__keep_record_order = keep_record_order
+        self.__prefilter_date = prefilter_date
+        self.__sink = sink
 
         self.__run()
@@ -0,0 +1,203 @@
+"""
+Provides the index of the WARC files of commoncrawl.org's news crawl (CC-NEWS). For each month, commoncrawl.org
+publishes a manifest (warc.paths.gz) listing the paths of all WARC files of that month. The manifests are read over
+HTTP, or from a local directory of the same layout, and cached locally.
+"""
+import datetime
+import gzip
+import logging
+import os
+
+import requests
+
+LOGGER = logging.getLogger(__name__)
+
+# commoncrawl.org
+CC_BASE_URL = 'https://commoncrawl.s3.amazonaws.com/'
+# first month of the news crawl
+CC_NEWS_START_DATE = datetime.datetime(2016, 8, 1)
+# seconds the listing of the current month is cached, the listings of past months do not change and never expire
+DEFAULT_CACHE_TTL = 3600
+# time after the end of a month until its last WARC files are listed
+MONTH_COMPLETION_DELAY = datetime.timedelta(days=2)
+
+
+def get_manifest_path(year, month):
+    """
+    Returns the path of the manifest of one month, relative to the commoncrawl.org base url
+    :param year:
+    :param month:
+    :return:
+    """
+    return 'crawl-data/CC-NEWS/%04d/%02d/warc.paths.gz' % (year, month)
+
+
+def iterate_months(start_date, end_date):
+    """
+    Yields all months from the month of start_date to the month of end_date
+    :param start_date:
+    :param end_date:
+    :return: A generator of (year, month) tuples
+    """
+    year, month = start_date.year, start_date.month
+    while (year, month) <= (end_date.year, end_date.month):
+        yield year, month
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+
+
+class HttpIndexSource(object):
+    """
+    Reads the manifests from commoncrawl.org
+    """
+
+    def __init__(self, base_url=CC_BASE_URL, timeout=60):
+        """
+        :param base_url:
+        :param timeout: in seconds
+        """
+        self.base_url = base_url
+        self.timeout = timeout
+
+    def fetch(self, year, month):
+        """
+        Returns the gzipped manifest of one month
+        :param year:
+        :param month:
+        :return: The manifest or None if there is none for that month
+        """
+        url = self.base_url + get_manifest_path(year, month)
+        LOGGER.info('downloading index: %s', url)
+        response = requests.get(url, timeout=self.timeout)
+        # S3 answers 403 instead of 404 for missing keys of public buckets
+        if response.status_code in (403, 404):
+            return None
+        response.raise_for_status()
+        return response.content
+
+
+class LocalIndexSource(object):
+    """
+    Reads the manifests from a local directory of the same layout as commoncrawl.org, i.e.,
+    <directory>/crawl-data/CC-NEWS/<year>/<month>/warc.paths.gz, e.g., to test without network access
+    """
+
+    def __init__(self, directory):
+        """
+        :param directory:
+        """
+        self.directory = directory
+
+    def fetch(self, year, month):
+        """
+        Returns the gzipped manifest of one month
+        :param year:
+        :param month:
+        :return: The manifest or None if there is none for that month
+        """
+        pathname = os.path.join(self.directory, *get_manifest_path(year, month).split('/'))
+        if not os.path.isfile(pathname):
+            return None
+        with open(pathname, 'rb') as manifest_file:
+            return manifest_file.read()
+
+
+class CommonCrawlNewsIndex(object):
+    """
+    Lists the WARC files of the news crawl, month by month. The listing of each month is cached as a text file in
+    cache_dir, so that restarts do not download the manifests again.
+    Usage:
+        index = CommonCrawlNewsIndex(cache_dir='./cc_download_warc/index')
+        for name in index.get_warc_paths(datetime.datetime(2020, 3, 1)):
+            url = CC_BASE_URL + name
+    """
+
+    def __init__(self, source=None, cache_dir=None, cache_ttl=DEFAULT_CACHE_TTL):
+        """
+        :param source: object with a method fetch(year, month) returning the gzipped manifest of a month or None, e.g.,
+        HttpIndexSource or LocalIndexSource. A string is used as directory of a LocalIndexSource. If None, the
+        manifests are read from commoncrawl.org.
+        :param cache_dir: directory of the cached listings, if None, listings are not cached
+        :param cache_ttl: seconds the listing of the current month is cached, if None it never expires
+        """
+        if source is None:
+            source = HttpIndexSource()
+        elif isinstance(source, str):
+            source = LocalIndexSource(source)
+        self.source = source
+        self.cache_dir = cache_dir
+        self.cache_ttl = cache_ttl
+
+        if self.cache_dir and not os.path.exists(self.cache_dir):
+            os.makedirs(self.cache_dir)
+
+    def get_warc_paths(self, start_date=None, end_date=None):
+        """
+        Lists the WARC files of all months between start_date and end_date
+        :param start_date: if None, the news crawl is listed from its beginning, as datetime
+        :param end_date: if None, the news crawl is listed until today, as datetime
+        :return: A list of paths relative to the commoncrawl.org base url, in chronological order
+        """
+        start_date = max(start_date or CC_NEWS_START_DATE, CC_NEWS_START_DATE)
+        end_date = end_date or datetime.datetime.today()
+
+        warc_paths = []
+        for year, month in iterate_months(start_date, end_date):
+            warc_paths.extend(self.get_month(year, month))
+        return warc_paths
+
+    def get_month(self, year, month):
+        """
+        Lists the WARC files of one month, from the cache if it is still valid
+        :param year:
+        :param month:
+        :return: A list of paths relative to the commoncrawl.org base url
+        """
+        cache_pathname = self.__get_cache_pathname(year, month)
+        if cache_pathname and self.__is_cache_valid(cache_pathname, year, month):
+            with open(cache_pathname) as cache_file:
+                return cache_file.read().splitlines()
+
+        manifest = self.source.fetch(year, month)
+        if manifest is None:
+            LOGGER.info('no index for %04d/%02d', year, month)
+            return []
+        warc_paths = [line.strip() for line in gzip.decompress(manifest).decode('utf-8').splitlines() if line.strip()]
+
+        if cache_pathname:
+            # write to a temporary file first, so that concurrent readers never see a partial listing
+            temp_pathname = '%s.%i.tmp' % (cache_pathname, os.getpid())
+            with open(temp_pathname, 'w') as cache_file:
+                cache_file.write('\n'.join(warc_paths))
+            os.replace(temp_pathname, cache_pathname)
+        return warc_paths
+
+    def __get_cache_pathname(self, year, month):
+        """
+        Returns the path name of the cached listing of a month
+        :param year:
+        :param month:
+        :return: The path name or None if listings are not cached
+        """
+        if not self.cache_dir:
+            return None
+        return os.path.join(self.cache_dir, 'cc-news-%04d-%02d.paths' % (year, month))
+
+    def __is_cache_valid(self, cache_pathname, year, month):
+        """
+        Returns true if the cached listing of a month exists and has not expired
+        :param cache_pathname:
+        :param year:
+        :param month:
+        :return:
+        """
+        if not os.path.isfile(cache_pathname):
+            return False
+
+        modified = datetime.datetime.fromtimestamp(os.path.getmtime(cache_pathname))
+        # the listing of a month is complete if it was written well after the month had ended
+        next_month = datetime.datetime(year + 1, 1, 1) if month == 12 else datetime.datetime(year, month + 1, 1)
+        if modified > next_month + MONTH_COMPLETION_DELAY:
+            return True
+        if self.cache_ttl is None:
+            return True
+        return (datetime.datetime.now() - modified).total_seconds() < self.cache_ttl
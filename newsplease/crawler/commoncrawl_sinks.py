@@ -0,0 +1,373 @@
+"""
+Batched output sinks for the extraction from commoncrawl.org. Instead of writing one file per article from
+callback_on_article_extracted, a sink buffers the extracted articles and writes them in batches, either to rotating
+JSON Lines files (optionally compressed with gzip or zstd), to Parquet files or to a SQLite database. Each record has
+the fields of ExtractedInformationStorage.extract_relevant_info.
+
+A sink is opened lazily by the process that writes to it, so it can be passed to the extraction processes of
+crawl_from_commoncrawl before it is used. Each process writes files of its own.
+"""
+import abc
+import datetime
+import gzip
+import json
+import logging
+import os
+import socket
+import sqlite3
+import time
+import uuid
+
+from ..pipeline.pipelines import ExtractedInformationStorage
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+LOGGER = logging.getLogger(__name__)
+
+# fields of a record, see ExtractedInformationStorage.extract_relevant_info
+ARTICLE_FIELDS = ('authors', 'date_download', 'date_modify', 'date_publish', 'description', 'filename', 'image_url',
+                  'language', 'localpath', 'title', 'title_page', 'title_rss', 'source_domain', 'maintext', 'url',
+                  'entities', 'count_comment')
+
+DEFAULT_MAX_BATCH_RECORDS = 1000
+DEFAULT_MAX_BATCH_BYTES = 16 * 1024 * 1024
+DEFAULT_MAX_FILE_BYTES = 1024 * 1024 * 1024
+DEFAULT_MAX_FILE_RECORDS = 1000000
+
+
+def to_json_value(value):
+    """
+    Converts values that JSON does not support, i.e., dates, to strings
+    :param value:
+    :return:
+    """
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    return value
+
+
+class ArticleSink(abc.ABC):
+    """
+    Buffers articles and writes them in batches. A batch is written once it holds max_batch_records articles or about
+    max_batch_bytes of serialized articles, and when the sink is closed.
+    """
+
+    def __init__(self, max_batch_records=DEFAULT_MAX_BATCH_RECORDS, max_batch_bytes=DEFAULT_MAX_BATCH_BYTES):
+        """
+        :param max_batch_records: maximum number of articles that are buffered
+        :param max_batch_bytes: maximum size of the buffered articles, as JSON
+        """
+        self.max_batch_records = max_batch_records
+        self.max_batch_bytes = max_batch_bytes
+        self._batch = []
+        self._batch_bytes = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @staticmethod
+    def to_record(article):
+        """
+        Converts an article to a record of the sink
+        :param article: a NewsArticle or a NewscrawlerItem
+        :return: dict with the fields ARTICLE_FIELDS
+        """
+        if hasattr(article, 'get_dict'):
+            values = article.get_dict()
+        else:
+            values = ExtractedInformationStorage.extract_relevant_info(article)
+        return {field: to_json_value(values.get(field)) for field in ARTICLE_FIELDS}
+
+    def write(self, article):
+        """
+        Adds an article to the current batch and writes the batch if it is full
+        :param article: a NewsArticle or a NewscrawlerItem
+        :return: True if all articles passed so far have been written durably, i.e., a restart does not need to
+        extract them again. Else False.
+        """
+        record = self.to_record(article)
+        self._batch.append(record)
+        self._batch_bytes += len(json.dumps(record, default=str))
+        if len(self._batch) >= self.max_batch_records or self._batch_bytes >= self.max_batch_bytes:
+            return self.flush()
+        return False
+
+    def flush(self):
+        """
+        Writes the current batch
+        :return: True if all articles passed so far have been written durably. Else False.
+        """
+        if self._batch:
+            self._write_batch(self._batch)
+            self._batch = []
+            self._batch_bytes = 0
+        return self._is_durable()
+
+    def close(self):
+        """
+        Writes the current batch and closes all files, all articles passed so far are written durably afterwards.
+        The sink is opened again on the next write.
+        :return:
+        """
+        self.flush()
+        self._close()
+
+    @abc.abstractmethod
+    def _write_batch(self, records):
+        """
+        Writes a batch of records
+        :param records:
+        :return:
+        """
+
+    def _is_durable(self):
+        """
+        Returns true if all written batches are durable
+        :return:
+        """
+        return True
+
+    def _close(self):
+        """
+        Closes all files
+        :return:
+        """
+        pass
+
+
+class RotatingFileSink(ArticleSink):
+    """
+    Base class of sinks that write to a sequence of files in a directory. The name of each file contains the host name,
+    the process id, the time the sink was opened and a random id, so that concurrent processes, restarts and sinks
+    opened again within the same second never write to the same file.
+    """
+
+    extension = None
+
+    def __init__(self, directory, prefix='articles', **kwargs):
+        """
+        :param directory: directory of the files, it is created if it does not exist
+        :param prefix: prefix of the file names
+        """
+        super(RotatingFileSink, self).__init__(**kwargs)
+        self.directory = directory
+        self.prefix = prefix
+        self._file_prefix = None
+        self._file_number = 0
+
+    def _next_pathname(self):
+        """
+        Returns the path name of the next file
+        :return:
+        """
+        if self._file_prefix is None:
+            if not os.path.exists(self.directory):
+                os.makedirs(self.directory, exist_ok=True)
+            self._file_prefix = '%s-%s-%i-%s-%s' % (self.prefix, socket.gethostname(), os.getpid(),
+                                                    time.strftime('%Y%m%d%H%M%S'), uuid.uuid4().hex[:8])
+            self._file_number = 0
+        self._file_number += 1
+        return os.path.join(self.directory, '%s-%05d%s' % (self._file_prefix, self._file_number, self.extension))
+
+    def _close(self):
+        self._file_prefix = None
+
+
+class JsonLinesSink(RotatingFileSink):
+    """
+    Writes articles as JSON Lines. Each batch is appended to the current file as a compressed member (gzip) or frame
+    (zstd) of its own, so a file can be read completely even if the process was killed after a batch. A new file is
+    started once the current one exceeds max_file_bytes.
+    """
+
+    def __init__(self, directory, compression='gzip', max_file_bytes=DEFAULT_MAX_FILE_BYTES, **kwargs):
+        """
+        :param directory: directory of the files
+        :param compression: 'gzip', 'zstd' or None
+        :param max_file_bytes: size after which a new file is started
+        """
+        if compression == 'zstd' and zstandard is None:
+            raise ModuleNotFoundError("Using zstd compression requires zstandard")
+        if compression not in ('gzip', 'zstd', None):
+            raise ValueError('unknown compression: %s' % compression)
+        super(JsonLinesSink, self).__init__(directory, **kwargs)
+        self.compression = compression
+        self.max_file_bytes = max_file_bytes
+        self.extension = {'gzip': '.jsonl.gz', 'zstd': '.jsonl.zst', None: '.jsonl'}[compression]
+        self._pathname = None
+
+    def _write_batch(self, records):
+        data = ''.join(json.dumps(record, default=str, ensure_ascii=False) + '\n' for record in records)
+        data = data.encode('utf-8')
+        if self.compression == 'gzip':
+            data = gzip.compress(data)
+        elif self.compression == 'zstd':
+            data = zstandard.ZstdCompressor().compress(data)
+
+        if self._pathname is None or os.path.getsize(self._pathname) >= self.max_file_bytes:
+            self._pathname = self._next_pathname()
+        with open(self._pathname, 'ab') as jsonl_file:
+            jsonl_file.write(data)
+            jsonl_file.flush()
+            os.fsync(jsonl_file.fileno())
+
+    def _close(self):
+        super(JsonLinesSink, self)._close()
+        self._pathname = None
+
+
+class ParquetSink(RotatingFileSink):
+    """
+    Writes articles to Parquet files, one row group per batch. A file is written to a temporary name and renamed once it
+    is complete, i.e., after max_file_records articles or when the sink is closed. Only complete files are durable.
+    """
+
+    extension = '.parquet'
+
+    def __init__(self, directory, max_file_records=DEFAULT_MAX_FILE_RECORDS, compression='snappy', **kwargs):
+        """
+        :param directory: directory of the files
+        :param max_file_records: number of articles after which a new file is started
+        :param compression: compression codec of Parquet, e.g., 'snappy', 'zstd' or 'gzip'
+        """
+        if pyarrow is None:
+            raise ModuleNotFoundError("Using ParquetSink requires pyarrow")
+        super(ParquetSink, self).__init__(directory, **kwargs)
+        self.max_file_records = max_file_records
+        self.compression = compression
+        self._writer = None
+        self._pathname = None
+        self._file_records = 0
+
+    @staticmethod
+    def get_schema():
+        """
+        Returns the schema of the files. Dates are kept as strings, since extractors return them in various formats.
+        :return:
+        """
+        fields = [(field, pyarrow.string()) for field in ARTICLE_FIELDS]
+        fields[ARTICLE_FIELDS.index('authors')] = ('authors', pyarrow.list_(pyarrow.string()))
+        fields[ARTICLE_FIELDS.index('count_comment')] = ('count_comment', pyarrow.int64())
+        return pyarrow.schema(fields)
+
+    @staticmethod
+    def __to_row(record):
+        """
+        Converts a record to the types of the schema
+        :param record:
+        :return:
+        """
+        row = {}
+        for field, value in record.items():
+            if value is None:
+                row[field] = None
+            elif field == 'authors':
+                row[field] = [str(author) for author in value] if isinstance(value, (list, tuple)) else [str(value)]
+            elif field == 'count_comment':
+                try:
+                    row[field] = int(value)
+                except (TypeError, ValueError):
+                    row[field] = None
+            elif isinstance(value, (dict, list, tuple)):
+                row[field] = json.dumps(value, default=str, ensure_ascii=False)
+            else:
+                row[field] = str(value)
+        return row
+
+    def _write_batch(self, records):
+        if self._writer is None:
+            self._pathname = self._next_pathname()
+            self._writer = pyarrow.parquet.ParquetWriter(self._pathname + '.tmp', self.get_schema(),
+                                                         compression=self.compression)
+        table = pyarrow.Table.from_pylist([self.__to_row(record) for record in records], schema=self.get_schema())
+        self._writer.write_table(table)
+        self._file_records += len(records)
+        if self._file_records >= self.max_file_records:
+            self.__close_file()
+
+    def _is_durable(self):
+        return self._writer is None
+
+    def __close_file(self):
+        """
+        Completes the current file
+        :return:
+        """
+        if self._writer is not None:
+            self._writer.close()
+            os.replace(self._pathname + '.tmp', self._pathname)
+            self._writer = None
+            self._file_records = 0
+
+    def _close(self):
+        self.__close_file()
+        super(ParquetSink, self)._close()
+
+
+class SqliteSink(ArticleSink):
+    """
+    Inserts articles into a table of a SQLite database, one transaction per batch. An article replaces a previously
+    stored article of the same url. Lists and dicts, e.g., the authors, are stored as JSON.
+    """
+
+    def __init__(self, pathname, table='articles', timeout=60, **kwargs):
+        """
+        :param pathname: path name of the database, it is created if it does not exist
+        :param table: name of the table, it is created if it does not exist
+        :param timeout: in seconds that a writer waits for concurrent writers
+        """
+        super(SqliteSink, self).__init__(**kwargs)
+        self.pathname = pathname
+        self.table = table
+        self.timeout = timeout
+        self._connection = None
+        self._connection_pid = None
+
+    def __get_connection(self):
+        """
+        Returns the connection of the current process
+        :return:
+        """
+        if self._connection is None or self._connection_pid != os.getpid():
+            connection = sqlite3.connect(self.pathname, timeout=self.timeout, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            columns = ', '.join('%s TEXT' % field if field != 'url' else 'url TEXT PRIMARY KEY'
+                                for field in ARTICLE_FIELDS)
+            connection.execute('CREATE TABLE IF NOT EXISTS %s (%s)' % (self.table, columns))
+            self._connection = connection
+            self._connection_pid = os.getpid()
+        return self._connection
+
+    def _write_batch(self, records):
+        rows = [tuple(json.dumps(record[field], default=str, ensure_ascii=False)
+                      if isinstance(record[field], (dict, list, tuple)) else record[field]
+                      for field in ARTICLE_FIELDS)
+                for record in records]
+        connection = self.__get_connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            connection.executemany('INSERT OR REPLACE INTO %s (%s) VALUES (%s)'
+                                   % (self.table, ', '.join(ARTICLE_FIELDS), ', '.join('?' * len(ARTICLE_FIELDS))),
+                                   rows)
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+
+    def _close(self):
+        if self._connection is not None and self._connection_pid == os.getpid():
+            self._connection.close()
+        self._connection = None
+        self._connection_pid = None
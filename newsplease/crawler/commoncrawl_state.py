@@ -0,0 +1,148 @@
+"""
+Persists the progress of the extraction from commoncrawl.org, i.e., which WARC files have been fully extracted and up to
+which record the others have been extracted, in a SQLite database. The database may be written concurrently by several
+extraction processes, so that a restarted crawl skips completed WARC files and resumes the others within the file.
+"""
+import logging
+import os
+import sqlite3
+import time
+
+LOGGER = logging.getLogger(__name__)
+
+# file name of the database within the download dir for warc files
+DEFAULT_STATE_FILENAME = 'extractionstate.sqlite'
+
+STATUS_EXTRACTING = 'extracting'
+STATUS_EXTRACTED = 'extracted'
+
+
+class ExtractionStateStore(object):
+    """
+    Stores the extraction status and the offset of the first record that has not been extracted yet for each WARC file.
+    Every process uses a connection of its own, which is opened on first use, so an instance can be created before a
+    process pool is forked. Writes are short transactions; concurrent writers wait for each other up to timeout
+    seconds.
+    """
+
+    def __init__(self, pathname, timeout=60):
+        """
+        :param pathname: path name of the SQLite database, it is created if it does not exist
+        :param timeout: in seconds that a writer waits for the lock of the database
+        """
+        self.pathname = pathname
+        self.timeout = timeout
+        self.__connection = None
+        self.__connection_pid = None
+
+    def __get_connection(self):
+        """
+        Returns the connection of the current process
+        :return:
+        """
+        if self.__connection is None or self.__connection_pid != os.getpid():
+            connection = sqlite3.connect(self.pathname, timeout=self.timeout, isolation_level=None)
+            # readers do not block the writer and vice versa
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute('CREATE TABLE IF NOT EXISTS warc_files ('
+                               'url TEXT PRIMARY KEY, '
+                               'status TEXT NOT NULL, '
+                               'record_offset INTEGER NOT NULL DEFAULT 0, '
+                               'updated REAL NOT NULL)')
+            self.__connection = connection
+            self.__connection_pid = os.getpid()
+        return self.__connection
+
+    def close(self):
+        """
+        Closes the connection of the current process, it is opened again on the next use
+        :return:
+        """
+        if self.__connection is not None and self.__connection_pid == os.getpid():
+            self.__connection.close()
+        self.__connection = None
+        self.__connection_pid = None
+
+    def __set(self, url, status, record_offset):
+        """
+        Saves the status and offset of a WARC file
+        :param url:
+        :param status:
+        :param record_offset:
+        :return:
+        """
+        self.__get_connection().execute('INSERT OR REPLACE INTO warc_files (url, status, record_offset, updated) '
+                                        'VALUES (?, ?, ?, ?)', (url, status, record_offset, time.time()))
+
+    def get_fully_extracted_warc_urls(self):
+        """
+        Returns the urls of all fully extracted WARC files
+        :return: A set of urls
+        """
+        cursor = self.__get_connection().execute('SELECT url FROM warc_files WHERE status = ?', (STATUS_EXTRACTED,))
+        return {row[0] for row in cursor}
+
+    def is_fully_extracted(self, url):
+        """
+        Returns true if the WARC file has been fully extracted
+        :param url:
+        :return:
+        """
+        cursor = self.__get_connection().execute('SELECT 1 FROM warc_files WHERE url = ? AND status = ?',
+                                                 (url, STATUS_EXTRACTED))
+        return cursor.fetchone() is not None
+
+    def get_record_offset(self, url):
+        """
+        Returns the byte offset up to which a WARC file has been extracted
+        :param url:
+        :return: The offset or 0 if the WARC file has not been extracted partially
+        """
+        cursor = self.__get_connection().execute('SELECT record_offset FROM warc_files WHERE url = ? AND status = ?',
+                                                 (url, STATUS_EXTRACTING))
+        row = cursor.fetchone()
+        return row[0] if row else 0
+
+    def set_record_offset(self, url, record_offset):
+        """
+        Saves the byte offset up to which a WARC file has been extracted
+        :param url:
+        :param record_offset: offset of the first record that has not been extracted yet
+        :return:
+        """
+        self.__set(url, STATUS_EXTRACTING, record_offset)
+
+    def set_fully_extracted(self, url):
+        """
+        Registers the WARC file as fully extracted
+        :param url:
+        :return:
+        """
+        self.__set(url, STATUS_EXTRACTED, 0)
+
+    def import_fully_extracted_list(self, pathname):
+        """
+        Imports a log file of fully extracted WARC urls, one per line, as written by previous versions. The file is
+        renamed afterwards, so it is imported only once.
+        :param pathname:
+        :return:
+        """
+        if not os.path.isfile(pathname):
+            return
+
+        with open(pathname) as log_file:
+            urls = [line.strip() for line in log_file if line.strip()]
+
+        connection = self.__get_connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            connection.executemany('INSERT OR REPLACE INTO warc_files (url, status, record_offset, updated) '
+                                   'VALUES (?, ?, 0, ?)', [(url, STATUS_EXTRACTED, time.time()) for url in urls])
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+
+        os.replace(pathname, pathname + '.imported')
+        LOGGER.info('imported %i fully extracted WARC files from %s', len(urls), pathname)
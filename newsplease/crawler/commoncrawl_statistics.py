@@ -0,0 +1,189 @@
+"""
+Aggregates the statistics of the extraction from commoncrawl.org. Each extraction process reports the metrics of a WARC
+file while it is extracted and once it is completed (see CommonCrawlExtractor.get_metrics), and the main process
+combines them to the global throughput, the time spent per stage and the estimated remaining time. The statistics can be exported as JSON or in the
+text format of Prometheus, e.g., for its node exporter.
+"""
+import collections
+import json
+import logging
+import os
+import time
+
+LOGGER = logging.getLogger(__name__)
+
+# stages of the extraction of a WARC file, see CommonCrawlExtractor
+STAGES = ('download', 'read', 'filter', 'extract', 'callback')
+
+FORMAT_JSON = 'json'
+FORMAT_PROMETHEUS = 'prometheus'
+
+
+class ExtractionStatistics(object):
+    """
+    Statistics of all WARC files of one crawl, updated in the main process whenever an extraction process reports the
+    progress within a WARC file or has completed it.
+    """
+
+    def __init__(self, number_of_warc_files, number_of_skipped_warc_files=0, pathname=None, export_format=FORMAT_JSON):
+        """
+        :param number_of_warc_files: number of WARC files of the crawl, including the skipped ones
+        :param number_of_skipped_warc_files: number of WARC files that were extracted by a previous run
+        :param pathname: file the statistics are written to after each WARC file, if None they are only logged
+        :param export_format: FORMAT_JSON or FORMAT_PROMETHEUS
+        """
+        self.number_of_warc_files = number_of_warc_files
+        self.counter_warc_skipped = number_of_skipped_warc_files
+        self.counter_warc_processed = 0
+        self.counters = collections.Counter()
+        self.stage_seconds = collections.Counter()
+        # latest metrics of the WARC files that are being extracted, by url
+        self.metrics_in_progress = {}
+        self.completed_warc_urls = set()
+        self.start_time = time.time()
+        self.pathname = pathname
+        self.export_format = export_format
+
+    def add(self, metrics):
+        """
+        Adds the metrics of a completed WARC file, logs the global statistics and exports them
+        :param metrics: dict of the counters of the WARC file, see CommonCrawlExtractor.get_metrics
+        :return:
+        """
+        self.counter_warc_processed += 1
+        self.metrics_in_progress.pop(metrics.get('warc_url'), None)
+        self.completed_warc_urls.add(metrics.get('warc_url'))
+        self.__add_metrics(self.counters, self.stage_seconds, metrics)
+        self.__publish()
+
+    def update(self, metrics):
+        """
+        Updates the metrics of a WARC file that is still being extracted, logs the global statistics and exports them
+        :param metrics: dict of the counters of the WARC file so far, see CommonCrawlExtractor.get_metrics
+        :return:
+        """
+        # the progress of an extraction process may arrive after the completion of its WARC file
+        if metrics.get('warc_url') in self.completed_warc_urls:
+            return
+        self.metrics_in_progress[metrics.get('warc_url')] = metrics
+        self.__publish()
+
+    @staticmethod
+    def __add_metrics(counters, stage_seconds, metrics):
+        """
+        Adds the metrics of a WARC file to the counters and the seconds per stage
+        :param counters:
+        :param stage_seconds:
+        :param metrics:
+        :return:
+        """
+        for key in ('passed', 'discarded', 'error', 'total', 'records', 'bytes'):
+            counters[key] += metrics.get(key, 0)
+        stage_seconds.update(metrics.get('stages', {}))
+
+    def __publish(self):
+        """
+        Logs the global statistics and exports them
+        :return:
+        """
+        snapshot = self.snapshot()
+        LOGGER.info("warc processing statistics")
+        LOGGER.info("warc files skipped = %i, processed = %i, in progress = %i, remaining = %i, total = %i",
+                    snapshot['warc_files_skipped'], snapshot['warc_files_processed'],
+                    snapshot['warc_files_in_progress'], snapshot['warc_files_remaining'], snapshot['warc_files_total'])
+        LOGGER.info("global [articles/s] = %.2f, [records/s] = %.2f, [MB/s] = %.3f", snapshot['articles_per_second'],
+                    snapshot['records_per_second'], snapshot['megabytes_per_second'])
+        LOGGER.info("global [h/warc] = %.3f", snapshot['seconds_per_warc_file'] / 3600)
+        LOGGER.info("time per stage [s] = %s", ', '.join('%s: %.1f' % (stage, seconds)
+                                                        for stage, seconds in snapshot['stage_seconds'].items()))
+        LOGGER.info("estimated remaining time [h] = %.3f", snapshot['estimated_remaining_seconds'] / 3600)
+
+        if self.pathname:
+            self.export(self.pathname, self.export_format)
+
+    def snapshot(self):
+        """
+        Returns the current statistics. Throughput and remaining time are computed from the wall-clock time since the
+        start, so they account for all extraction processes together. The counters include the WARC files that are
+        being extracted.
+        :return: dict
+        """
+        counters = collections.Counter(self.counters)
+        stage_seconds = collections.Counter(self.stage_seconds)
+        for metrics in self.metrics_in_progress.values():
+            self.__add_metrics(counters, stage_seconds, metrics)
+
+        elapsed_secs = max(time.time() - self.start_time, 1e-6)
+        remaining_warcs = max(self.number_of_warc_files - self.counter_warc_processed - self.counter_warc_skipped, 0)
+        secs_per_warc = elapsed_secs / self.counter_warc_processed if self.counter_warc_processed else 0.0
+
+        return {
+            'elapsed_seconds': elapsed_secs,
+            'warc_files_total': self.number_of_warc_files,
+            'warc_files_processed': self.counter_warc_processed,
+            'warc_files_skipped': self.counter_warc_skipped,
+            'warc_files_in_progress': len(self.metrics_in_progress),
+            'warc_files_remaining': remaining_warcs,
+            'articles_passed': counters['passed'],
+            'articles_discarded': counters['discarded'],
+            'articles_error': counters['error'],
+            'articles_total': counters['total'],
+            'records_total': counters['records'],
+            'bytes_total': counters['bytes'],
+            'articles_per_second': counters['total'] / elapsed_secs,
+            'records_per_second': counters['records'] / elapsed_secs,
+            'megabytes_per_second': counters['bytes'] / 1e6 / elapsed_secs,
+            'seconds_per_warc_file': secs_per_warc,
+            'estimated_remaining_seconds': secs_per_warc * remaining_warcs,
+            # summed over all extraction processes, i.e., CPU time rather than wall-clock time
+            'stage_seconds': {stage: stage_seconds[stage] for stage in STAGES},
+        }
+
+    def export(self, pathname, export_format=FORMAT_JSON):
+        """
+        Writes the current statistics to a file. The file is replaced atomically, so that readers never see a partial
+        file.
+        :param pathname:
+        :param export_format: FORMAT_JSON or FORMAT_PROMETHEUS
+        :return:
+        """
+        snapshot = self.snapshot()
+        if export_format == FORMAT_PROMETHEUS:
+            content = self.__to_prometheus(snapshot)
+        else:
+            content = json.dumps(snapshot, indent=2, sort_keys=True)
+
+        temp_pathname = pathname + '.tmp'
+        with open(temp_pathname, 'w') as export_file:
+            export_file.write(content)
+        os.replace(temp_pathname, pathname)
+
+    @staticmethod
+    def __to_prometheus(snapshot):
+        """
+        Formats the statistics in the text format of Prometheus
+        :param snapshot:
+        :return:
+        """
+        lines = []
+
+        def add(name, metric_type, value, labels=''):
+            if not any(line.startswith('# TYPE %s ' % name) for line in lines):
+                lines.append('# TYPE %s %s' % (name, metric_type))
+            lines.append('%s%s %s' % (name, labels, value))
+
+        for key in ('warc_files_total', 'warc_files_processed', 'warc_files_skipped', 'warc_files_in_progress',
+                    'warc_files_remaining'):
+            add('newsplease_commoncrawl_' + key, 'gauge', snapshot[key])
+        # the sum of all statuses is the total number of articles
+        for key in ('passed', 'discarded', 'error'):
+            add('newsplease_commoncrawl_articles_total', 'counter', snapshot['articles_' + key],
+                '{status="%s"}' % key)
+        add('newsplease_commoncrawl_records_total', 'counter', snapshot['records_total'])
+        add('newsplease_commoncrawl_bytes_total', 'counter', snapshot['bytes_total'])
+        for key in ('articles_per_second', 'records_per_second', 'megabytes_per_second', 'seconds_per_warc_file',
+                    'estimated_remaining_seconds', 'elapsed_seconds'):
+            add('newsplease_commoncrawl_' + key, 'gauge', snapshot[key])
+        for stage, seconds in snapshot['stage_seconds'].items():
+            add('newsplease_commoncrawl_stage_seconds_total', 'counter', seconds, '{stage="%s"}' % stage)
+        return '\n'.join(lines) + '\n'
@@ -26,6 +26,8 @@ class NewscrawlerItem(scrapy.Item):
     html_title = scrapy.Field()
     # Response object from crawler
     spider_response = scrapy.Field()
+    # Parsed representations of the response body, shared by all extractors
+    parsed_document = scrapy.Field()
     # Title of the article as store in the RSS feed
     rss_title = scrapy.Field()
     # Extracted article title
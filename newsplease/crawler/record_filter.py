@@ -0,0 +1,172 @@
+"""
+Cheap filters for WARC records, which are applied before the (expensive) article extraction. HostMatcher replaces the
+substring check of the valid hosts by a lookup of the record's host name and its parent domains in a set. DatePrefilter
+discards records whose publishing date is outside of the date range, judging only from the WARC-Date and the date that
+the DateExtractor finds in the parsed html, which the extraction then reuses.
+"""
+import datetime
+import logging
+
+from dateutil import parser
+from six.moves.urllib.parse import urlsplit
+
+from ..pipeline.extractor.extractors.date_extractor import DateExtractor
+
+LOGGER = logging.getLogger(__name__)
+
+# a date of the prefilter may differ this much from the date of the extracted article, e.g., because of time zones
+DATE_TOLERANCE = datetime.timedelta(days=1)
+
+
+def get_hostname(url):
+    """
+    Returns the lower case host name of an url, without port and user info
+    :param url:
+    :return: The host name or None if the url has none
+    """
+    try:
+        return urlsplit(url).hostname
+    except ValueError:
+        return None
+
+
+def _to_naive(date):
+    """
+    Converts a date to a naive datetime by dropping its time zone, like the DateExtractor does, so that dates with and
+    without time zone can be compared
+    :param date:
+    :return:
+    """
+    return date.replace(tzinfo=None)
+
+
+def _parse_date(date_string):
+    """
+    Parses a date string leniently
+    :param date_string:
+    :return: A naive datetime or None if the string is no date
+    """
+    try:
+        return _to_naive(parser.parse(date_string))
+    except (ValueError, OverflowError, TypeError):
+        return None
+
+
+class HostMatcher(object):
+    """
+    Decides whether an url belongs to one of the valid hosts. A valid host matches itself and all of its subdomains,
+    e.g., 'example.com' matches 'www.example.com' but neither 'example.com.evil.org' nor
+    'g.co/?forward_url=example.com'. Each check looks up the labels of the url's host name in a set, so it does not
+    depend on the number of valid hosts.
+    """
+
+    def __init__(self, valid_hosts=None):
+        """
+        :param valid_hosts: list of host names (if None or empty, any host is OK). Entries may also be given as urls.
+        """
+        self.valid_hosts = set()
+        for valid_host in valid_hosts or []:
+            hostname = get_hostname(valid_host if '//' in valid_host else '//' + valid_host)
+            if hostname:
+                self.valid_hosts.add(hostname.rstrip('.'))
+            else:
+                LOGGER.error('Misconfiguration: invalid host %s will be ignored', valid_host)
+
+    def __bool__(self):
+        return bool(self.valid_hosts)
+
+    def matches(self, url):
+        """
+        Returns true if the url passes the host filter
+        :param url:
+        :return:
+        """
+        if not self.valid_hosts:
+            return True
+
+        hostname = get_hostname(url)
+        if not hostname:
+            return False
+
+        # check the host name and all its parent domains, e.g., www.example.com, example.com, com
+        labels = hostname.rstrip('.').split('.')
+        for i in range(len(labels)):
+            if '.'.join(labels[i:]) in self.valid_hosts:
+                return True
+        return False
+
+
+class DatePrefilter(object):
+    """
+    Decides whether the publishing date of a record is outside of a date range, so that the record can be discarded
+    without extracting its article. First, the WARC-Date is checked, since an article cannot be published long after
+    it was crawled. Then, only the DateExtractor runs on the parsed html, whose date the extraction prefers over the
+    dates of all other extractors; it reads the JSON-LD and <meta> tags, the html and the url with the same precedence
+    as the extraction. Both dates have a tolerance of DATE_TOLERANCE. If the DateExtractor finds no date, the article
+    has to be extracted and filtered by its extracted date.
+
+    The WARC-Date only bounds the date of an article that has a date. Articles without a date pass the date filter
+    unless it is strict, so without strict_date, a record is discarded by its WARC-Date only if the DateExtractor finds
+    a date.
+    """
+
+    def __init__(self, start_date=None, end_date=None, strict_date=True):
+        """
+        :param start_date: if None, any date is OK as start date, as datetime
+        :param end_date: if None, any date is OK as end date, as datetime
+        :param strict_date: if True, articles without a publishing date are discarded by the date filter
+        """
+        self.start_date = _to_naive(start_date) if start_date else None
+        self.end_date = _to_naive(end_date) if end_date else None
+        self.strict_date = strict_date
+        self.date_extractor = DateExtractor()
+
+    def __is_outside(self, earliest, latest):
+        """
+        Returns true if a publishing date between earliest and latest (both may be None) is outside of the date range
+        :param earliest:
+        :param latest:
+        :return:
+        """
+        if self.start_date and latest is not None and latest < self.start_date:
+            return True
+        if self.end_date and earliest is not None and earliest > self.end_date:
+            return True
+        return False
+
+    def discard(self, url, warc_date, parsed_document=None):
+        """
+        Returns true if the record can be discarded without extracting its article
+        :param url: the WARC-Target-URI of the record
+        :param warc_date: the WARC-Date of the record
+        :param parsed_document: the ParsedDocument of the record's html, see NewsPlease.parse_warc_payload. If None,
+        only the WARC-Date is checked.
+        :return:
+        """
+        if not self.start_date and not self.end_date:
+            return False
+
+        # crawl date, only an upper bound of the publishing date
+        crawl_date = _parse_date(warc_date) if warc_date else None
+        crawl_date_outside = crawl_date is not None and self.__is_outside(None, crawl_date + DATE_TOLERANCE)
+        if crawl_date_outside and self.strict_date:
+            return True
+
+        publish_date = self.get_publish_date(url, parsed_document)
+        if publish_date is None:
+            return False
+        return crawl_date_outside or self.__is_outside(publish_date - DATE_TOLERANCE, publish_date + DATE_TOLERANCE)
+
+    def get_publish_date(self, url, parsed_document):
+        """
+        Returns the publishing date that the DateExtractor finds in the html
+        :param url: the WARC-Target-URI of the record
+        :param parsed_document: the ParsedDocument of the html, may be None
+        :return: A naive datetime or None if the DateExtractor finds no date
+        """
+        if parsed_document is None or not parsed_document.body:
+            return None
+
+        item = {'url': url or '', 'parsed_document': parsed_document}
+        publish_date = self.date_extractor.extract(item).publish_date
+        return _parse_date(publish_date) if publish_date else None
@@ -32,17 +32,22 @@ def detect_encoding(bytesobject):
     return None
 
 
-def decode_response(response):
-    """Read the first chunk of server response and decode it"""
-    guessed_encoding = detect_encoding(response.content)
-    LOGGER.debug('response/guessed encoding: %s / %s', response.encoding, guessed_encoding)
+def decode_content(content, declared_encoding=None):
+    """Decode the raw bytes of a server response, preferring the guessed encoding over the declared one"""
+    guessed_encoding = detect_encoding(content)
+    LOGGER.debug('response/guessed encoding: %s / %s', declared_encoding, guessed_encoding)
     # process
     if guessed_encoding is not None:
         try:
-            htmltext = response.content.decode(guessed_encoding)
-        except UnicodeDecodeError:
-            LOGGER.warning('encoding error: %s / %s', response.encoding, guessed_encoding)
-            htmltext = response.text
-    else:
-        htmltext = response.text
-    return htmltext
+            return content.decode(guessed_encoding)
+        except (UnicodeDecodeError, LookupError):
+            LOGGER.warning('encoding error: %s / %s', declared_encoding, guessed_encoding)
+    try:
+        return content.decode(declared_encoding or 'utf-8', errors='replace')
+    except LookupError:
+        return content.decode('utf-8', errors='replace')
+
+
+def decode_response(response):
+    """Read the first chunk of server response and decode it"""
+    return decode_content(response.content, response.encoding)
@@ -1,15 +1,22 @@
 import socket
-import copy
-import threading
 import logging
+import re
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 
 import requests
 import urllib3
 
-from .response_decoder import decode_response
+from .response_decoder import decode_content
 
 MAX_FILE_SIZE = 20000000
 MIN_FILE_SIZE = 10
+# maximum number of downloads at a time of a SimpleCrawler instance
+DEFAULT_MAX_WORKERS = 16
+# size of the chunks the response body is read in
+CHUNK_SIZE = 65536
+
+# to improve performance, regex statements are compiled only once per module
+re_html = re.compile(r'\s*(text/html|application/xhtml\+xml)', re.IGNORECASE)
 
 LOGGER = logging.getLogger(__name__)
 
@@ -21,8 +28,93 @@ HEADERS = {
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
 
+def is_html_content_type(content_type):
+    """
+    Checks the Content-Type header of a response before its body is downloaded
+    :param content_type: value of the header, None if the server did not send it
+    :return: False if the header declares anything else than html. Else True.
+    """
+    return content_type is None or re_html.match(content_type) is not None
+
+
+def is_too_large(content_length):
+    """
+    Checks the Content-Length header of a response before its body is downloaded
+    :param content_length: value of the header, None if the server did not send it
+    :return: True if the header declares more than MAX_FILE_SIZE bytes. Else False.
+    """
+    try:
+        return int(content_length) > MAX_FILE_SIZE
+    except (TypeError, ValueError):
+        return False
+
+
 class SimpleCrawler(object):
-    _results = {}
+    """
+    Downloads the html content of urls. The static methods fetch one or many urls and return when all requests are
+    processed. An instance owns a bounded pool of download threads and hands out each result as soon as its download
+    completes, so that the caller can start working on it before the slowest url has finished. Instances do not share
+    any state, so they can be used by concurrent callers.
+    Usage:
+        with SimpleCrawler(max_workers=16, timeout=10) as crawler:
+            for url, html in crawler.iter_urls(urls):
+                ...
+    """
+
+    def __init__(self, max_workers=DEFAULT_MAX_WORKERS, timeout=None):
+        """
+        :param max_workers: maximum number of downloads at a time
+        :param timeout: in seconds, if None, the urllib default is used
+        """
+        self.timeout = timeout
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """
+        Stops the download threads after the submitted downloads have finished
+        :return:
+        """
+        self.executor.shutdown(wait=True)
+
+    def submit(self, url):
+        """
+        Starts downloading the html content of the parameter url in the background
+        :param url:
+        :return: A future whose result is the html of the url or None
+        """
+        return self.executor.submit(SimpleCrawler._fetch_url, url, timeout=self.timeout)
+
+    def iter_urls(self, urls, max_pending=None):
+        """
+        Crawls the html content of all given urls in parallel and yields them in the order they complete.
+        :param urls:
+        :param max_pending: maximum number of downloads that are submitted but not yet consumed by the caller. If None,
+        all urls are submitted at once.
+        :return: A generator of (url, html) tuples, html is None if the download failed
+        """
+        urls = iter(urls)
+        pending = {}
+        try:
+            while True:
+                for url in urls:
+                    pending[self.submit(url)] = url
+                    if max_pending is not None and len(pending) >= max_pending:
+                        break
+                if not pending:
+                    return
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield pending.pop(future), future.result()
+        finally:
+            # the caller stopped early, do not start the remaining downloads
+            for future in pending:
+                future.cancel()
 
     @staticmethod
     def fetch_url(url, timeout=None):
@@ -32,14 +124,13 @@ class SimpleCrawler(object):
         :param timeout: in seconds, if None, the urllib default is used
         :return:
         """
-        return SimpleCrawler._fetch_url(url, False, timeout=timeout)
+        return SimpleCrawler._fetch_url(url, timeout=timeout)
 
     @staticmethod
-    def _fetch_url(url, is_threaded, timeout=None):
+    def _fetch_url(url, timeout=None):
         """
-        Crawls the html content of the parameter url and saves the html in _results
+        Crawls the html content of the parameter url
         :param url:
-        :param is_threaded: If True, results will be stored for later processing by the fetch_urls method. Else not.
         :param timeout: in seconds, if None, the urllib default is used
         :return: html of the url
         """
@@ -48,7 +139,8 @@ class SimpleCrawler(object):
         try:
             # read by streaming chunks (stream=True, iter_content=xx)
             # so we can stop downloading as soon as MAX_FILE_SIZE is reached
-            response = requests.get(url, timeout=timeout, verify=False, allow_redirects=True, headers=HEADERS)
+            response = requests.get(url, timeout=timeout, verify=False, allow_redirects=True, headers=HEADERS,
+                                    stream=True)
         except (requests.exceptions.MissingSchema, requests.exceptions.InvalidURL):
             LOGGER.error('malformed URL: %s', url)
         except requests.exceptions.TooManyRedirects:
@@ -61,33 +153,55 @@ class SimpleCrawler(object):
         ) as err:
             LOGGER.error('connection/timeout error: %s %s', url, err)
         else:
-            # safety checks
-            if response.status_code != 200:
-                LOGGER.error('not a 200 response: %s', response.status_code)
-            elif response.text is None or len(response.text) < MIN_FILE_SIZE:
-                LOGGER.error('too small/incorrect: %s %s', url, len(response.text))
-            elif len(response.text) > MAX_FILE_SIZE:
-                LOGGER.error('too large: %s %s', url, len(response.text))
-            else:
-                html_str = decode_response(response)
-        if is_threaded:
-            SimpleCrawler._results[url] = html_str
+            with response:
+                # safety checks, as far as possible before the body is downloaded
+                if response.status_code != 200:
+                    LOGGER.error('not a 200 response: %s', response.status_code)
+                elif not is_html_content_type(response.headers.get('Content-Type')):
+                    LOGGER.error('not html: %s %s', url, response.headers.get('Content-Type'))
+                elif is_too_large(response.headers.get('Content-Length')):
+                    LOGGER.error('too large: %s %s', url, response.headers.get('Content-Length'))
+                else:
+                    content = SimpleCrawler._read_content(response, url)
+                    if content is None:
+                        pass
+                    elif len(content) < MIN_FILE_SIZE:
+                        LOGGER.error('too small/incorrect: %s %s', url, len(content))
+                    else:
+                        html_str = decode_content(content, response.encoding)
         return html_str
 
     @staticmethod
-    def fetch_urls(urls, timeout=None):
+    def _read_content(response, url):
+        """
+        Reads the body of a streamed response, aborting as soon as MAX_FILE_SIZE bytes have been received
+        :param response: a response requested with stream=True
+        :param url:
+        :return: the raw body or None if it is too large or the connection failed
+        """
+        content = bytearray()
+        try:
+            for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                content.extend(chunk)
+                if len(content) > MAX_FILE_SIZE:
+                    LOGGER.error('too large: %s', url)
+                    return None
+        except (
+            socket.timeout, requests.exceptions.ConnectionError, requests.exceptions.ChunkedEncodingError,
+            requests.exceptions.Timeout, socket.error
+        ) as err:
+            LOGGER.error('connection/timeout error: %s %s', url, err)
+            return None
+        return bytes(content)
+
+    @staticmethod
+    def fetch_urls(urls, timeout=None, max_workers=DEFAULT_MAX_WORKERS):
         """
         Crawls the html content of all given urls in parallel. Returns when all requests are processed.
         :param urls:
         :param timeout: in seconds, if None, the urllib default is used
-        :return:
+        :param max_workers: maximum number of downloads at a time
+        :return: A dict containing given URLs as keys, and their html or None as corresponding values.
         """
-        threads = [threading.Thread(target=SimpleCrawler._fetch_url, args=(url, True, timeout)) for url in urls]
-        for thread in threads:
-            thread.start()
-        for thread in threads:
-            thread.join()
-
-        results = copy.deepcopy(SimpleCrawler._results)
-        SimpleCrawler._results = {}
-        return results
+        with SimpleCrawler(max_workers=max_workers, timeout=timeout) as crawler:
+            return dict(crawler.iter_urls(urls))
@@ -9,9 +9,7 @@ control the number of processes with the parameter my_number_of_extraction_proce
 You can also crawl and extract articles programmatically, i.e., from within your own code, by using the class
 CommonCrawlCrawler provided in newsplease.crawler.commoncrawl_crawler.py
 
-In case the script crashes and contains a log message in the beginning that states that only 1 file on AWS storage
-was found, make sure that awscli was correctly installed. You can check that by running aws --version from a terminal.
-If aws is not installed, you can (on Ubuntu) also install it using sudo apt-get install awscli.
+The list of WARC files is read from the monthly indexes of commoncrawl.org and cached in my_local_download_dir_warc.
 
 This script uses relative imports to ensure that the latest, local version of news-please is used, instead of the one
 that might have been installed with pip. Hence, you must run this script following this workflow.
@@ -28,6 +26,7 @@ import datetime
 from datetime import date
 
 from ..crawler import commoncrawl_crawler as commoncrawl_crawler
+from ..crawler.commoncrawl_sinks import JsonLinesSink, ParquetSink, SqliteSink
 
 __author__ = "Felix Hamborg"
 __copyright__ = "Copyright 2017"
@@ -48,6 +47,9 @@ my_filter_end_date = None  # datetime.datetime(2016, 12, 31)
 # if date filtering is strict and news-please could not detect the date of an article, the article will be discarded
 my_warc_files_start_date = None # example: datetime.datetime(2020, 3, 1)
 my_filter_strict_date = True
+# if True, articles whose WARC-Date or date found by the DateExtractor show that they were published outside of the
+# date range are discarded before the (expensive) extraction of all other extractors
+my_prefilter_date = True
 # if True, the script checks whether a file has been downloaded already and uses that file instead of downloading
 # again. Note that there is no check whether the file has been downloaded completely or is valid!
 my_reuse_previously_downloaded_files = True
@@ -59,10 +61,26 @@ my_show_download_progress = False
 my_log_level = logging.INFO
 # json export style
 my_json_export_style = 1  # 0 (minimize), 1 (pretty)
+# if set, articles are written in batches to large files (or a database) instead of one JSON file per article, e.g.,
+# JsonLinesSink(my_local_download_dir_article, compression='gzip'), ParquetSink(my_local_download_dir_article) or
+# SqliteSink(os.path.join(my_local_download_dir_article, 'articles.sqlite'))
+my_sink = None
 # number of extraction processes
 my_number_of_extraction_processes = 1
 # if True, the WARC file will be deleted after all articles have been extracted from it
 my_delete_warc_after_extraction = True
+# if True, WARC files are extracted while they are downloaded and never saved to disk; an interrupted WARC file is
+# resumed from its last checkpoint (requires the server to support HTTP range requests, which commoncrawl.org does)
+my_stream_warc = False
+# number of processes extracting the records of a single WARC file; if greater than 1, WARC files are processed one
+# after another and my_number_of_extraction_processes is ignored. Useful if there are few WARC files but many cores
+my_record_extraction_processes = 1
+# if True, articles extracted by several processes are passed on in the order of their records in the WARC file
+my_keep_record_order = True
+# if set, the statistics of all extraction processes (throughput, time per stage, estimated remaining time) are written
+# to this file after each WARC file, either as 'json' or in the text format of 'prometheus'
+my_statistics_pathname = None  # example: './cc_download_warc/statistics.json'
+my_statistics_format = 'json'
 # if True, will continue extraction from the latest fully downloaded but not fully extracted WARC files and then
 # crawling new WARC files. This assumes that the filter criteria have not been changed since the previous run!
 my_continue_process = True
@@ -117,8 +135,8 @@ def on_valid_article_extracted(article):
 def callback_on_warc_completed(warc_path, counter_article_passed, counter_article_discarded,
                                counter_article_error, counter_article_total, counter_warc_processed):
     """
-    This function will be invoked for each WARC file that was processed completely. Parameters represent total values,
-    i.e., cumulated over all all previously processed WARC files.
+    This function will be invoked in the main process for each WARC file that was processed completely. Parameters
+    represent total values, i.e., cumulated over all previously processed WARC files of all extraction processes.
     :param warc_path:
     :param counter_article_passed:
     :param counter_article_discarded:
@@ -151,7 +169,7 @@ def main():
     print("my_number_of_extraction_processes=" + str(my_number_of_extraction_processes))
 
     __setup__()
-    commoncrawl_crawler.crawl_from_commoncrawl(on_valid_article_extracted,
+    commoncrawl_crawler.crawl_from_commoncrawl(on_valid_article_extracted if my_sink is None else None,
                                                callback_on_warc_completed=callback_on_warc_completed,
                                                valid_hosts=my_filter_valid_hosts,
                                                start_date=my_filter_start_date,
@@ -165,7 +183,14 @@ def main():
                                                number_of_extraction_processes=my_number_of_extraction_processes,
                                                log_level=my_log_level,
                                                delete_warc_after_extraction=my_delete_warc_after_extraction,
-                                               continue_process=True)
+                                               continue_process=True,
+                                               stream_warc=my_stream_warc,
+                                               record_extraction_processes=my_record_extraction_processes,
+                                               keep_record_order=my_keep_record_order,
+                                               prefilter_date=my_prefilter_date,
+                                               statistics_pathname=my_statistics_pathname,
+                                               statistics_format=my_statistics_format,
+                                               sink=my_sink)
 
 
 if __name__ == "__main__":
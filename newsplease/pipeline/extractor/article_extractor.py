@@ -1,10 +1,73 @@
 import importlib
 import inspect
 import logging
+import threading
+import time
+from concurrent.futures import CancelledError, ProcessPoolExecutor, ThreadPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+from dotmap import DotMap
+from lxml import etree
+from scrapy.http import TextResponse
 
 from .cleaner import Cleaner
 from .comparer.comparer import Comparer
 from .extractors.abstract_extractor import AbstractExtractor
+from .parsed_document import ParsedDocument
+
+# extractors of a worker process, see _init_worker
+_worker_extractors = None
+
+# article extractors created by get_extractor, keyed by the tuple of extractor names
+_extractor_registry = {}
+_extractor_registry_lock = threading.Lock()
+
+
+def _load_extractors(extractor_list):
+    """Imports and instantiates the given extractors.
+
+    :param extractor_list: List of strings containing all extractors to be initialized.
+    :return: List of extractor instances.
+    """
+    log = logging.getLogger(__name__)
+    extractors = []
+    for extractor in extractor_list:
+
+        module = importlib.import_module(__package__ + '.extractors.' + extractor)
+
+        # check module for subclasses of AbstractExtractor
+        for member in inspect.getmembers(module, inspect.isclass):
+            if issubclass(member[1], AbstractExtractor) and member[0] != 'AbstractExtractor':
+
+                # instantiate extractor
+                instance = getattr(module, member[0], None)()
+                if instance is not None:
+                    log.info('Extractor initialized: %s', extractor)
+                    extractors.append(instance)
+                else:
+                    log.error("Misconfiguration: An unknown Extractor was found and"
+                              " will be ignored: %s", extractor)
+    return extractors
+
+
+def _init_worker(extractor_list):
+    """Initializes the extractors once per worker process."""
+    global _worker_extractors
+    _worker_extractors = _load_extractors(extractor_list)
+
+
+def _extract_in_worker(index, url, body):
+    """Runs a single extractor of a worker process on the given HTML.
+
+    Scrapy responses and parsed trees cannot be pickled, so only the url and the body are sent to the worker.
+
+    :param index: Position of the extractor in the extractor list.
+    :param url: Url of the article.
+    :param body: HTML of the article, decoded if it comes from a scrapy response.
+    :return: ArticleCandidate of the extractor.
+    """
+    item = {'url': url, 'spider_response': DotMap(body=body)}
+    return _worker_extractors[index].extract(item)
 
 
 class Extractor:
@@ -12,33 +75,117 @@ class Extractor:
     be initialized here and added to list_extractor.
     """
 
-    def __init__(self, extractor_list):
+    def __init__(self, extractor_list, executor=None, max_workers=None, timeout=None):
         """
         Initializes all the extractors, comparers and the cleaner.
 
         :param extractor_list: List of strings containing all extractors to be initialized.
+        :param executor: None to run the extractors one after another, 'thread' or 'process' to run them concurrently
+        on a thread or process pool.
+        :param max_workers: Number of workers of the pool, if None the number of extractors is used.
+        :param timeout: Seconds to wait for a single extractor when running concurrently, if None there is no limit.
+        An extractor that exceeds the timeout is skipped for the current article, and the executor is replaced so that
+        the following articles do not wait for its worker.
         """
         self.log = logging.getLogger(__name__)
-        self.extractor_list = []
-        for extractor in extractor_list:
+        self.extractor_names = list(extractor_list)
+        self.extractor_list = _load_extractors(extractor_list)
+        self.timeout = timeout
+        self.executor_type = None
+        self.max_workers = max_workers or len(self.extractor_list)
+        self.executor = None
+        self.executor_lock = threading.Lock()
+
+        if executor in ('process', 'thread'):
+            self.executor_type = executor
+            self.executor = self._create_executor()
+        elif executor is not None:
+            self.log.error("Misconfiguration: Unknown executor %s, extractors will run sequentially.", executor)
 
-            module = importlib.import_module(__package__ + '.extractors.' + extractor)
+        self.cleaner = Cleaner()
+        self.comparer = Comparer()
 
-            # check module for subclasses of AbstractExtractor
-            for member in inspect.getmembers(module, inspect.isclass):
-                if issubclass(member[1], AbstractExtractor) and member[0] != 'AbstractExtractor':
+    def _create_executor(self):
+        """Creates a new executor of the configured type."""
+        if self.executor_type == 'process':
+            return ProcessPoolExecutor(max_workers=self.max_workers, initializer=_init_worker,
+                                       initargs=(self.extractor_names,))
+        return ThreadPoolExecutor(max_workers=self.max_workers)
 
-                    # instantiate extractor
-                    instance = getattr(module, member[0], None)()
-                    if instance is not None:
-                        self.log.info('Extractor initialized: %s', extractor)
-                        self.extractor_list.append(instance)
-                    else:
-                        self.log.error("Misconfiguration: An unknown Extractor was found and"
-                                       " will be ignored: %s", extractor)
+    def _replace_executor(self, executor):
+        """Replaces an executor whose worker exceeded the timeout, unless this has already been done. A running task
+        cannot be cancelled, so the workers of a process pool are terminated. The thread of a thread pool cannot be
+        stopped and is lost until its extractor returns.
 
-        self.cleaner = Cleaner()
-        self.comparer = Comparer()
+        :param executor: The executor that ran the extractor.
+        """
+        with self.executor_lock:
+            if self.executor is not executor:
+                return
+            self.executor = self._create_executor()
+
+        if isinstance(executor, ProcessPoolExecutor):
+            self.log.warning('Terminating the extractor processes, a new process pool is created')
+            # the pool has no public method to stop its workers
+            for process in list((executor._processes or {}).values()):
+                process.terminate()
+        else:
+            self.log.warning('An extractor thread is lost until its extractor returns, a new thread pool is created')
+        executor.shutdown(wait=False)
+
+    @staticmethod
+    def _get_body(item):
+        """Returns the HTML sent to a worker process. The body of a scrapy response is decoded with the encoding of
+        the response, so that the workers do not have to guess the encoding of pages that only declare it in the HTTP
+        header."""
+        response = item['spider_response']
+        if isinstance(response, TextResponse):
+            return response.text
+        return response.body
+
+    def _submit(self, executor, index, item):
+        """Submits the extractor at position index to the executor."""
+        if isinstance(executor, ProcessPoolExecutor):
+            return executor.submit(_extract_in_worker, index, item['url'], self._get_body(item))
+        return executor.submit(self.extractor_list[index].extract, item)
+
+    def _extract_concurrently(self, item):
+        """Runs all extractors on the executor and gathers their results in the order of the extractor list.
+
+        :param item: NewscrawlerItem to be processed.
+        :return: A list of ArticleCandidates, without the ones of extractors that exceeded the timeout or whose
+        worker was terminated.
+        """
+        if self.executor_type == 'thread':
+            # the threads share the parsed document, so it is built before and only read by them
+            document = ParsedDocument.from_item(item)
+            if document.body is not None:
+                try:
+                    document.build()
+                except (ValueError, etree.LxmlError):
+                    # the extractors handle documents that cannot be parsed on their own
+                    pass
+
+        # the executor must not be replaced while the extractors are submitted
+        with self.executor_lock:
+            executor = self.executor
+            futures = [self._submit(executor, index, item) for index in range(len(self.extractor_list))]
+        deadline = None if self.timeout is None else time.time() + self.timeout
+
+        article_candidates = []
+        for extractor, future in zip(self.extractor_list, futures):
+            try:
+                remaining = None if deadline is None else max(0, deadline - time.time())
+                article_candidates.append(future.result(timeout=remaining))
+            except TimeoutError:
+                future.cancel()
+                self.log.warning('%s: Extractor %s exceeded the timeout of %s s and was skipped',
+                                 item['url'], extractor.name, self.timeout)
+                self._replace_executor(executor)
+            except (BrokenProcessPool, CancelledError):
+                # the pool was replaced because of the timeout of another article
+                self.log.warning('%s: Extractor %s was stopped and skipped', item['url'], extractor.name)
+        return article_candidates
 
     def extract(self, item):
         """Runs the HTML-response trough a list of initialized extractors, a cleaner and compares the results.
@@ -47,11 +194,14 @@ class Extractor:
         :return: An updated NewscrawlerItem including the results of the extraction
         """
 
-        article_candidates = []
+        if self.executor is not None:
+            article_candidates = self._extract_concurrently(item)
+        else:
+            article_candidates = []
 
-        for extractor in self.extractor_list:
-            article_candidate = extractor.extract(item)
-            article_candidates.append(article_candidate)
+            for extractor in self.extractor_list:
+                article_candidate = extractor.extract(item)
+                article_candidates.append(article_candidate)
 
         article_candidates = self.cleaner.clean(article_candidates)
         article = self.comparer.compare(item, article_candidates)
@@ -65,3 +215,29 @@ class Extractor:
         item['article_language'] = article.language
 
         return item
+
+    def close(self):
+        """Shuts down the executor, if any. Extractors still running are not waited for."""
+        with self.executor_lock:
+            executor, self.executor = self.executor, None
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+
+def get_extractor(extractor_list):
+    """Returns the sequential article extractor for the given extractors. It is created on first use and then reused by
+    all callers of the same process, so importing and initializing the extractors, the cleaner and the comparers is
+    only done once.
+
+    :param extractor_list: List of strings containing all extractors to be initialized.
+    :return: An Extractor.
+    """
+    key = tuple(extractor_list)
+    extractor = _extractor_registry.get(key)
+    if extractor is None:
+        with _extractor_registry_lock:
+            extractor = _extractor_registry.get(key)
+            if extractor is None:
+                extractor = Extractor(list(key))
+                _extractor_registry[key] = extractor
+    return extractor
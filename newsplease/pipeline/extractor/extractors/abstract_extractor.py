@@ -1,6 +1,7 @@
 from abc import ABCMeta, abstractmethod
 
 from ..article_candidate import ArticleCandidate
+from ..parsed_document import ParsedDocument
 
 
 class AbstractExtractor:
@@ -17,6 +18,10 @@ class AbstractExtractor:
         """Returns the name of the article extractor."""
         return self.name
 
+    def _document(self, item):
+        """Returns the ParsedDocument of the given item, which is shared by all extractors."""
+        return ParsedDocument.from_item(item)
+
     def _language(self, item):
         """Returns the language of the extracted article."""
         return None
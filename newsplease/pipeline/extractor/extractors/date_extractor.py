@@ -1,11 +1,10 @@
-import json
 import re
-from copy import deepcopy
 
-from bs4 import BeautifulSoup
 from dateutil.parser import parse
+from lxml import etree
 
 from .abstract_extractor import AbstractExtractor
+from ..parsed_document import ParsedDocument
 
 try:
     import urllib.request as urllib2
@@ -17,6 +16,9 @@ re_pub_date = re.compile(
     r'([\./\-_]{0,1}(19|20)\d{2})[\./\-_]{0,1}(([0-3]{0,1}[0-9][\./\-_])|(\w{3,5}[\./\-_]))([0-3]{0,1}[0-9][\./\-]{0,1})?'
 )
 re_class = re.compile("pubdate|timestamp|article_date|articledate|date", re.IGNORECASE)
+xpath_time = etree.XPath('//time')
+xpath_span_date_published = etree.XPath('//span[@itemprop="datePublished"]')
+xpath_date_class = etree.XPath('//*[self::span or self::p or self::div][@class]')
 
 
 class DateExtractor(AbstractExtractor):
@@ -27,30 +29,36 @@ class DateExtractor(AbstractExtractor):
     def __init__(self):
         self.name = "date_extractor"
 
+    def _document_of(self, item):
+        """Returns the ParsedDocument of the article, which is downloaded if the item has no html."""
+        document = self._document(item)
+        if document.body is None:
+            request = urllib2.Request(item['url'])
+            # Using a browser user agent, decreases the change of sites blocking this request - just a suggestion
+            # request.add_header('User-Agent', 'Mozilla/5.0 (Windows NT 6.1) AppleWebKit/537.36 (KHTML, like Gecko)
+            # Chrome/41.0.2228.0 Safari/537.36')
+            document = ParsedDocument(urllib2.build_opener().open(request).read())
+            # share the downloaded article with the other stages
+            item['parsed_document'] = document
+        return document
+
     def _publish_date(self, item):
         """Returns the publish_date of the extracted article."""
 
         url = item['url']
-        html = deepcopy(item['spider_response'].body)
         publish_date = None
 
         try:
-            if html is None:
-                request = urllib2.Request(url)
-                # Using a browser user agent, decreases the change of sites blocking this request - just a suggestion
-                # request.add_header('User-Agent', 'Mozilla/5.0 (Windows NT 6.1) AppleWebKit/537.36 (KHTML, like Gecko)
-                # Chrome/41.0.2228.0 Safari/537.36')
-                html = urllib2.build_opener().open(request).read()
-
-            html = BeautifulSoup(html, "lxml")
-
-            publish_date = self._extract_from_json(html)
-            src = "json"
+            document = self._document_of(item)
+
+            # JSON-LD and <meta> tags
+            publish_date = self.format_date(document.metadata['datePublished'])
+            src = "metadata"
+            if publish_date is None and document.metadata['image'] is not None:
+                publish_date = self._extract_from_url(document.metadata['image'])
+                src = "image"
             if publish_date is None:
-                publish_date = self._extract_from_meta(html)
-                src = "meta"
-            if publish_date is None:
-                publish_date = self._extract_from_html_tag(html)
+                publish_date = self._extract_from_html_tag(document.tree)
                 src = "html"
             if publish_date is None:
                 publish_date = self._extract_from_url(url)
@@ -63,6 +71,22 @@ class DateExtractor(AbstractExtractor):
 
         return publish_date
 
+    def _author(self, item):
+        """Returns the authors of the JSON-LD and <meta> tags of the extracted article."""
+        try:
+            return self._document_of(item).metadata['author']
+        except Exception:
+            return None
+
+    @staticmethod
+    def format_date(date):
+        if date is None:
+            return None
+        try:
+            return date.strftime('%Y-%m-%d %H:%M:%S')
+        except ValueError:
+            return None
+
     def parse_date_str(self, date_string):
         try:
             date = parse(date_string)
@@ -79,172 +103,31 @@ class DateExtractor(AbstractExtractor):
             return self.parse_date_str(m.group(0))
         return None
 
-    def _extract_from_json(self, html):
-        date = None
-        try:
-            scripts = html.findAll('script', type='application/ld+json')
-            if scripts is None:
-                return None
-
-            for script in scripts:
-                data = json.loads(script.string)
-
-                try:
-                    date = self.parse_date_str(data['datePublished'])
-                except (Exception, TypeError):
-                    pass
-
-                try:
-                    date = self.parse_date_str(data['dateCreated'])
-                except (Exception, TypeError):
-                    pass
-        except (Exception, TypeError):
-            return None
-
-        return date
-
-    def _extract_from_meta(self, html):
-        date = None
-        for meta in html.findAll("meta"):
-            meta_name = meta.get('name', '').lower()
-            item_prop = meta.get('itemprop', '').lower()
-            http_equiv = meta.get('http-equiv', '').lower()
-            meta_property = meta.get('property', '').lower()
-
-            # <meta name="createdate" content="2020/12/24 10:05:26" />
-            if 'createdate' == meta_name:
-                date = meta['content'].strip()
-                break
-            
-            # <meta name="pubdate" content="2015-11-26T07:11:02Z" >
-            if 'pubdate' == meta_name:
-                date = meta['content'].strip()
-                break
-
-            # <meta name='publishdate' content='201511261006'/>
-            if 'publishdate' == meta_name:
-                date = meta['content'].strip()
-                break
-
-            # <meta name="timestamp"  data-type="date" content="2015-11-25 22:40:25" />
-            if 'timestamp' == meta_name:
-                date = meta['content'].strip()
-                break
-
-            # <meta name="DC.date.issued" content="2015-11-26">
-            if 'dc.date.issued' == meta_name:
-                date = meta['content'].strip()
-                break
-
-            # <meta property="article:published_time"  content="2015-11-25" />
-            if 'article:published_time' == meta_property:
-                date = meta['content'].strip()
-                break
-                # <meta name="Date" content="2015-11-26" />
-            if 'date' == meta_name:
-                date = meta['content'].strip()
-                break
-
-            # <meta property="bt:pubDate" content="2015-11-26T00:10:33+00:00">
-            if 'bt:pubdate' == meta_property:
-                date = meta['content'].strip()
-                break
-                # <meta name="sailthru.date" content="2015-11-25T19:56:04+0000" />
-            if 'sailthru.date' == meta_name:
-                date = meta['content'].strip()
-                break
-
-            # <meta name="article.published" content="2015-11-26T11:53:00.000Z" />
-            if 'article.published' == meta_name:
-                date = meta['content'].strip()
-                break
-
-            # <meta name="published-date" content="2015-11-26T11:53:00.000Z" />
-            if 'published-date' == meta_name:
-                date = meta['content'].strip()
-                break
-
-            # <meta name="article.created" content="2015-11-26T11:53:00.000Z" />
-            if 'article.created' == meta_name:
-                date = meta['content'].strip()
-                break
-
-            # <meta name="article_date_original" content="Thursday, November 26, 2015,  6:42 AM" />
-            if 'article_date_original' == meta_name:
-                date = meta['content'].strip()
-                break
-
-            # <meta name="cXenseParse:recs:publishtime" content="2015-11-26T14:42Z"/>
-            if 'cxenseparse:recs:publishtime' == meta_name:
-                date = meta['content'].strip()
-                break
-
-            # <meta name="DATE_PUBLISHED" content="11/24/2015 01:05AM" />
-            if 'date_published' == meta_name:
-                date = meta['content'].strip()
-                break
-
-            # <meta itemprop="datePublished" content="2015-11-26T11:53:00.000Z" />
-            if 'datepublished' == item_prop:
-                date = meta['content'].strip()
-                break
-
-            # <meta itemprop="datePublished" content="2015-11-26T11:53:00.000Z" />
-            if 'datecreated' == item_prop:
-                date = meta['content'].strip()
-                break
-
-            # <meta itemprop="datePublished" content="2020-12-24T11:26:18+0700" />
-            if 'datePublished' == item_prop:
-                date = meta['content'].strip()
-                break
-
-            # <meta property="og:image" content="http://www.dailytimes.com.pk/digital
-            # _images/400/2015-11-26/norway-return-number-of-asylum-seekers-to-pakistan-1448538771-7363.jpg"/>
-            if 'og:image' == meta_property or "image" == item_prop:
-                url = meta['content'].strip()
-                possible_date = self._extract_from_url(url)
-                if possible_date is not None:
-                    return self.parse_date_str(possible_date)
-
-            # <meta http-equiv="data" content="10:27:15 AM Thursday, November 26, 2015">
-            if 'date' == http_equiv:
-                date = meta['content'].strip()
-                break
-
-        if date is not None:
-            return self.parse_date_str(date)
-
-        return None
-
-    def _extract_from_html_tag(self, html):
+    def _extract_from_html_tag(self, tree):
         # <time>
-        for time in html.findAll("time"):
+        for time in xpath_time(tree):
             datetime = time.get('datetime', '')
             if len(datetime) > 0:
                 return self.parse_date_str(datetime)
 
-            datetime = time.get('class', '')
+            datetime = time.get('class', '').split()
             if len(datetime) > 0 and datetime[0].lower() == "timestamp":
-                return self.parse_date_str(time.string)
+                return self.parse_date_str(time.text if len(time) == 0 else None)
 
-        tag = html.find("span", {"itemprop": "datePublished"})
-        if tag is not None:
-            date_string = tag.get("content")
+        tags = xpath_span_date_published(tree)
+        if tags:
+            date_string = tags[0].get("content")
             if date_string is None:
-                date_string = tag.text
+                date_string = tags[0].text_content()
             if date_string is not None:
                 return self.parse_date_str(date_string)
 
         # class=
-        for tag in html.find_all(['span', 'p', 'div'], class_=re_class):
-            date_string = tag.string
-            if date_string is None:
-                date_string = tag.text
-
-            date = self.parse_date_str(date_string)
+        for tag in xpath_date_class(tree):
+            if re_class.search(tag.get('class')):
+                date = self.parse_date_str(tag.text_content())
 
-            if date is not None:
-                return date
+                if date is not None:
+                    return date
 
         return None
@@ -3,7 +3,6 @@ import re
 
 from langdetect import detect
 from langdetect.lang_detect_exception import LangDetectException
-from lxml import html
 
 from .abstract_extractor import AbstractExtractor
 
@@ -22,8 +21,7 @@ class LangExtractor(AbstractExtractor):
         """Returns the language of the extracted article by analyzing metatags and inspecting the visible text
         with langdetect"""
 
-        response = item['spider_response'].body
-        root = html.fromstring(response)
+        root = self._document(item).tree
 
         # Check for lang-attributes
         lang = root.get('lang')
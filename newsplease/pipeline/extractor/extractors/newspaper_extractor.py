@@ -26,7 +26,7 @@ class NewspaperExtractor(AbstractExtractor):
         article_candidate.extractor = self._name()
 
         article = Article('')
-        article.set_html(item['spider_response'].body)
+        article.set_html(self._document(item).body)
         article.parse()
         article_candidate.title = article.title
         article_candidate.description = article.meta_description
@@ -1,4 +1,4 @@
-from copy import deepcopy
+import copy
 
 from readability import Document
 
@@ -22,7 +22,9 @@ class ReadabilityExtractor(AbstractExtractor):
         :return: ArticleCandidate containing the recovered article data.
         """
 
-        doc = Document(deepcopy(item['spider_response'].body))
+        # readability removes hidden elements from the tree it is given, so it gets a copy of the shared tree that all
+        # other extractors and pipeline stages read
+        doc = Document(copy.deepcopy(self._document(item).tree))
         description = doc.summary()
 
         article_candidate = ArticleCandidate()
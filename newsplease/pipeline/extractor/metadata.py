@@ -0,0 +1,186 @@
+"""
+Harvests the structured metadata of an article, i.e., its JSON-LD, OpenGraph and other <meta> tags, in a single pass
+over the lxml tree of the article. The result is a dict with the fields METADATA_FIELDS, which is built once per item
+(see ParsedDocument.metadata) and read by all stages that need the metadata, e.g., DateExtractor and
+DateModifiedExtractor, so that they neither parse the html again nor disagree about the dates.
+"""
+import json
+
+from dateutil import parser
+from lxml import etree
+
+# fields of the metadata and their types:
+#   datePublished, dateModified: datetime
+#   author: list of str
+#   headline, image, inLanguage: str
+METADATA_FIELDS = ('datePublished', 'dateModified', 'author', 'headline', 'image', 'inLanguage')
+
+# <meta> tags of each field, by the lower case value of their name, property, itemprop or http-equiv attribute
+META_DATE_NAMES = frozenset(['createdate', 'pubdate', 'publishdate', 'timestamp', 'dc.date.issued', 'date',
+                             'sailthru.date', 'article.published', 'published-date', 'article.created',
+                             'article_date_original', 'cxenseparse:recs:publishtime', 'date_published'])
+META_DATE_PROPERTIES = frozenset(['article:published_time', 'bt:pubdate'])
+META_DATE_ITEMPROPS = frozenset(['datepublished', 'datecreated'])
+META_DATE_HTTP_EQUIVS = frozenset(['date'])
+META_TAGS = {
+    'datePublished': {'name': META_DATE_NAMES, 'property': META_DATE_PROPERTIES, 'itemprop': META_DATE_ITEMPROPS,
+                      'http-equiv': META_DATE_HTTP_EQUIVS},
+    'dateModified': {'name': frozenset(['last-modified', 'dc.date.modified']),
+                     'property': frozenset(['article:modified_time', 'og:updated_time']),
+                     'itemprop': frozenset(['datemodified'])},
+    'author': {'name': frozenset(['author', 'dc.creator']), 'property': frozenset(['article:author'])},
+    'headline': {'property': frozenset(['og:title']), 'name': frozenset(['twitter:title'])},
+    'image': {'property': frozenset(['og:image']), 'itemprop': frozenset(['image']),
+              'name': frozenset(['twitter:image'])},
+    'inLanguage': {'property': frozenset(['og:locale']), 'http-equiv': frozenset(['content-language']),
+                   'name': frozenset(['language'])},
+}
+
+# JSON-LD keys of each field, in the order of precedence
+JSON_LD_KEYS = {
+    'datePublished': ('datePublished', 'dateCreated'),
+    'dateModified': ('dateModified',),
+    'author': ('author', 'creator'),
+    'headline': ('headline',),
+    'image': ('image', 'thumbnailUrl'),
+    'inLanguage': ('inLanguage',),
+}
+
+# to improve performance, xpath expressions are compiled only once per module
+# both kinds of elements in document order
+xpath_metadata = etree.XPath('//script[@type="application/ld+json"] | //meta[@content]')
+
+
+def parse_date(value):
+    """
+    Parses a date leniently
+    :param value:
+    :return: A datetime or None if the value is no date
+    """
+    if not isinstance(value, str):
+        return None
+    try:
+        return parser.parse(value.strip())
+    except (ValueError, OverflowError, TypeError):
+        return None
+
+
+def _get_name(value):
+    """
+    Returns the name of a JSON-LD value that is either a string or an object, e.g., a Person or a Language
+    :param value:
+    :return: The name or None
+    """
+    if isinstance(value, dict):
+        value = value.get('name') or value.get('alternateName') or value.get('url')
+    if isinstance(value, str) and value.strip():
+        return value.strip()
+    return None
+
+
+def _to_authors(value):
+    """
+    Converts a JSON-LD or <meta> author to a list of names
+    :param value: a string, an object or a list of them
+    :return: A list of names or None
+    """
+    values = value if isinstance(value, list) else [value]
+    authors = [name for name in (_get_name(author) for author in values) if name]
+    return authors or None
+
+
+def _to_image(value):
+    """
+    Converts a JSON-LD or <meta> image to its url
+    :param value: a string, an ImageObject or a list of them
+    :return: The url or None
+    """
+    if isinstance(value, list):
+        value = value[0] if value else None
+    if isinstance(value, dict):
+        value = value.get('url') or value.get('contentUrl')
+    if isinstance(value, str) and value.strip():
+        return value.strip()
+    return None
+
+
+# converts a raw value of each field to its type, None if the value cannot be converted
+CONVERTERS = {
+    'datePublished': parse_date,
+    'dateModified': parse_date,
+    'author': _to_authors,
+    'headline': _get_name,
+    'image': _to_image,
+    'inLanguage': _get_name,
+}
+
+
+def _iter_json_ld_objects(data):
+    """
+    Yields all objects of a JSON-LD document, including the ones in lists and in @graph
+    :param data:
+    :return:
+    """
+    if isinstance(data, list):
+        for value in data:
+            yield from _iter_json_ld_objects(value)
+    elif isinstance(data, dict):
+        yield data
+        if '@graph' in data:
+            yield from _iter_json_ld_objects(data['@graph'])
+
+
+def _is_article(json_ld_object):
+    """
+    Returns true if a JSON-LD object describes an article, e.g., a NewsArticle or a BlogPosting
+    :param json_ld_object:
+    :return:
+    """
+    types = json_ld_object.get('@type')
+    types = types if isinstance(types, list) else [types]
+    return any(isinstance(type_, str) and (type_.endswith('Article') or type_ == 'BlogPosting') for type_ in types)
+
+
+def harvest(tree):
+    """
+    Harvests the metadata of an article. For each field, the values of JSON-LD objects that describe an article take
+    precedence over the values of other JSON-LD objects, which take precedence over the values of <meta> tags; values
+    of the same kind are taken in document order. Values that cannot be converted to the type of the field, e.g.,
+    invalid dates, are skipped.
+    :param tree: the lxml tree of the article
+    :return: dict with the fields METADATA_FIELDS, None for fields that were not found
+    """
+    article_objects = []
+    other_objects = []
+    meta_values = {field: [] for field in METADATA_FIELDS}
+
+    for element in xpath_metadata(tree):
+        if element.tag == 'script':
+            try:
+                data = json.loads(element.text or '', strict=False)
+            except ValueError:
+                continue
+            for json_ld_object in _iter_json_ld_objects(data):
+                (article_objects if _is_article(json_ld_object) else other_objects).append(json_ld_object)
+            continue
+
+        content = element.get('content')
+        for field, attributes in META_TAGS.items():
+            if any(element.get(attribute, '').lower() in values for attribute, values in attributes.items()):
+                meta_values[field].append(content)
+
+    language = tree.get('lang') if tree.tag == 'html' else None
+    if language:
+        meta_values['inLanguage'].append(language)
+
+    metadata = {}
+    for field in METADATA_FIELDS:
+        metadata[field] = None
+        candidates = [json_ld_object.get(key) for json_ld_object in article_objects + other_objects
+                      for key in JSON_LD_KEYS[field] if json_ld_object.get(key) is not None]
+        for candidate in candidates + meta_values[field]:
+            value = CONVERTERS[field](candidate)
+            if value is not None:
+                metadata[field] = value
+                break
+    return metadata
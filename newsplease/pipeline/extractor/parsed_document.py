@@ -0,0 +1,63 @@
+from lxml import html as lxml_html
+from scrapy.http import TextResponse
+
+from . import metadata
+
+# parser used for already decoded HTML, see readability's build_doc
+utf8_parser = lxml_html.HTMLParser(encoding='utf-8')
+
+
+class ParsedDocument:
+    """This class holds the parsed representations of an article's HTML. Every representation is built lazily and at
+    most once per item, so that all extractors and pipeline stages can share it instead of parsing the HTML again.
+    """
+
+    def __init__(self, body, response=None):
+        """
+        :param body: The raw HTML of the article, either as str or bytes.
+        :param response: The scrapy response the body belongs to, if any. Its selector is reused as lxml tree.
+        """
+        self.body = body
+        self.response = response
+        self._tree = None
+        self._metadata = None
+
+    @classmethod
+    def from_item(cls, item):
+        """Returns the ParsedDocument cached on the given item and creates it on first access.
+
+        :param item: A NewscrawlerItem.
+        :return: The ParsedDocument of the item.
+        """
+        document = item.get('parsed_document')
+        if document is None:
+            response = item['spider_response']
+            document = cls(response.body, response if isinstance(response, TextResponse) else None)
+            item['parsed_document'] = document
+        return document
+
+    @property
+    def tree(self):
+        """Returns the lxml tree (an HtmlElement of the <html> root) of the article."""
+        if self._tree is None:
+            if self.response is not None:
+                # scrapy already parsed the response with lxml.html, reuse its tree
+                self._tree = self.response.selector.root
+            elif isinstance(self.body, str):
+                self._tree = lxml_html.document_fromstring(self.body.encode('utf-8', 'replace'), parser=utf8_parser)
+            else:
+                self._tree = lxml_html.document_fromstring(self.body)
+        return self._tree
+
+    def build(self):
+        """Builds all representations right away, e.g., before the document is shared by several threads, which then
+        only read it instead of building it concurrently."""
+        self.tree
+        self.metadata
+
+    @property
+    def metadata(self):
+        """Returns the JSON-LD, OpenGraph and <meta> metadata of the article, see metadata.harvest."""
+        if self._metadata is None:
+            self._metadata = metadata.harvest(self.tree)
+        return self._metadata
@@ -2,17 +2,25 @@
 #
 # Don't forget to add your pipeline to the ITEM_PIPELINES setting
 # See: http://doc.scrapy.org/en/latest/topics/item-pipeline.html
+import collections
 import datetime
+import hashlib
 import json
 import logging
 import os.path
+import queue
 import sys
+import threading
+import time
 
 import pymysql
 import psycopg2
+import psycopg2.extras
 from dateutil import parser as dateparser
+import elasticsearch.helpers
 from elasticsearch import Elasticsearch
 from scrapy.exceptions import DropItem
+from twisted.internet import task, threads
 
 from NewsArticle import NewsArticle
 from .extractor import article_extractor
@@ -21,6 +29,11 @@ from ..config import CrawlerConfig
 if sys.version_info[0] < 3:
     ConnectionError = OSError
 
+# errors of requests to Elasticsearch. Since version 8, the client raises ApiError for error responses and
+# TransportError only for failed connections.
+ELASTICSEARCH_ERRORS = (elasticsearch.TransportError,) + \
+    ((elasticsearch.ApiError,) if hasattr(elasticsearch, 'ApiError') else ())
+
 try:
     import numpy as np
     import pandas as pd
@@ -28,6 +41,11 @@ except ImportError:
     np = None
     pd = None
 
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
 
 class HTMLCodeHandling(object):
     """
@@ -54,40 +72,164 @@ class ArticleMasterExtractor(object):
     def __init__(self):
         self.log = logging.getLogger(__name__)
         self.cfg = CrawlerConfig.get_instance()
-        self.extractor_list = self.cfg.section("ArticleMasterExtractor")[
-            "extractors"]
+        self.config = self.cfg.section("ArticleMasterExtractor")
+        self.extractor_list = self.config["extractors"]
 
-        self.extractor = article_extractor.Extractor(self.extractor_list)
+        self.extractor = article_extractor.Extractor(self.extractor_list,
+                                                     executor=self.config.get("executor"),
+                                                     max_workers=self.config.get("max_workers"),
+                                                     timeout=self.config.get("extractor_timeout"))
 
     def process_item(self, item, spider):
-        return self.extractor.extract(item)
+        if self.extractor.executor is None:
+            return self.extractor.extract(item)
+        # waiting for the executor must not block the reactor, so wait on a thread of the reactor's pool
+        return threads.deferToThread(self.extractor.extract, item)
 
+    def close_spider(self, spider):
+        self.extractor.close()
 
-class RSSCrawlCompare(object):
+
+def write_batch(items, store_versions, conn, errors, log, on_written=None, on_failed=None):
     """
-    Compares the item's age to the current version in the DB.
-    If the difference is greater than delta_time, then save the newer version.
+    Writes buffered articles to a DB in one transaction, used by MySQLBatchWriter and PostgresqlStorage.
+    The buffer is split into rounds in which every url occurs at most once, e.g., a url that was crawled twice is
+    stored in the first round and archived in the second one, so that its versions are stored in the order they were
+    crawled. If the transaction fails, the articles are written one by one, so that only the failing ones are lost.
+    :param items: list of dicts of the columns of the articles, with their url
+    :param store_versions: function that stores a list of articles with distinct urls, without commit
+    :param conn: DB connection whose transaction is committed or rolled back
+    :param errors: exception classes of failed writes
+    :param log:
+    :param on_written: if set, it is invoked with every article that was written
+    :param on_failed: if set, it is invoked with every article that could not be written
+    :return:
     """
-    log = None
-    cfg = None
-    delta_time = None
-    database = None
-    conn = None
-    cursor = None
+    rounds = []
+    occurrences = {}
+    for current_version_list in items:
+        occurrence = occurrences.get(current_version_list['url'], 0)
+        occurrences[current_version_list['url']] = occurrence + 1
+        if occurrence == len(rounds):
+            rounds.append([])
+        rounds[occurrence].append(current_version_list)
+
+    try:
+        for current_versions in rounds:
+            store_versions(current_versions)
+        conn.commit()
+        log.info("%i articles inserted into the database.", len(items))
+        written = items
+    except errors as error:
+        conn.rollback()
+        if len(items) == 1:
+            log.error("Something went wrong in commit: %s", error)
+            written = []
+            if on_failed:
+                on_failed(items[0])
+        else:
+            log.warning("Writing %i articles failed, writing them one by one: %s", len(items), error)
+            written = [current_version_list for current_version_list in items
+                       if _write_single(current_version_list, store_versions, conn, errors, log, on_failed)]
+
+    if on_written:
+        for current_version_list in written:
+            on_written(current_version_list)
+
 
-    # Defined DB query to retrieve the last version of the article
-    compare_versions = ("SELECT * FROM CurrentVersions WHERE url=%s")
+def _write_single(current_version_list, store_versions, conn, errors, log, on_failed=None):
+    """
+    Writes a single article in a transaction of its own, see write_batch
+    :return: True if the article was written
+    """
+    try:
+        store_versions([current_version_list])
+        conn.commit()
+        return True
+    except errors as error:
+        conn.rollback()
+        log.error("Something went wrong in commit of %s: %s", current_version_list['url'], error)
+        if on_failed:
+            on_failed(current_version_list)
+        return False
+
+
+class MySQLBatchWriter(object):
+    """
+    Shared access to the MySQL DB for RSSCrawlCompare and MySQLStorage. Both pipelines of a process use the same
+    connection, the same write buffer and the same cache of the current download dates.
+    Articles are buffered and written in one transaction once batch_size articles have been buffered, flush_interval
+    seconds have passed since the last write or the last pipeline is closed. The download dates of looked up and
+    written articles are cached in-process, so that the RSS crawlers do not query the DB for every article of a feed.
+    Usage:
+        writer = MySQLBatchWriter.get_instance()
+        ...
+        writer.release()
+    """
+
+    instance = None
+    users = 0
+
+    errors = (pymysql.err.OperationalError, pymysql.ProgrammingError, pymysql.InternalError,
+              pymysql.IntegrityError, pymysql.DataError, TypeError)
+
+    # initialize necessary DB queries
+    compare_versions = ("SELECT id, url, download_date, version FROM CurrentVersions WHERE url IN %s \
+                          ORDER BY version")
+    insert_current = ("INSERT INTO CurrentVersions(local_path,\
+                          modified_date,download_date,source_domain,url,\
+                          html_title, ancestor, descendant, version,\
+                          rss_title) VALUES (%(local_path)s,\
+                          %(modified_date)s, %(download_date)s,\
+                          %(source_domain)s, %(url)s, %(html_title)s,\
+                          %(ancestor)s, %(descendant)s, %(version)s,\
+                          %(rss_title)s)")
+
+    # copies the old versions to the archive, their descendant is the new version that references them as ancestor
+    insert_archive = ("INSERT INTO ArchiveVersions(id, local_path,\
+                          modified_date,download_date,source_domain,url,\
+                          html_title, ancestor, descendant, version,\
+                          rss_title) SELECT old.id, old.local_path,\
+                          old.modified_date, old.download_date,\
+                          old.source_domain, old.url, old.html_title,\
+                          old.ancestor, new.id, old.version,\
+                          old.rss_title FROM CurrentVersions old \
+                          JOIN CurrentVersions new ON new.ancestor = old.id \
+                          WHERE old.id IN %s")
+
+    delete_from_current = ("DELETE FROM CurrentVersions WHERE id IN %s")
+
+    @classmethod
+    def get_instance(cls):
+        """
+        Returns the writer of this process, it is closed once every user has released it
+        :return:
+        """
+        if cls.instance is None:
+            cls.instance = cls()
+        cls.users += 1
+        return cls.instance
 
     def __init__(self):
         self.log = logging.getLogger(__name__)
-
         self.cfg = CrawlerConfig.get_instance()
-        self.delta_time = self.cfg.section("Crawler")[
-            "hours_to_pass_for_redownload_by_rss_crawler"]
         self.database = self.cfg.section("MySQL")
+        # Number of articles that are written in one transaction, 1 writes every article immediately
+        self.batch_size = max(int(self.database.get("batch_size", 1)), 1)
+        # Seconds after which buffered articles are written, even if the batch is not full
+        self.flush_interval = float(self.database.get("flush_interval", 5))
+        # Maximum number of urls and seconds the download date of an article is cached
+        self.cache_size = int(self.database.get("cache_size", 100000))
+        self.cache_ttl = float(self.database.get("cache_ttl", 300))
+
+        self.items = []
+        self.last_flush = time.time()
+        self.flush_loop = None
+        # url -> (download date of the current version or None, time of the lookup), in the order of the last use
+        self.download_dates = collections.OrderedDict()
 
         # Establish DB connection
-        # Closing of the connection is handled once the spider closes
+        # Closing of the connection is handled once the last pipeline is released
         self.conn = pymysql.connect(host=self.database["host"],
                                     port=self.database["port"],
                                     db=self.database["db"],
@@ -95,123 +237,223 @@ class RSSCrawlCompare(object):
                                     passwd=self.database["password"])
         self.cursor = self.conn.cursor()
 
+    def start_flush_loop(self):
+        """
+        Writes buffered articles after flush_interval seconds, even if no further article arrives
+        :return:
+        """
+        if self.flush_loop is None and self.batch_size > 1 and self.flush_interval > 0:
+            self.flush_loop = task.LoopingCall(self.flush_if_due)
+            self.flush_loop.start(self.flush_interval, now=False)
+
+    def release(self):
+        """
+        Releases the writer, the last user writes the buffered articles and closes the connection
+        :return:
+        """
+        MySQLBatchWriter.users -= 1
+        if MySQLBatchWriter.users > 0:
+            return
+        if self.flush_loop is not None and self.flush_loop.running:
+            self.flush_loop.stop()
+        self.flush()
+        # Close DB connection - garbage collection
+        self.conn.close()
+        MySQLBatchWriter.instance = None
+
+    def __cache(self, url, download_date):
+        """
+        Caches the download date of the current version of an article
+        :param url:
+        :param download_date: None if there is no version of the article
+        :return:
+        """
+        self.download_dates[url] = (download_date, time.time())
+        self.download_dates.move_to_end(url)
+        while len(self.download_dates) > self.cache_size:
+            self.download_dates.popitem(last=False)
+
+    def get_download_date(self, url):
+        """
+        Returns the download date of the current version of an article, either from the cache, including articles that
+        are not written yet, or from the DB
+        :param url:
+        :return: The download date as datetime or None if the article is not in the DB
+        """
+        cached = self.download_dates.get(url)
+        if cached is not None and time.time() - cached[1] < self.cache_ttl:
+            self.download_dates.move_to_end(url)
+            return cached[0]
+
+        try:
+            old_versions = self.__select_versions([url])
+        except self.errors as error:
+            self.log.error("Something went wrong in rss query: %s", error)
+            return None
+        # A SELECT opens a transaction in MySQL, end it so that later lookups see articles written by other processes
+        self.conn.commit()
+        return old_versions[url][1] if url in old_versions else None
+
+    def __select_versions(self, urls):
+        """
+        Searches the CurrentVersion table for the current versions of articles and caches their download dates
+        :param urls:
+        :return: dict of url -> (id, download date, version)
+        """
+        self.cursor.execute(self.compare_versions, (urls,))
+        # Ordered by version, so the latest version of an url is kept
+        old_versions = {url: (db_id, download_date, version)
+                        for db_id, url, download_date, version in self.cursor.fetchall()}
+        for url in urls:
+            self.__cache(url, old_versions[url][1] if url in old_versions else None)
+        return old_versions
+
+    def add(self, current_version_list):
+        """
+        Buffers an article and writes the buffer once it is full
+        :param current_version_list: dict of the columns of CurrentVersions, without id, ancestor and version
+        :return:
+        """
+        self.items.append(current_version_list)
+        self.__cache_item(current_version_list)
+
+        if len(self.items) >= self.batch_size:
+            self.flush()
+        else:
+            self.flush_if_due()
+
+    def __cache_item(self, current_version_list):
+        """
+        Caches the download date of an article that is the current version once it is written
+        :param current_version_list:
+        :return:
+        """
+        try:
+            self.__cache(current_version_list['url'], datetime.datetime.strptime(
+                current_version_list['download_date'], "%y-%m-%d %H:%M:%S"))
+        except (TypeError, ValueError):
+            self.download_dates.pop(current_version_list['url'], None)
+
+    def flush_if_due(self):
+        """
+        Writes the buffered articles if flush_interval seconds have passed since the last write
+        :return:
+        """
+        if self.items and time.time() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """
+        Writes the buffered articles in one transaction.
+        First determine which articles already exist in a version,
+          these older versions are 'migrated' to the archive table.
+        Second store the new articles in the current version table.
+        If an article occurs more than once in the buffer, its versions are stored in the order they were crawled.
+        If the transaction fails, the articles are written one by one, so that only the failing ones are lost.
+        :return:
+        """
+        items = self.items
+        self.items = []
+        self.last_flush = time.time()
+        if not items:
+            return
+
+        # The lookups of the old versions cache their download dates, replace them by the written ones
+        write_batch(items, self.__store_versions, self.conn, self.errors, self.log, on_written=self.__cache_item,
+                    on_failed=self.__uncache_item)
+
+    def __uncache_item(self, current_version_list):
+        """
+        Removes an article that could not be written from the cache
+        :param current_version_list:
+        :return:
+        """
+        self.download_dates.pop(current_version_list['url'], None)
+
+    def __store_versions(self, current_versions):
+        """
+        Stores new versions of articles with distinct urls and moves their old versions to the archive, without commit
+        :param current_versions:
+        :return:
+        """
+        old_versions = self.__select_versions([item['url'] for item in current_versions])
+
+        # Update the version number and the ancestor variable for later references
+        for current_version_list in current_versions:
+            old_id, _, old_version = old_versions.get(current_version_list['url'], (0, None, 0))
+            current_version_list['ancestor'] = old_id
+            current_version_list['descendant'] = 0
+            current_version_list['version'] = old_version + 1
+
+        # Add the new versions of the articles to the CurrentVersion table, executemany sends a multi-row INSERT
+        self.cursor.executemany(self.insert_current, current_versions)
+
+        # Move the old versions from the CurrentVersion table to the ArchiveVersions table
+        if old_versions:
+            old_ids = [old_id for old_id, _, _ in old_versions.values()]
+            self.cursor.execute(self.insert_archive, (old_ids,))
+            self.cursor.execute(self.delete_from_current, (old_ids,))
+            self.log.info("Moved %i old versions of articles to the archive.", len(old_ids))
+
+
+class RSSCrawlCompare(object):
+    """
+    Compares the item's age to the current version in the DB.
+    If the difference is greater than delta_time, then save the newer version.
+    """
+    log = None
+    cfg = None
+    delta_time = None
+    writer = None
+
+    def __init__(self):
+        self.log = logging.getLogger(__name__)
+
+        self.cfg = CrawlerConfig.get_instance()
+        self.delta_time = self.cfg.section("Crawler")[
+            "hours_to_pass_for_redownload_by_rss_crawler"]
+        # The DB connection and the cache of the download dates are shared with MySQLStorage
+        # Closing of the connection is handled once the spider closes
+        self.writer = MySQLBatchWriter.get_instance()
+
     def process_item(self, item, spider):
         if spider.name in ['RssCrawler', 'GdeltCrawler']:
-            # Search the CurrentVersion table for a version of the article
-            try:
-                self.cursor.execute(self.compare_versions, (item['url'],))
-            except (pymysql.err.OperationalError, pymysql.ProgrammingError, pymysql.InternalError,
-                    pymysql.IntegrityError, TypeError) as error:
-                self.log.error("Something went wrong in rss query: %s", error)
-
-            # Save the result of the query. Must be done before the add,
-            #   otherwise the result will be overwritten in the buffer
-            old_version = self.cursor.fetchone()
+            # Search the cache or the CurrentVersion table for a version of the article
+            old_download_date = self.writer.get_download_date(item['url'])
 
-            if old_version is not None and (datetime.datetime.strptime(
+            if old_download_date is not None and (datetime.datetime.strptime(
                     item['download_date'], "%y-%m-%d %H:%M:%S") -
-                                            old_version[3]) \
+                                                  old_download_date) \
                     < datetime.timedelta(hours=self.delta_time):
-                # Compare the two download dates. index 3 of old_version
-                # corresponds to the download_date attribute in the DB
+                # Compare the two download dates
                 raise DropItem("Article in DB too recent. Not saving.")
 
         return item
 
     def close_spider(self, spider):
-        # Close DB connection - garbage collection
-        self.conn.close()
+        self.writer.release()
 
 
 class MySQLStorage(object):
     """
-    Handles remote storage of the meta data in the DB
+    Handles remote storage of the meta data in the DB, see MySQLBatchWriter
     """
 
     log = None
-    cfg = None
-    database = None
-    conn = None
-    cursor = None
-    # initialize necessary DB queries for this pipe
-    compare_versions = ("SELECT * FROM CurrentVersions WHERE url=%s")
-    insert_current = ("INSERT INTO CurrentVersions(local_path,\
-                          modified_date,download_date,source_domain,url,\
-                          html_title, ancestor, descendant, version,\
-                          rss_title) VALUES (%(local_path)s,\
-                          %(modified_date)s, %(download_date)s,\
-                          %(source_domain)s, %(url)s, %(html_title)s,\
-                          %(ancestor)s, %(descendant)s, %(version)s,\
-                          %(rss_title)s)")
-
-    insert_archive = ("INSERT INTO ArchiveVersions(id, local_path,\
-                          modified_date,download_date,source_domain,url,\
-                          html_title, ancestor, descendant, version,\
-                          rss_title) VALUES (%(db_id)s, %(local_path)s,\
-                          %(modified_date)s, %(download_date)s,\
-                          %(source_domain)s, %(url)s, %(html_title)s,\
-                          %(ancestor)s, %(descendant)s, %(version)s,\
-                          %(rss_title)s)")
+    writer = None
 
-    delete_from_current = ("DELETE FROM CurrentVersions WHERE id = %s")
-
-    # init database connection
     def __init__(self):
         self.log = logging.getLogger(__name__)
-
-        self.cfg = CrawlerConfig.get_instance()
-        self.database = self.cfg.section("MySQL")
-        # Establish DB connection
         # Closing of the connection is handled once the spider closes
-        self.conn = pymysql.connect(host=self.database["host"],
-                                    port=self.database["port"],
-                                    db=self.database["db"],
-                                    user=self.database["username"],
-                                    passwd=self.database["password"])
-        self.cursor = self.conn.cursor()
+        self.writer = MySQLBatchWriter.get_instance()
+
+    def open_spider(self, spider):
+        self.writer.start_flush_loop()
 
     def process_item(self, item, spider):
         """
-        Store item data in DB.
-        First determine if a version of the article already exists,
-          if so then 'migrate' the older version to the archive table.
-        Second store the new article in the current version table
+        Store item data in DB, the version of the article is determined once the buffer is written
         """
-
-        # Set defaults
-        version = 1
-        ancestor = 0
-
-        # Search the CurrentVersion table for an old version of the article
-        try:
-            self.cursor.execute(self.compare_versions, (item['url'],))
-        except (pymysql.err.OperationalError, pymysql.ProgrammingError, pymysql.InternalError,
-                pymysql.IntegrityError, TypeError) as error:
-            self.log.error("Something went wrong in query: %s", error)
-
-        # Save the result of the query. Must be done before the add,
-        # otherwise the result will be overwritten in the buffer
-        old_version = self.cursor.fetchone()
-
-        if old_version is not None:
-            old_version_list = {
-                'db_id': old_version[0],
-                'local_path': old_version[1],
-                'modified_date': old_version[2],
-                'download_date': old_version[3],
-                'source_domain': old_version[4],
-                'url': old_version[5],
-                'html_title': old_version[6],
-                'ancestor': old_version[7],
-                'descendant': old_version[8],
-                'version': old_version[9],
-                'rss_title': old_version[10], }
-
-            # Update the version number and the ancestor variable for later references
-            version = (old_version[9] + 1)
-            ancestor = old_version[0]
-
-        # Add the new version of the article to the CurrentVersion table
         current_version_list = {
             'local_path': item['local_path'],
             'modified_date': item['modified_date'],
@@ -219,50 +461,13 @@ class MySQLStorage(object):
             'source_domain': item['source_domain'],
             'url': item['url'],
             'html_title': item['html_title'],
-            'ancestor': ancestor,
-            'descendant': 0,
-            'version': version,
             'rss_title': item['rss_title'], }
-
-        try:
-            self.cursor.execute(self.insert_current, current_version_list)
-            self.conn.commit()
-            self.log.info("Article inserted into the database.")
-        except (pymysql.err.OperationalError, pymysql.ProgrammingError, pymysql.InternalError,
-                pymysql.IntegrityError, TypeError) as error:
-            self.log.error("Something went wrong in commit: %s", error)
-
-        # Move the old version from the CurrentVersion table to the ArchiveVersions table
-        if old_version is not None:
-            # Set descendant attribute
-            try:
-                old_version_list['descendant'] = self.cursor.lastrowid
-            except (pymysql.err.OperationalError, pymysql.ProgrammingError, pymysql.InternalError,
-                    pymysql.IntegrityError, TypeError) as error:
-                self.log.error("Something went wrong in id query: %s", error)
-
-            # Delete the old version of the article from the CurrentVersion table
-            try:
-                self.cursor.execute(self.delete_from_current, old_version_list['db_id'])
-                self.conn.commit()
-            except (pymysql.err.OperationalError, pymysql.ProgrammingError, pymysql.InternalError,
-                    pymysql.IntegrityError, TypeError) as error:
-                self.log.error("Something went wrong in delete: %s", error)
-
-            # Add the old version to the ArchiveVersion table
-            try:
-                self.cursor.execute(self.insert_archive, old_version_list)
-                self.conn.commit()
-                self.log.info("Moved old version of an article to the archive.")
-            except (pymysql.err.OperationalError, pymysql.ProgrammingError, pymysql.InternalError,
-                    pymysql.IntegrityError, TypeError) as error:
-                self.log.error("Something went wrong in archive: %s", error)
-
+        self.writer.add(current_version_list)
         return item
 
     def close_spider(self, spider):
-        # Close DB connection - garbage collection
-        self.conn.close()
+        # Write the buffered articles, the connection is closed by the last pipeline
+        self.writer.release()
 
 class ExtractedInformationStorage(object):
     """
@@ -362,7 +567,11 @@ class ExtractedInformationStorage(object):
 
 class PostgresqlStorage(ExtractedInformationStorage):
     """
-    Handles remote storage of the meta data in the DB
+    Handles remote storage of the meta data in the DB.
+    Articles are buffered and written in one transaction once batch_size articles have been buffered, flush_interval
+    seconds have passed since the last write or the spider is closed. Each write looks up the current versions of all
+    buffered articles with one query, inserts the new versions with one multi-row INSERT and moves the old versions to
+    the archive with one statement.
     """
 
     log = None
@@ -371,36 +580,42 @@ class PostgresqlStorage(ExtractedInformationStorage):
     conn = None
     cursor = None
     # initialize necessary DB queries for this pipe
-    compare_versions = ("SELECT * FROM CurrentVersions WHERE url=%s")
+    compare_versions = ("SELECT DISTINCT ON (url) id, url, version FROM CurrentVersions \
+                        WHERE url = ANY(%s) ORDER BY url, version DESC")
     insert_current = ("INSERT INTO CurrentVersions(date_modify,date_download, \
                         localpath,filename,source_domain, \
                         url,image_url,title,title_page, \
                         title_rss,maintext,description, \
                         date_publish,authors,language, \
                         ancestor,descendant,version) \
-                        VALUES (%(date_modify)s,%(date_download)s, \
-                            %(localpath)s,%(filename)s,%(source_domain)s, \
-                            %(url)s,%(image_url)s,%(title)s,%(title_page)s, \
-                            %(title_rss)s,%(maintext)s,%(description)s, \
-                            %(date_publish)s,%(authors)s,%(language)s, \
-                            %(ancestor)s,%(descendant)s,%(version)s) \
-                        RETURNING id")
-
-    insert_archive = ("INSERT INTO ArchiveVersions(id,date_modify,date_download,\
+                        VALUES %s \
+                        RETURNING id, url")
+    insert_current_template = ("(%(date_modify)s,%(date_download)s, \
+                        %(localpath)s,%(filename)s,%(source_domain)s, \
+                        %(url)s,%(image_url)s,%(title)s,%(title_page)s, \
+                        %(title_rss)s,%(maintext)s,%(description)s, \
+                        %(date_publish)s,%(authors)s,%(language)s, \
+                        %(ancestor)s,%(descendant)s,%(version)s)")
+
+    # deletes the old versions from the CurrentVersions table and inserts them into the ArchiveVersions table, together
+    # with the id of their descendant, in one statement
+    move_to_archive = ("WITH moved AS (DELETE FROM CurrentVersions c \
+                            USING (VALUES %s) AS m(old_id, new_id) \
+                            WHERE c.id = m.old_id \
+                            RETURNING c.*, m.new_id) \
+                        INSERT INTO ArchiveVersions(id,date_modify,date_download,\
                         localpath,filename,source_domain, \
                         url,image_url,title,title_page, \
                         title_rss,maintext,description, \
                         date_publish,authors,language, \
                         ancestor,descendant,version) \
-                        VALUES (%(db_id)s,%(date_modify)s,%(date_download)s, \
-                            %(localpath)s,%(filename)s,%(source_domain)s, \
-                            %(url)s,%(image_url)s,%(title)s,%(title_page)s, \
-                            %(title_rss)s,%(maintext)s,%(description)s, \
-                            %(date_publish)s,%(authors)s,%(language)s, \
-                            %(ancestor)s,%(descendant)s,%(version)s)")
-
-
-    delete_from_current = ("DELETE FROM CurrentVersions WHERE id = %s")
+                        SELECT id,date_modify,date_download, \
+                            localpath,filename,source_domain, \
+                            url,image_url,title,title_page, \
+                            title_rss,maintext,description, \
+                            date_publish,authors,language, \
+                            ancestor,new_id,version \
+                        FROM moved")
 
     # init database connection
     def __init__(self):
@@ -408,6 +623,13 @@ class PostgresqlStorage(ExtractedInformationStorage):
         self.log = logging.getLogger(__name__)
         self.cfg = CrawlerConfig.get_instance()
         self.database = self.cfg.section("Postgresql")
+        # Number of articles that are written in one transaction, 1 writes every article immediately
+        self.batch_size = max(int(self.database.get("batch_size", 1)), 1)
+        # Seconds after which buffered articles are written, even if the batch is not full
+        self.flush_interval = float(self.database.get("flush_interval", 5))
+        self.items = []
+        self.last_flush = time.time()
+        self.flush_loop = None
         # Establish DB connection
         # Closing of the connection is handled once the spider closes
         self.conn = psycopg2.connect(host=self.database["host"],
@@ -417,93 +639,81 @@ class PostgresqlStorage(ExtractedInformationStorage):
                             password=self.database["password"])
         self.cursor = self.conn.cursor()
 
+    def open_spider(self, spider):
+        # Write buffered articles after flush_interval seconds, even if no further article arrives
+        if self.batch_size > 1 and self.flush_interval > 0:
+            self.flush_loop = task.LoopingCall(self.flush_if_due)
+            self.flush_loop.start(self.flush_interval, now=False)
+
     def process_item(self, item, spider):
         """
-        Store item data in DB.
-        First determine if a version of the article already exists,
-          if so then 'migrate' the older version to the archive table.
-        Second store the new article in the current version table
+        Buffer item data and store the buffer in the DB once it is full
         """
-
-        # Set defaults
-        version = 1
-        ancestor = 0
-
-        # Search the CurrentVersion table for an old version of the article
-        try:
-            self.cursor.execute(self.compare_versions, (item['url'],))
-        except psycopg2.DatabaseError as error:
-            self.log.error("Something went wrong in query: %s", error)
-
-        # Save the result of the query. Must be done before the add,
-        # otherwise the result will be overwritten in the buffer
-        old_version = self.cursor.fetchone()
-
-        if old_version is not None:
-            old_version_list = {
-                'db_id': old_version[0],
-                'date_modify': old_version[1],
-                'date_download': old_version[2],
-                'localpath': old_version[3],
-                'filename': old_version[4],
-                'source_domain': old_version[5],
-                'url': old_version[6],
-                'image_url': old_version[7],
-                'title': old_version[8],
-                'title_page': old_version[9],
-                'title_rss': old_version[10],
-                'maintext': old_version[11],
-                'description': old_version[12],
-                'date_publish': old_version[13],
-                'authors': old_version[14],
-                'language': old_version[15],
-                'ancestor': old_version[16],
-                'descendant': old_version[17],
-                'version': old_version[18] }
-
-            # Update the version number and the ancestor variable for later references
-            version = (old_version[18] + 1)
-            ancestor = old_version[0]
-
-        # Add the new version of the article to the CurrentVersion table
         current_version_list = ExtractedInformationStorage.extract_relevant_info(item)
-        current_version_list['ancestor'] = ancestor
         current_version_list['descendant'] = 0
-        current_version_list['version'] = version
+        self.items.append(current_version_list)
 
-        try:
-            self.cursor.execute(self.insert_current, current_version_list)
-            self.conn.commit()
-            self.log.info("Article inserted into the database.")
-        except psycopg2.DatabaseError as error:
-            self.log.error("Something went wrong in commit: %s", error)
-
-        # Move the old version from the CurrentVersion table to the ArchiveVersions table
-        if old_version is not None:
-            # Set descendant attribute
-            try:
-                old_version_list['descendant'] = self.cursor.fetchone()[0]
-            except psycopg2.DatabaseError as error:
-                self.log.error("Something went wrong in id query: %s", error)
+        if len(self.items) >= self.batch_size:
+            self.flush()
+        else:
+            self.flush_if_due()
+        return item
 
-            # Delete the old version of the article from the CurrentVersion table
-            try:
-                self.cursor.execute(self.delete_from_current, (old_version_list['db_id'],))
-                self.conn.commit()
-            except psycopg2.DatabaseError as error:
-                self.log.error("Something went wrong in delete: %s", error)
+    def flush_if_due(self):
+        """
+        Store the buffered items if flush_interval seconds have passed since the last write
+        """
+        if self.items and time.time() - self.last_flush >= self.flush_interval:
+            self.flush()
 
-            # Add the old version to the ArchiveVersion table
-            try:
-                self.cursor.execute(self.insert_archive, old_version_list)
-                self.conn.commit()
-                self.log.info("Moved old version of an article to the archive.")
-            except psycopg2.DatabaseError as error:
-                self.log.error("Something went wrong in archive: %s", error)
+    def flush(self):
+        """
+        Store the buffered items in DB, in one transaction.
+        First determine which articles already exist in a version,
+          these older versions are 'migrated' to the archive table.
+        Second store the new articles in the current version table.
+        If an article occurs more than once in the buffer, its versions are stored in the order they were crawled.
+        If the transaction fails, the articles are stored one by one, so that only the failing ones are lost.
+        """
+        items = self.items
+        self.items = []
+        self.last_flush = time.time()
+        if not items:
+            return
 
-        return item
+        write_batch(items, self.store_versions, self.conn, psycopg2.DatabaseError, self.log)
+
+    def store_versions(self, current_versions):
+        """
+        Store new versions of articles with distinct urls and move their old versions to the archive, without commit
+        :param current_versions: list of dicts as returned by extract_relevant_info
+        """
+        # Search the CurrentVersion table for the old versions of all articles
+        self.cursor.execute(self.compare_versions, ([item['url'] for item in current_versions],))
+        old_versions = {url: (db_id, version) for db_id, url, version in self.cursor.fetchall()}
+
+        # Update the version number and the ancestor variable for later references
+        for current_version_list in current_versions:
+            old_id, old_version = old_versions.get(current_version_list['url'], (0, 0))
+            current_version_list['ancestor'] = old_id
+            current_version_list['version'] = old_version + 1
+
+        # Add the new versions of the articles to the CurrentVersion table
+        new_ids = psycopg2.extras.execute_values(self.cursor, self.insert_current, current_versions,
+                                                 template=self.insert_current_template,
+                                                 page_size=len(current_versions), fetch=True)
+
+        # Move the old versions from the CurrentVersion table to the ArchiveVersions table
+        moves = [(old_versions[url][0], new_id) for new_id, url in new_ids if url in old_versions]
+        if moves:
+            psycopg2.extras.execute_values(self.cursor, self.move_to_archive, moves, page_size=len(moves))
+            self.log.info("Moved %i old versions of articles to the archive.", len(moves))
 
     def close_spider(self, spider):
+        if self.flush_loop is not None and self.flush_loop.running:
+            self.flush_loop.stop()
+        # Store the remaining buffered items
+        self.flush()
         # Close DB connection - garbage collection
         self.conn.close()
 
@@ -528,27 +738,184 @@ class InMemoryStorage(ExtractedInformationStorage):
         return InMemoryStorage.results
 
 
+class FileWriter(object):
+    """
+    Writes the files of HtmlFileStorage and JsonFileStorage. With writer_threads > 0 the files are written behind the
+    crawler: process_item only queues a file and the writer threads write it, so that slow disks or network file
+    systems do not block the reactor. If the queue is full, process_item waits until a writer has taken a file from the
+    queue, which slows down the crawler to the speed of the disk. Both pipelines of a process share the writer.
+    Usage:
+        writer = FileWriter.get_instance()
+        ...
+        writer.release()
+    """
+
+    instance = None
+    users = 0
+
+    # seconds the pipeline waits before it tries to queue a file again if the queue is full
+    queue_retry_delay = 0.1
+    # maximum number of directories that are known to exist
+    max_directories = 10000
+
+    @classmethod
+    def get_instance(cls):
+        """
+        Returns the writer of this process, it is closed once every user has released it
+        :return:
+        """
+        if cls.instance is None:
+            cls.instance = cls()
+        cls.users += 1
+        return cls.instance
+
+    def __init__(self):
+        self.log = logging.getLogger(__name__)
+        self.cfg = CrawlerConfig.get_instance()
+        self.files = self.cfg.section("Files")
+        self.writer_threads = int(self.files.get("writer_threads", 0))
+        self.fsync_batch_size = int(self.files.get("fsync_batch_size", 0))
+        self.queue = queue.Queue(maxsize=max(int(self.files.get("writer_queue_size", 1000)), 1))
+        # directories that exist, so that they are not checked before every file
+        self.directories = set()
+        self.congested = False
+        self.counter_congested = 0
+
+        self.threads = []
+        for _ in range(self.writer_threads):
+            thread = threading.Thread(target=self.__run_writer, name='FileWriter')
+            thread.daemon = True
+            thread.start()
+            self.threads.append(thread)
+
+    def write(self, pathname, data):
+        """
+        Writes a file or queues it for the writer threads
+        :param pathname:
+        :param data: content of the file, as bytes
+        :return: None if the file has been written or queued, else a Deferred that fires once it has been queued
+        """
+        if not self.threads:
+            self.write_file(pathname, data)
+            self.sync([pathname])
+            return None
+
+        try:
+            self.queue.put_nowait((pathname, data))
+            self.congested = False
+            return None
+        except queue.Full:
+            if not self.congested:
+                self.log.warning("Files are written slower than they are crawled, the crawler waits for the disk.")
+                self.congested = True
+            self.counter_congested += 1
+            # the reactor is only imported when it is needed, so that Scrapy can choose the reactor to install
+            from twisted.internet import reactor
+            return task.deferLater(reactor, self.queue_retry_delay, self.write, pathname, data)
+
+    def write_file(self, pathname, data):
+        """
+        Writes a file, the directory is created if it does not exist
+        :param pathname:
+        :param data: content of the file, as bytes
+        :return:
+        """
+        directory = os.path.dirname(pathname)
+        if directory not in self.directories:
+            os.makedirs(directory, exist_ok=True)
+            if len(self.directories) >= self.max_directories:
+                self.directories.clear()
+            self.directories.add(directory)
+
+        with open(pathname, 'wb') as file_:
+            file_.write(data)
+
+    def sync(self, pathnames):
+        """
+        Flushes written files to disk, if fsync is enabled
+        :param pathnames:
+        :return:
+        """
+        if self.fsync_batch_size <= 0:
+            return
+        for pathname in pathnames:
+            fd = os.open(pathname, os.O_RDWR)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+    def __run_writer(self):
+        """
+        Writes queued files until it receives None. Files are synced in batches of fsync_batch_size files, or when the
+        queue is empty.
+        :return:
+        """
+        unsynced = []
+        while True:
+            entry = self.queue.get()
+            if entry is not None:
+                pathname, data = entry
+                try:
+                    self.write_file(pathname, data)
+                    unsynced.append(pathname)
+                except OSError as error:
+                    self.log.error("Failed to write %s: %s", pathname, error)
+
+            if unsynced and (entry is None or len(unsynced) >= self.fsync_batch_size or self.queue.empty()):
+                try:
+                    self.sync(unsynced)
+                except OSError as error:
+                    self.log.error("Failed to sync written files: %s", error)
+                unsynced = []
+
+            if entry is None:
+                return
+
+    def release(self):
+        """
+        Releases the writer, the last user waits until all queued files have been written
+        :return:
+        """
+        FileWriter.users -= 1
+        if FileWriter.users > 0:
+            return
+        for _ in self.threads:
+            self.queue.put(None)
+        for thread in self.threads:
+            thread.join()
+        if self.counter_congested:
+            self.log.info("The crawler waited %i times for the file writers.", self.counter_congested)
+        FileWriter.instance = None
+
+
 class HtmlFileStorage(ExtractedInformationStorage):
     """
     Handles storage of the file on the local system
     """
 
+    writer = None
+
+    def __init__(self):
+        super(HtmlFileStorage, self).__init__()
+        self.writer = FileWriter.get_instance()
+
     # Save the html and filename to the local storage folder
     def process_item(self, item, spider):
         # Add a log entry confirming the save
         self.log.info("Saving HTML to %s", item['abs_local_path'])
 
-        # Ensure path exists
-        dir_ = os.path.dirname(item['abs_local_path'])
-        if not os.path.exists(dir_):
-            os.makedirs(dir_)
-
         # Write raw html to local file system
-        with open(item['abs_local_path'], 'wb') as file_:
-            file_.write(item['spider_response'].body)
+        deferred = self.writer.write(item['abs_local_path'], item['spider_response'].body)
+        if deferred is not None:
+            # Wait until the file is queued, i.e., the disk keeps up with the crawler
+            return deferred.addCallback(lambda _: item)
 
         return item
 
+    def close_spider(self, spider):
+        self.writer.release()
+
 
 class JsonFileStorage(ExtractedInformationStorage):
     """
@@ -557,6 +924,11 @@ class JsonFileStorage(ExtractedInformationStorage):
 
     log = None
     cfg = None
+    writer = None
+
+    def __init__(self):
+        super(JsonFileStorage, self).__init__()
+        self.writer = FileWriter.get_instance()
 
     def process_item(self, item, spider):
         file_path = item['abs_local_path'] + '.json'
@@ -564,21 +936,26 @@ class JsonFileStorage(ExtractedInformationStorage):
         # Add a log entry confirming the save
         self.log.info("Saving JSON to %s", file_path)
 
-        # Ensure path exists
-        dir_ = os.path.dirname(item['abs_local_path'])
-        if not os.path.exists(dir_):
-            os.makedirs(dir_)
-
         # Write JSON to local file system
-        with open(file_path, 'w') as file_:
-            json.dump(ExtractedInformationStorage.extract_relevant_info(item), file_, ensure_ascii=False)
+        data = json.dumps(ExtractedInformationStorage.extract_relevant_info(item), ensure_ascii=False)
+        deferred = self.writer.write(file_path, data.encode('utf-8'))
+        if deferred is not None:
+            # Wait until the file is queued, i.e., the disk keeps up with the crawler
+            return deferred.addCallback(lambda _: item)
 
         return item
 
+    def close_spider(self, spider):
+        self.writer.release()
+
 
 class ElasticsearchStorage(ExtractedInformationStorage):
     """
-    Handles remote storage of the meta data in Elasticsearch
+    Handles remote storage of the meta data in Elasticsearch.
+    Articles are buffered and indexed with the bulk API once bulk_size articles or about bulk_bytes of articles have
+    been buffered, flush_interval seconds have passed since the last write or the spider is closed. The id of the
+    current version of an article is the SHA-1 of its url, so that the previous versions of all buffered articles are
+    fetched with one mget. Archived versions get the id <SHA-1 of the url>-<version>.
     """
 
     log = None
@@ -608,6 +985,17 @@ class ElasticsearchStorage(ExtractedInformationStorage):
         self.index_current = self.database["index_current"]
         self.index_archive = self.database["index_archive"]
         self.mapping = self.database["mapping"]
+        # Number and size of articles that are indexed in one bulk request, 1 indexes every article immediately
+        self.bulk_size = max(int(self.database.get("bulk_size", 1)), 1)
+        self.bulk_bytes = int(self.database.get("bulk_bytes", 10485760))
+        # Seconds after which buffered articles are indexed, even if the bulk request is not full
+        self.flush_interval = float(self.database.get("flush_interval", 5))
+        self.items = []
+        self.items_bytes = 0
+        self.last_flush = time.time()
+        # Time before which a failed bulk request is not retried
+        self.retry_time = 0
+        self.flush_loop = None
 
         # check connection to Database and set the configuration
 
@@ -632,41 +1020,149 @@ class ElasticsearchStorage(ExtractedInformationStorage):
             # restore previous logging level
             es_log.setLevel(es_level)
 
-        except ConnectionError as error:
+        except (ConnectionError,) + ELASTICSEARCH_ERRORS as error:
             self.running = False
             self.log.error("Failed to connect to Elasticsearch, this module will be deactivated. "
                            "Please check if the database is running and the config is correct: %s" % error)
 
+    @staticmethod
+    def get_document_id(url):
+        """
+        Returns the id of the current version of an article
+        :param url:
+        :return:
+        """
+        return hashlib.sha1(url.encode('utf-8')).hexdigest()
+
+    def open_spider(self, spider):
+        # Index buffered articles after flush_interval seconds, even if no further article arrives
+        if self.bulk_size > 1 and self.flush_interval > 0:
+            self.flush_loop = task.LoopingCall(self.flush_if_due)
+            self.flush_loop.start(self.flush_interval, now=False)
+
     def process_item(self, item, spider):
 
         if self.running:
-            try:
+            extracted_info = ExtractedInformationStorage.extract_relevant_info(item)
+            self.items.append(extracted_info)
+            self.items_bytes += len(json.dumps(extracted_info, default=str))
+
+            if len(self.items) >= self.bulk_size or self.items_bytes >= self.bulk_bytes:
+                self.flush_if_ready()
+            else:
+                self.flush_if_due()
+        return item
+
+    def flush_if_due(self):
+        """
+        Index the buffered articles if flush_interval seconds have passed since the last write
+        """
+        if self.items and time.time() - self.last_flush >= self.flush_interval:
+            self.flush_if_ready()
+
+    def flush_if_ready(self):
+        """
+        Index the buffered articles unless a failed bulk request must not be retried yet
+        """
+        if time.time() >= self.retry_time:
+            self.flush()
+
+    def flush(self):
+        """
+        Index the buffered articles with one bulk request.
+        The previous version of an article is moved into index_archive and the article is saved into index_current.
+        If an article occurs more than once in the buffer, its versions are archived in the order they were crawled.
+        If a request fails, e.g., because the connection was lost, the articles stay in the buffer and are indexed by
+        the next flush, at least flush_interval (or 1) seconds later.
+        """
+        if not self.running or not self.items:
+            return
+        items = self.items
+        items_bytes = self.items_bytes
+        self.items = []
+        self.items_bytes = 0
+        self.last_flush = time.time()
+
+        try:
+            # search for previous versions
+            current_versions = self.get_previous_versions({item['url'] for item in items})
+
+            actions = []
+            latest_versions = {}
+            for extracted_info in items:
+                document_id = self.get_document_id(extracted_info['url'])
                 version = 1
                 ancestor = None
 
-                # search for previous version
-                request = self.es.search(index=self.index_current, body={'query': {'match': {'url.keyword': item['url']}}})
-                if request['hits']['total']['value'] > 0:
+                if extracted_info['url'] in current_versions:
                     # save old version into index_archive
-                    old_version = request['hits']['hits'][0]
-                    old_version['_source']['descendent'] = True
-                    self.es.index(index=self.index_archive, doc_type='_doc', body=old_version['_source'])
-                    version += 1
-                    ancestor = old_version['_id']
-
-                # save new version into old id of index_current
-                self.log.info("Saving to Elasticsearch: %s" % item['url'])
-                extracted_info = ExtractedInformationStorage.extract_relevant_info(item)
+                    old_id, old_source = current_versions[extracted_info['url']]
+                    old_source['descendent'] = True
+                    old_version = old_source.get('version') or 1
+                    ancestor = '%s-%i' % (document_id, old_version)
+                    actions.append({'_op_type': 'index', '_index': self.index_archive, '_id': ancestor,
+                                    '_source': old_source})
+                    # remove old version that was stored before ids were derived from the url
+                    if old_id != document_id:
+                        actions.append({'_op_type': 'delete', '_index': self.index_current, '_id': old_id})
+                    version = old_version + 1
+
                 extracted_info['ancestor'] = ancestor
                 extracted_info['version'] = version
-                self.es.index(index=self.index_current, doc_type='_doc', id=ancestor,
-                              body=extracted_info)
-
+                current_versions[extracted_info['url']] = (document_id, extracted_info)
+                latest_versions[extracted_info['url']] = (document_id, extracted_info)
+
+            # save the latest version of each article into index_current
+            for document_id, extracted_info in latest_versions.values():
+                self.log.info("Saving to Elasticsearch: %s" % extracted_info['url'])
+                actions.append({'_op_type': 'index', '_index': self.index_current, '_id': document_id,
+                                '_source': extracted_info})
+
+            _, errors = elasticsearch.helpers.bulk(self.es, actions, raise_on_error=False, raise_on_exception=False)
+            for error in errors:
+                self.log.error("Failed to save to Elasticsearch: %s" % error)
+
+        except (ConnectionError,) + ELASTICSEARCH_ERRORS as error:
+            # keep the articles in the order they were crawled, before the ones buffered in the meantime
+            self.items = items + self.items
+            self.items_bytes += items_bytes
+            self.retry_time = time.time() + max(self.flush_interval, 1)
+            self.log.error("Failed to save %i articles to Elasticsearch, retrying with the next flush: %s"
+                           % (len(items), error))
+
+    def get_previous_versions(self, urls):
+        """
+        Fetch the current versions of articles from index_current
+        :param urls: set of urls
+        :return: dict of url -> (document id, source)
+        """
+        current_versions = {}
+        if not urls:
+            return current_versions
+
+        ids = {self.get_document_id(url): url for url in urls}
+        response = self.es.mget(index=self.index_current, body={'ids': list(ids)})
+        for doc in response['docs']:
+            if doc.get('found'):
+                current_versions[ids[doc['_id']]] = (doc['_id'], doc['_source'])
+
+        # articles that were stored before ids were derived from the url are found by a terms query
+        missing = [url for url in urls if url not in current_versions]
+        if missing:
+            request = self.es.search(index=self.index_current, size=len(missing),
+                                     body={'query': {'terms': {'url.keyword': missing}}})
+            for hit in request['hits']['hits']:
+                url = hit['_source']['url']
+                if url not in current_versions or \
+                        (hit['_source'].get('version') or 1) > (current_versions[url][1].get('version') or 1):
+                    current_versions[url] = (hit['_id'], hit['_source'])
+        return current_versions
 
-            except ConnectionError as error:
-                self.running = False
-                self.log.error("Lost connection to Elasticsearch, this module will be deactivated: %s" % error)
-        return item
+    def close_spider(self, spider):
+        if self.flush_loop is not None and self.flush_loop.running:
+            self.flush_loop.stop()
+        # Index the remaining buffered articles
+        self.flush()
 
 
 class DateFilter(object):
@@ -736,7 +1232,13 @@ class DateFilter(object):
 
 class PandasStorage(ExtractedInformationStorage):
     """
-    Store meta data a Pandas data frame
+    Store meta data a Pandas data frame.
+    Articles are buffered as plain rows and converted to a data frame chunk once chunk_size articles have been
+    buffered, the date columns are typed once per chunk. With format 'pickle' all chunks are merged into the pickle
+    file when the spider closes. With format 'parquet' or 'feather' each chunk is appended as a new file to the
+    directory file_name, partitioned by the day of download, e.g., day=2020-03-15/part-...-00001.parquet; the partition
+    key is not a column of the files, so that readers of hive partitions do not see date_download twice. Existing files
+    are neither read nor rewritten, so a url may occur in several files.
     """
 
     log = None
@@ -747,6 +1249,14 @@ class PandasStorage(ExtractedInformationStorage):
     mapping = None
     running = False
 
+    columns = [
+        "source_domain", "title_page", "title_rss", "localpath", "filename",
+        "date_download", "date_modify", "date_publish", "title", "description",
+        "text", "authors", "image_url", "language", 'url'
+    ]
+    date_columns = ['date_download', 'date_modify', 'date_publish']
+    extensions = {'parquet': '.parquet', 'feather': '.feather'}
+
     def __init__(self):
         if np is None:
             raise ModuleNotFoundError("Using PandasStorage requires numpy and pandas")
@@ -754,15 +1264,26 @@ class PandasStorage(ExtractedInformationStorage):
         self.cfg = CrawlerConfig.get_instance()
         self.database = self.cfg.section("Pandas")
 
-        df_index = "url"
-        columns = [
-            "source_domain", "title_page", "title_rss", "localpath", "filename",
-            "date_download", "date_modify", "date_publish", "title", "description",
-            "text", "authors", "image_url", "language", 'url'
-        ]
+        self.format = self.database.get('format', 'pickle')
+        if self.format not in ('pickle', 'parquet', 'feather'):
+            raise ValueError("unknown format of PandasStorage: %s" % self.format)
+        if self.format != 'pickle' and pyarrow is None:
+            raise ModuleNotFoundError("Using PandasStorage with parquet or feather requires pyarrow")
+        self.chunk_size = max(int(self.database.get('chunk_size', 1000)), 1)
+        self.rows = []
+        self.chunks = []
+        self.file_prefix = 'part-%s-%i' % (time.strftime('%Y%m%d%H%M%S'), os.getpid())
+        self.file_number = 0
 
+        df_index = "url"
         working_path = self.cfg.section("Files")['working_path']
         file_name = self.database['file_name']
+
+        if self.format != 'pickle':
+            self.full_path = os.path.join(working_path, file_name)
+            self.log.info("Appending Pandas %s files to '%s'", self.format, self.full_path)
+            return
+
         self.full_path = os.path.join(working_path, file_name, '.pickle')
 
         try:
@@ -771,11 +1292,11 @@ class PandasStorage(ExtractedInformationStorage):
                 "Found existing Pandas file with %i rows at %s", len(self.df),
                 self.full_path
             )
-            for col in columns:
+            for col in self.columns:
                 if col not in self.df.columns:
                     raise KeyError(col)
         except FileNotFoundError:
-            self.df = pd.DataFrame(columns=columns.keys())
+            self.df = pd.DataFrame(columns=self.columns)
             self.log.info("Created new Pandas file at '%s'", self.full_path)
             self.df.set_index(df_index, inplace=True, drop=False)
         except KeyError as e:
@@ -801,21 +1322,64 @@ class PandasStorage(ExtractedInformationStorage):
             'text': item['article_text'],
             'url': item['url']
         }
-        self.df.loc[item['url']] = article
+        self.rows.append(article)
+        if len(self.rows) >= self.chunk_size:
+            self.flush()
         return item
 
+    def flush(self):
+        """
+        Convert the buffered rows to a data frame chunk and, unless the format is pickle, append it to the files
+        """
+        if not self.rows:
+            return
+
+        chunk = pd.DataFrame(self.rows, columns=self.columns)
+        self.rows = []
+        for col in self.date_columns:
+            chunk[col] = pd.to_datetime(chunk[col], errors='coerce')
+
+        if self.format == 'pickle':
+            self.chunks.append(chunk)
+            return
+
+        # articles without a valid download date are written to the partition day=unknown
+        days = chunk['date_download'].dt.strftime('%Y-%m-%d').fillna('unknown')
+        for day, partition in chunk.groupby(days):
+            self.write_partition(partition.reset_index(drop=True), day)
+        self.log.info("Appended %i rows to Pandas files at %s", len(chunk), self.full_path)
+
+    def write_partition(self, partition, day):
+        """
+        Write a part of a chunk to a new file of a partition. The file is written to a temporary name first, so that
+        readers never see a partial file.
+        :param partition: data frame of the articles of one day
+        :param day: the day of download, as string
+        """
+        directory = os.path.join(self.full_path, 'day=%s' % day)
+        if not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+
+        self.file_number += 1
+        pathname = os.path.join(directory, '%s-%05d%s' % (self.file_prefix, self.file_number,
+                                                          self.extensions[self.format]))
+        if self.format == 'parquet':
+            partition.to_parquet(pathname + '.tmp', engine='pyarrow', index=False)
+        else:
+            partition.to_feather(pathname + '.tmp')
+        os.replace(pathname + '.tmp', pathname)
+
     def close_spider(self, _spider):
         """
         Write out to file
         """
-        self.df['date_download'] = pd.to_datetime(
-            self.df['date_download'], errors='coerce', infer_datetime_format=True
-        )
-        self.df['date_modify'] = pd.to_datetime(
-            self.df['date_modify'], errors='coerce', infer_datetime_format=True
-        )
-        self.df['date_publish'] = pd.to_datetime(
-            self.df['date_publish'], errors='coerce', infer_datetime_format=True
-        )
+        self.flush()
+        if self.format != 'pickle':
+            return
+
+        # newer versions of an article replace the older ones
+        self.df = pd.concat([self.df] + [chunk.set_index('url', drop=False) for chunk in self.chunks])
+        self.df = self.df[~self.df.index.duplicated(keep='last')]
+        self.chunks = []
         self.df.to_pickle(self.full_path)
         self.log.info("Wrote to Pandas to %s", self.full_path)
@@ -1,110 +1,133 @@
 import os
 import re
 import json
+import time
+import sqlite3
+import hashlib
+import logging
 import requests
+import threading
+import unicodedata
 import importlib.resources
-from bs4 import BeautifulSoup
-from copy import deepcopy
 from datetime import timedelta
 from dateutil.parser import parse
 from newspaper import Article
 import configparser
 from boto3 import Session
+from scrapy import Request
+from scrapy.http import TextResponse
+from requests.adapters import HTTPAdapter
+from twisted.internet import defer, threads
+from twisted.python.threadpool import ThreadPool
+from urllib3.util.retry import Retry
 
 try:
     import urllib.request as urllib2
 except ImportError:
     import urllib2
 
+try:
+    from scrapy.utils.defer import deferred_from_coro
+except ImportError:
+    # Scrapy < 2.0
+    deferred_from_coro = None
+
 from .extractor.cleaner import Cleaner
+from .extractor.parsed_document import ParsedDocument
+from .site_rules import SiteRuleRegistry
+from ..config import CrawlerConfig
+
+LOGGER = logging.getLogger(__name__)
 
 cleaner = Cleaner()
 
+# entities API of prosa.ai
+NER_URL = "https://api.prosa.ai/v1/entities"
+# HTTP status codes after which a NER request is retried
+NER_RETRY_STATUS = (429, 500, 502, 503, 504)
+
 # to improve performance, regex statements are compiled only once per module
 re_digits = re.compile(r'\d+')
+re_whitespace = re.compile(r'\s+')
 
 class MissingArticleExtractor:
-    def __init__(self):
-        self.possible_sites = {
-            "kompas.com": self._extract_kompas,
-            "cnbcindonesia.com": self._extract_cnbc,
-            "antaranews.com": self._extract_antara,
-            "tempo.co": self._extract_tempo,
-            "kumparan.com": self._extract_kumparan,
-            "liputan6.com": self._extract_liputan6,
-        }
+    """Extracts the article text of sites that the generic extractors miss,
+    according to the rules in siterules.hjson (or the file given by the
+    option site_rules_file of [Files]), see SiteRuleRegistry
+    """
+    def __init__(self, crawler=None):
+        self.crawler = crawler
+
+        pathname = CrawlerConfig.get_instance().config().get("Files", {}).get("site_rules_file")
+        if pathname:
+            pathname = os.path.expanduser(pathname)
+            if not os.path.isabs(pathname):
+                pathname = os.path.join(CrawlerConfig.get_instance().get_working_path(), pathname)
+        self.site_rules = SiteRuleRegistry.from_file(pathname)
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler)
+
+    def _download(self, url):
+        """Downloads a page with the engine of the crawler
+        :return: A Deferred of the response
+        """
+        request = Request(url, dont_filter=True)
+        engine = self.crawler.engine
+        if hasattr(engine, 'download_async') and deferred_from_coro is not None:
+            # Scrapy >= 2.13 deprecates engine.download
+            return deferred_from_coro(engine.download_async(request))
+        try:
+            return engine.download(request)
+        except TypeError:
+            # Scrapy < 2.6 requires the spider
+            return engine.download(request, self.crawler.spider)
+
+    def _extract_pages(self, item, multi_pages_urls):
+        """Further pages of an article are downloaded by Scrapy, all pages
+        at once, and their texts are appended in the order of the pages.
+        Pages that fail, are no HTML or have a status other than 200 are
+        skipped
+        """
+        def stitch(results):
+            page_texts = []
+            for multi_pages_url, (success, result) in zip(multi_pages_urls, results):
+                if not success:
+                    LOGGER.warning("Failed to download page %s of %s: %s", multi_pages_url,
+                                   item['url'], result.getErrorMessage())
+                    continue
+                if result.status != 200 or not isinstance(result, TextResponse):
+                    LOGGER.warning("Skipped page %s of %s: status %i, %s", multi_pages_url, item['url'],
+                                   result.status, type(result).__name__)
+                    continue
+
+                page = Article(multi_pages_url)
+                page.download(input_html=result.text)
+                page.parse()
+                page_texts.append(page.text)
+
+            if page_texts:
+                item['article_text'] = (item['article_text'] or '') + ''.join(page_texts)
+            return item
+
+        pages = [self._download(multi_pages_url) for multi_pages_url in multi_pages_urls]
+        return defer.DeferredList(pages, consumeErrors=True).addCallback(stitch)
 
-    def check_site(self, url):
-        for site in self.possible_sites:
-            if site in url:
-                return True, site
-        
-        return False, None
-    
-    @staticmethod
-    def _extract_by_xpath(item, xpath, fallback_xpath=None):
-        article_text = item['spider_response'].xpath(xpath).extract()
-        if not article_text and fallback_xpath is not None:
-            article_text = item['spider_response'].xpath(fallback_xpath).extract()
-        
-        # print(article_text)
+    def process_item(self, item, spider):
+        rule = self.site_rules.get_rule(item['url'])
+        if rule is None:
+            return item
 
-        article_text = ' '.join(article_text)
-        article_text = cleaner.do_cleaning(article_text)
-        item['article_text'] = article_text
-        return item
-    
-    @staticmethod
-    def _extract_kompas(item):
-        item = MissingArticleExtractor._extract_by_xpath(item, \
-            xpath="//*[@class='read__content']", \
-            fallback_xpath="//*[@class='artikel-baca']"
-            )
+        tree = ParsedDocument.from_item(item).tree
+        article_text = rule.extract_text(tree)
+        if article_text is not None:
+            item['article_text'] = article_text
 
-        return item
-    
-    @staticmethod
-    def _extract_antara(item):
-        item = MissingArticleExtractor._extract_by_xpath(item, xpath="//div[contains(@class, 'post-content')]")
-        return item
-    
-    @staticmethod
-    def _extract_tempo(item):
-        item = MissingArticleExtractor._extract_by_xpath(item, xpath="//div[@itemprop='articleBody']")
-        return item
-    
-    @staticmethod
-    def _extract_kumparan(item):
-        item = MissingArticleExtractor._extract_by_xpath(item, xpath="//div[contains(@class, 'mlPYL')]")
-        item['article_text'] = item['article_text'].replace('ADVERTISEMENT', ' ')
-        return item
-    
-    @staticmethod
-    def _extract_liputan6(item):
-        item = MissingArticleExtractor._extract_by_xpath(item, xpath="//div[contains(@class, 'article-content-body__item-page')]")
-        return item
-    
-    @staticmethod
-    def _extract_cnbc(item):
-        multi_pages_urls = item['spider_response'].xpath("//div[@class='dropdown_menu']/a/@href") \
-                                                    .extract()[1:]
-        
+        response = item['spider_response']
+        multi_pages_urls = [response.urljoin(url) for url in rule.get_page_urls(tree)]
         if multi_pages_urls:
-            all_article_text = item['article_text']
-            for multi_pages_url in multi_pages_urls:
-                cnbc = Article(multi_pages_url)
-                cnbc.download()
-                cnbc.parse()
-                all_article_text += cnbc.text
-            
-            item['article_text'] = all_article_text
-
-        return item
-
-    def process_item(self, item, spider):
-        is_missing, site = self.check_site(item['url'])
-        if is_missing:
-            item = self.possible_sites[site](item)
+            return self._extract_pages(item, multi_pages_urls)
 
         return item
 
@@ -128,48 +151,32 @@ class DateModifiedExtractor:
         
         return True
     
-    def _extract_from_json(self, html):
-        date = None
-        try:
-            scripts = html.findAll('script', type='application/ld+json')
-            if scripts is None:
-                return None
-
-            for script in scripts:
-                data = json.loads(script.string)
-
-                try:
-                    date = data['dateModified']
-                    date = parse(date).strftime('%Y-%m-%d %H:%M:%S')
-                except (Exception, TypeError):
-                    pass
-
-        except (Exception, TypeError):
-            return None
-        
-        return date
-    
     def process_item(self, item, spider):
         url = item['url']
-        html = deepcopy(item['spider_response'].body)
+        document = ParsedDocument.from_item(item)
         modified_date = None
 
         try:
-            if html is None:
+            if document.body is None:
                 request = urllib2.Request(url)
                 # Using a browser user agent, decreases the change of sites blocking this request - just a suggestion
                 # request.add_header('User-Agent', 'Mozilla/5.0 (Windows NT 6.1) AppleWebKit/537.36 (KHTML, like Gecko)
                 # Chrome/41.0.2228.0 Safari/537.36')
-                html = urllib2.build_opener().open(request).read()
+                document = ParsedDocument(urllib2.build_opener().open(request).read())
+                item['parsed_document'] = document
 
-            html = BeautifulSoup(html, "lxml")
-
-            modified_date = self._extract_from_json(html)
-        except Exception as e:
-            # print(e)
-            pass
+            # JSON-LD and <meta> tags, shared with DateExtractor
+            modified_date = document.metadata['dateModified']
+            if modified_date is not None:
+                modified_date = modified_date.strftime('%Y-%m-%d %H:%M:%S')
+        except (OSError, ValueError) as error:
+            LOGGER.debug("Failed to extract the modified date of %s: %s", url, error)
 
         if modified_date is not None:
+            if item['article_publish_date'] is None:
+                item['modified_date'] = modified_date
+                return item
+
             parsed_publish_date = parse(item['article_publish_date'])
             parsed_modified_date = parse(modified_date)
 
@@ -181,7 +188,131 @@ class DateModifiedExtractor:
         return item
 
 
+class NerClient:
+    """Client of the entities API. All requests share one session, whose
+    connections are kept alive and pooled. A request is retried with
+    exponential backoff if the connection fails or the API answers with
+    one of NER_RETRY_STATUS.
+    """
+    def __init__(self, headers, url=NER_URL, connect_timeout=5, read_timeout=30,
+                 retries=3, backoff_factor=0.5, pool_size=10):
+        self.url = url
+        self.timeout = (connect_timeout, read_timeout)
+
+        retry_options = dict(total=retries, backoff_factor=backoff_factor,
+                             status_forcelist=NER_RETRY_STATUS, raise_on_status=False)
+        try:
+            # POST is not retried by default, but recognizing entities has no side effects
+            retry = Retry(allowed_methods=None, **retry_options)
+        except TypeError:
+            # urllib3 < 1.26
+            retry = Retry(method_whitelist=None, **retry_options)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+
+        self.session = requests.Session()
+        self.session.headers.update(headers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def request(self, text):
+        data = {
+            "version": "v2",
+            "text": text
+        }
+
+        response = self.session.post(self.url, data=json.dumps(data), timeout=self.timeout)
+        response.raise_for_status()
+        body = response.json()
+        if not isinstance(body, dict):
+            raise ValueError("Unexpected response of the entities API: %.100r" % body)
+        entities = body.get("entities")
+
+        return entities
+
+    def close(self):
+        self.session.close()
+
+
+class NerCache:
+    """Persistent cache of the entities of texts in a SQLite database. The
+    key is the SHA-256 of the normalized text, so that re-crawls of an
+    unchanged article do not call the API again. Only non-empty entity
+    lists are stored, so that a transient empty answer of the API is not
+    kept. The least recently used entries are evicted once the cache holds
+    more than max_entries texts. The cache may be used from several threads.
+    """
+    # number of insertions after which the size of the cache is checked
+    EVICTION_INTERVAL = 1000
+
+    def __init__(self, pathname, max_entries=1000000, timeout=60):
+        self.max_entries = max_entries
+        self.counter_hit = 0
+        self.counter_miss = 0
+        self.counter_insert = 0
+        self.lock = threading.Lock()
+
+        directory = os.path.dirname(pathname)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+        self.connection = sqlite3.connect(pathname, timeout=timeout, isolation_level=None,
+                                          check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.execute('CREATE TABLE IF NOT EXISTS entities ('
+                                'key TEXT PRIMARY KEY, '
+                                'entities TEXT NOT NULL, '
+                                'used REAL NOT NULL)')
+        self.connection.execute('CREATE INDEX IF NOT EXISTS entities_used ON entities (used)')
+
+    @staticmethod
+    def get_key(text):
+        """Texts that differ only in unicode normalization or whitespace
+        share the same key
+        """
+        normalized = re_whitespace.sub(' ', unicodedata.normalize('NFC', text)).strip()
+        return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        with self.lock:
+            row = self.connection.execute('SELECT entities FROM entities WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                self.counter_miss += 1
+                return None
+
+            self.counter_hit += 1
+            self.connection.execute('UPDATE entities SET used = ? WHERE key = ?', (time.time(), key))
+        return json.loads(row[0])
+
+    def put(self, key, entities):
+        with self.lock:
+            self.connection.execute('INSERT OR REPLACE INTO entities (key, entities, used) VALUES (?, ?, ?)',
+                                    (key, json.dumps(entities, ensure_ascii=False), time.time()))
+            self.counter_insert += 1
+            if self.counter_insert % self.EVICTION_INTERVAL == 0:
+                self._evict()
+
+    def _evict(self):
+        count = self.connection.execute('SELECT COUNT(*) FROM entities').fetchone()[0]
+        if count > self.max_entries:
+            self.connection.execute('DELETE FROM entities WHERE key IN '
+                                    '(SELECT key FROM entities ORDER BY used LIMIT ?)',
+                                    (count - self.max_entries,))
+            LOGGER.info("Evicted %i entries from the NER cache", count - self.max_entries)
+
+    def close(self):
+        with self.lock:
+            self._evict()
+            self.connection.close()
+
+
 class NamedEntityExtractor:
+    """Adds the named entities of the title and text of an article. The
+    requests run on a thread pool of their own, so that the reactor keeps
+    crawling while up to `concurrency` requests wait for the API. The
+    options are read from the config section [NamedEntityExtractor], the
+    url may point to a local mock server for testing. If cache_pathname
+    is set, the entities of each text are cached, see NerCache.
+    """
     def __init__(self):
         with importlib.resources.path("newsplease", "prosa_creds.json") as creds_path:
             with open(creds_path, 'r') as creds:
@@ -191,19 +322,42 @@ class NamedEntityExtractor:
             **creds,
             'Content-Type': 'application/json'
         }
-    
-    def request(self, text):
-        data = {
-            "version": "v2",
-            "text": text
-        }
 
-        repsonse = requests.post("https://api.prosa.ai/v1/entities",\
-                                    headers=self.headers, data=json.dumps(data))
-        entities = repsonse.json().get("entities")
+        config = CrawlerConfig.get_instance().config().get("NamedEntityExtractor", {})
+        self.concurrency = max(int(config.get("concurrency", 10)), 1)
+        self.client = NerClient(self.headers,
+                                url=config.get("url", NER_URL),
+                                connect_timeout=config.get("connect_timeout", 5),
+                                read_timeout=config.get("read_timeout", 30),
+                                retries=config.get("retries", 3),
+                                backoff_factor=config.get("backoff_factor", 0.5),
+                                pool_size=self.concurrency)
+        self.thread_pool = ThreadPool(minthreads=0, maxthreads=self.concurrency,
+                                      name="NamedEntityExtractor")
+
+        self.cache = None
+        cache_pathname = config.get("cache_pathname")
+        if cache_pathname:
+            cache_pathname = os.path.expanduser(cache_pathname)
+            if not os.path.isabs(cache_pathname):
+                cache_pathname = os.path.join(CrawlerConfig.get_instance().get_working_path(), cache_pathname)
+            self.cache = NerCache(cache_pathname, max_entries=config.get("cache_max_entries", 1000000))
 
+    def request(self, text):
+        if self.cache is None:
+            return self.client.request(text)
+
+        key = NerCache.get_key(text)
+        entities = self.cache.get(key)
+        if entities is None:
+            entities = self.client.request(text)
+            if entities:
+                self.cache.put(key, entities)
         return entities
-    
+
+    def open_spider(self, spider):
+        self.thread_pool.start()
+
     def process_item(self, item, spider):
         article_title = item.get('article_title')
         if article_title is None:
@@ -215,15 +369,39 @@ class NamedEntityExtractor:
         
         text = article_title + article_text
 
-        entities = None
-        try:
-            entities = self.request(text)
-        except:
-            pass
+        # the reactor is only imported when it is needed, so that Scrapy can choose the reactor to install
+        from twisted.internet import reactor
+        deferred = threads.deferToThreadPool(reactor, self.thread_pool, self.request, text)
+        deferred.addCallbacks(self._on_entities, self._on_error,
+                              callbackArgs=(item,), errbackArgs=(item,))
 
+        return deferred
+
+    @staticmethod
+    def _on_entities(entities, item):
         item['entities'] = entities
-        
         return item
+
+    @staticmethod
+    def _on_error(failure, item):
+        # the item is never dropped because of the entities, it passes without them
+        if failure.check(requests.RequestException, ValueError):
+            LOGGER.warning("Named entity recognition failed for %s: %s",
+                           item.get('url'), failure.getErrorMessage())
+        else:
+            LOGGER.error("Named entity recognition failed for %s: %s",
+                         item.get('url'), failure.getTraceback())
+        item['entities'] = None
+        return item
+
+    def close_spider(self, spider):
+        self.thread_pool.stop()
+        self.client.close()
+        if self.cache is not None:
+            LOGGER.info("NER cache: %i hits, %i misses", self.cache.counter_hit, self.cache.counter_miss)
+            spider.crawler.stats.set_value('namedentityextractor/cache_hit', self.cache.counter_hit)
+            spider.crawler.stats.set_value('namedentityextractor/cache_miss', self.cache.counter_miss)
+            self.cache.close()
         
 
 class BrokenPipeline:
@@ -249,7 +427,7 @@ class CountCommentExtractor:
             count_comment = int(count_comment)
             return count_comment
 
-    def _extract_from_div(self, body):
+    def _extract_from_div(self, tree):
         count_comment = None
         possible_classes = [
             "total_comment",
@@ -257,9 +435,9 @@ class CountCommentExtractor:
         ]
 
         for class_name in possible_classes:
-            comment_div = body.xpath(f"//div[contains(@class, '{class_name}')]").extract_first()
-            if comment_div is not None:
-                comment_candidate = cleaner.delete_tags(comment_div)
+            comment_divs = tree.xpath(f"//div[contains(@class, '{class_name}')]")
+            if comment_divs:
+                comment_candidate = comment_divs[0].text_content().strip()
                 if comment_candidate:
                     count_comment = comment_candidate
                 
@@ -269,7 +447,7 @@ class CountCommentExtractor:
 
 
     def process_item(self, item, spider):
-        count_comment = self._extract_from_div(item['spider_response'])
+        count_comment = self._extract_from_div(ParsedDocument.from_item(item).tree)
         if count_comment is not None:
             count_comment = self._ensure_int(count_comment)
         
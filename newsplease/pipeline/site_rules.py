@@ -0,0 +1,159 @@
+"""
+Declarative extraction rules for sites whose article text the generic extractors miss. The rules are read from an
+hjson file (by default config/siterules.hjson) that maps registered domains to XPath or CSS selectors and
+post-processing steps, so that new sites can be added without code changes. All expressions are compiled once when
+the rules are loaded, and the rule of an url is found by looking up its host name and parent domains in a dict.
+"""
+import logging
+import os
+
+import hjson
+from lxml import etree
+from six.moves.urllib.parse import urlsplit
+
+from .extractor.cleaner import Cleaner
+
+try:
+    from lxml.cssselect import CSSSelector
+except ImportError:
+    CSSSelector = None
+
+LOGGER = logging.getLogger(__name__)
+
+DEFAULT_RULES_PATHNAME = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'config',
+                                      'siterules.hjson')
+
+cleaner = Cleaner()
+
+
+def _to_list(value):
+    """
+    Returns a list of a single value or of a list of values
+    :param value:
+    :return:
+    """
+    if value is None:
+        return []
+    if isinstance(value, (list, tuple)):
+        return list(value)
+    return [value]
+
+
+class SiteRule(object):
+    """
+    Extracts the article text of one site
+    """
+
+    def __init__(self, domain, xpath=None, css=None, clean=True, replace=None, pages=None, skip_pages=0):
+        """
+        :param domain: the registered domain of the site, e.g., kompas.com
+        :param xpath: XPath expression or list of expressions selecting the article text
+        :param css: CSS selector or list of selectors selecting the article text, tried after the XPath expressions
+        :param clean: if True, the selected html is converted to clean text
+        :param replace: list of (old, new) pairs that are replaced in the text afterwards
+        :param pages: XPath expression selecting the urls of further pages of the article
+        :param skip_pages: number of urls selected by pages that are ignored
+        """
+        if css and CSSSelector is None:
+            raise ModuleNotFoundError("Using CSS selectors in site rules requires cssselect")
+        self.domain = domain
+        self.text_selectors = [etree.XPath(expression) for expression in _to_list(xpath)] \
+            + [CSSSelector(selector) for selector in _to_list(css)]
+        self.clean = clean
+        self.replace = [tuple(pair) for pair in replace or []]
+        self.pages = etree.XPath(pages) if pages else None
+        self.skip_pages = skip_pages
+
+    @staticmethod
+    def __to_string(result):
+        """
+        Converts a result of an XPath expression to a string, elements to their html
+        :param result:
+        :return:
+        """
+        if isinstance(result, etree._Element):
+            return etree.tostring(result, encoding='unicode', method='html', with_tail=False)
+        return str(result)
+
+    def extract_text(self, tree):
+        """
+        Extracts the article text
+        :param tree: the lxml tree of the article
+        :return: The text or None if no selector selects anything
+        """
+        for selector in self.text_selectors:
+            results = selector(tree)
+            if results:
+                break
+        else:
+            return None
+
+        text = ' '.join(self.__to_string(result) for result in results)
+        if self.clean:
+            text = cleaner.do_cleaning(text)
+        for old, new in self.replace:
+            text = text.replace(old, new)
+        return text
+
+    def get_page_urls(self, tree):
+        """
+        Returns the urls of the further pages of the article, in order
+        :param tree: the lxml tree of the article
+        :return: A list of urls, possibly relative
+        """
+        if self.pages is None:
+            return []
+        return [str(url).strip() for url in self.pages(tree)][self.skip_pages:]
+
+
+class SiteRuleRegistry(object):
+    """
+    Finds the rule of an url by its host name. A rule applies to its domain and all subdomains.
+    """
+
+    def __init__(self, rules):
+        """
+        :param rules: list of SiteRules
+        """
+        self.rules = {rule.domain: rule for rule in rules}
+
+    @classmethod
+    def from_file(cls, pathname=None):
+        """
+        Loads the rules from an hjson file, which maps each domain to the keyword arguments of its SiteRule
+        :param pathname: if None, the rules of newsplease are loaded
+        :return:
+        """
+        pathname = pathname or DEFAULT_RULES_PATHNAME
+        with open(pathname, 'r', encoding='utf-8') as rules_file:
+            config = hjson.load(rules_file)
+
+        rules = []
+        for domain, options in config.items():
+            try:
+                rules.append(SiteRule(domain.lower().strip('.'), **options))
+            except (TypeError, SyntaxError) as error:
+                LOGGER.error('Misconfiguration: site rule of %s in %s will be ignored: %s', domain, pathname, error)
+        LOGGER.debug('Loaded %i site rules from %s', len(rules), pathname)
+        return cls(rules)
+
+    def get_rule(self, url):
+        """
+        Returns the rule of an url
+        :param url:
+        :return: The SiteRule or None if no rule applies
+        """
+        try:
+            hostname = urlsplit(url).hostname
+        except ValueError:
+            return None
+        if not hostname:
+            return None
+
+        # check the host name and all its parent domains, e.g., www.kompas.com, kompas.com, com
+        labels = hostname.rstrip('.').split('.')
+        for i in range(len(labels)):
+            rule = self.rules.get('.'.join(labels[i:]))
+            if rule is not None:
+                return rule
+        return None
@@ -36,19 +36,18 @@ news-please is an open source, easy-to-use news crawler that extracts structured
           'hjson>=1.5.8',
           'elasticsearch>=2.4',
           'beautifulsoup4>=4.3.2',
-          'readability-lxml>=0.6.2',
+          'readability-lxml>=0.8',
           'newspaper3k>=0.2.8',
           'langdetect>=1.0.7',
           'python-dateutil>=2.4.0',
           'plac>=0.9.6',
           'dotmap>=1.2.17',
-          'readability-lxml>=0.6.2',
+          'readability-lxml>=0.8',
           'PyDispatcher>=2.0.5',
           'warcio>=1.3.3',
           'ago>=0.0.9',
           'six>=1.10.0',
           'lxml>=3.3.5',
-          'awscli>=1.11.117',
           'hurry.filesize>=0.9',
           'bs4',
           'cchardet',
@@ -57,6 +56,15 @@ news-please is an open source, easy-to-use news crawler that extracts structured
       extras_require={
           ':sys_platform == "win32"': [
               'pywin32>=220'
+          ],
+          'async': [
+              'aiohttp>=3.7'
+          ],
+          'parquet': [
+              'pyarrow>=7.0'
+          ],
+          'zstd': [
+              'zstandard>=0.15'
           ]
       },
       entry_points={
@@ -0,0 +1,74 @@
+"""
+Local stand-in for the web servers news-please downloads from. Serves a directory over HTTP on a free port of
+localhost, including byte ranges (Range: bytes=<start>-), in a background thread.
+"""
+import functools
+import http.server
+import os
+import re
+import threading
+
+# to improve performance, regex statements are compiled only once per module
+re_range = re.compile(r'bytes=(\d+)-$')
+
+
+class RangeRequestHandler(http.server.SimpleHTTPRequestHandler):
+    """
+    Serves files like SimpleHTTPRequestHandler, and the rest of a file starting at an offset if a Range header is sent
+    """
+
+    def send_head(self):
+        match = re_range.match(self.headers.get('Range', ''))
+        if not match:
+            return super(RangeRequestHandler, self).send_head()
+
+        path = self.translate_path(self.path)
+        if not os.path.isfile(path):
+            self.send_error(404, 'File not found')
+            return None
+        size = os.path.getsize(path)
+        start = int(match.group(1))
+        if start >= size:
+            self.send_error(416, 'Range not satisfiable')
+            return None
+
+        stream = open(path, 'rb')
+        stream.seek(start)
+        self.send_response(206)
+        self.send_header('Content-Type', self.guess_type(path))
+        self.send_header('Content-Range', 'bytes %i-%i/%i' % (start, size - 1, size))
+        self.send_header('Content-Length', str(size - start))
+        self.end_headers()
+        return stream
+
+    def log_message(self, format, *args):
+        pass
+
+
+class LocalHttpServer(object):
+    """
+    Usage:
+        with LocalHttpServer(directory) as server:
+            url = server.url('article.html')
+    """
+
+    def __init__(self, directory):
+        handler = functools.partial(RangeRequestHandler, directory=directory)
+        self.server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def url(self, path):
+        """
+        Returns the url of a file of the served directory
+        :param path: path relative to the directory
+        :return:
+        """
+        return 'http://127.0.0.1:%i/%s' % (self.server.server_port, path)
@@ -0,0 +1,77 @@
+import datetime
+import gzip
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from local_http_server import LocalHttpServer
+from newsplease.crawler.commoncrawl_index import CommonCrawlNewsIndex, HttpIndexSource, LocalIndexSource, \
+    get_manifest_path
+
+MANIFESTS = {
+    (2020, 2): ['crawl-data/CC-NEWS/2020/02/CC-NEWS-20200201000000-00001.warc.gz',
+                'crawl-data/CC-NEWS/2020/02/CC-NEWS-20200215000000-00002.warc.gz'],
+    (2020, 3): ['crawl-data/CC-NEWS/2020/03/CC-NEWS-20200301000000-00003.warc.gz'],
+}
+
+
+def write_manifest(directory, year, month, warc_paths):
+    pathname = os.path.join(directory, *get_manifest_path(year, month).split('/'))
+    os.makedirs(os.path.dirname(pathname), exist_ok=True)
+    with open(pathname, 'wb') as manifest_file:
+        manifest_file.write(gzip.compress(('\n'.join(warc_paths) + '\n').encode('utf-8')))
+
+
+class CommonCrawlNewsIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.index_directory = tempfile.mkdtemp()
+        self.cache_directory = tempfile.mkdtemp()
+        for (year, month), warc_paths in MANIFESTS.items():
+            write_manifest(self.index_directory, year, month, warc_paths)
+
+    def tearDown(self):
+        shutil.rmtree(self.index_directory)
+        shutil.rmtree(self.cache_directory)
+
+    def test_lists_months_in_order(self):
+        index = CommonCrawlNewsIndex(self.index_directory)
+        warc_paths = index.get_warc_paths(datetime.datetime(2020, 1, 20), datetime.datetime(2020, 4, 5))
+        self.assertEqual(warc_paths, MANIFESTS[(2020, 2)] + MANIFESTS[(2020, 3)])
+
+    def test_missing_month_is_empty(self):
+        self.assertIsNone(LocalIndexSource(self.index_directory).fetch(2020, 4))
+        self.assertEqual(CommonCrawlNewsIndex(self.index_directory).get_month(2020, 4), [])
+
+    def test_completed_months_are_cached(self):
+        CommonCrawlNewsIndex(self.index_directory, cache_dir=self.cache_directory).get_month(2020, 2)
+        shutil.rmtree(os.path.join(self.index_directory, 'crawl-data'))
+
+        index = CommonCrawlNewsIndex(self.index_directory, cache_dir=self.cache_directory, cache_ttl=0)
+        self.assertEqual(index.get_month(2020, 2), MANIFESTS[(2020, 2)])
+
+    def test_current_month_expires(self):
+        today = datetime.datetime.today()
+        write_manifest(self.index_directory, today.year, today.month, ['first.warc.gz'])
+        index = CommonCrawlNewsIndex(self.index_directory, cache_dir=self.cache_directory, cache_ttl=60)
+        self.assertEqual(index.get_month(today.year, today.month), ['first.warc.gz'])
+
+        write_manifest(self.index_directory, today.year, today.month, ['first.warc.gz', 'second.warc.gz'])
+        self.assertEqual(index.get_month(today.year, today.month), ['first.warc.gz'])
+
+        cache_pathname = os.path.join(self.cache_directory, 'cc-news-%04d-%02d.paths' % (today.year, today.month))
+        expired = time.time() - 120
+        os.utime(cache_pathname, (expired, expired))
+        self.assertEqual(index.get_month(today.year, today.month), ['first.warc.gz', 'second.warc.gz'])
+
+    def test_http_source(self):
+        with LocalHttpServer(self.index_directory) as server:
+            index = CommonCrawlNewsIndex(HttpIndexSource(server.url(''), timeout=10))
+            self.assertEqual(index.get_month(2020, 3), MANIFESTS[(2020, 3)])
+            self.assertEqual(index.get_month(2020, 4), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,41 @@
+import unittest
+
+from newsplease.crawler.commoncrawl_statistics import ExtractionStatistics
+
+
+def metrics(warc_url, total, stage_seconds):
+    return {'warc_url': warc_url, 'passed': total, 'discarded': 0, 'error': 0, 'total': total, 'records': total,
+            'bytes': 100 * total, 'stages': {'extract': stage_seconds}}
+
+
+class ExtractionStatisticsTest(unittest.TestCase):
+
+    def test_counts_progress_within_warc_files(self):
+        statistics = ExtractionStatistics(3)
+        statistics.update(metrics('a', 2, 1.0))
+        statistics.update(metrics('b', 1, 0.5))
+        statistics.update(metrics('a', 4, 2.0))
+
+        snapshot = statistics.snapshot()
+        self.assertEqual(snapshot['warc_files_in_progress'], 2)
+        self.assertEqual(snapshot['warc_files_processed'], 0)
+        self.assertEqual(snapshot['articles_total'], 5)
+        self.assertEqual(snapshot['stage_seconds']['extract'], 2.5)
+
+    def test_completion_replaces_progress(self):
+        statistics = ExtractionStatistics(3)
+        statistics.update(metrics('a', 2, 1.0))
+        statistics.add(metrics('a', 5, 3.0))
+        # progress that arrives after the completion of its WARC file is ignored
+        statistics.update(metrics('a', 4, 2.0))
+
+        snapshot = statistics.snapshot()
+        self.assertEqual(snapshot['warc_files_in_progress'], 0)
+        self.assertEqual(snapshot['warc_files_processed'], 1)
+        self.assertEqual(snapshot['articles_total'], 5)
+        self.assertEqual(snapshot['bytes_total'], 500)
+        self.assertEqual(snapshot['stage_seconds']['extract'], 3.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+import datetime
+import os
+import shutil
+import tempfile
+import unittest
+
+from warcio.exceptions import ArchiveLoadFailed
+
+from local_http_server import LocalHttpServer
+from newsplease.crawler.commoncrawl_extractor import CommonCrawlExtractor
+from newsplease.crawler.commoncrawl_state import DEFAULT_STATE_FILENAME, ExtractionStateStore
+from warc_files import write_warc
+
+TITLE = 'City council approves new bicycle lanes along the river'
+URLS = ['http://news.example.com/2020/03/01/bicycle-lanes-%i.html' % i for i in range(3)]
+
+
+class StreamWarcTest(unittest.TestCase):
+
+    def setUp(self):
+        self.serve_directory = tempfile.mkdtemp()
+        self.download_directory = tempfile.mkdtemp()
+        self.offsets = write_warc(os.path.join(self.serve_directory, 'test.warc.gz'), URLS)
+        self.server = LocalHttpServer(self.serve_directory).__enter__()
+        self.warc_url = self.server.url('test.warc.gz')
+
+    def tearDown(self):
+        self.server.__exit__(None, None, None)
+        shutil.rmtree(self.serve_directory)
+        shutil.rmtree(self.download_directory)
+
+    def extract(self, **kwargs):
+        articles = []
+        completed = []
+        kwargs.setdefault('continue_after_error', False)
+        CommonCrawlExtractor().extract_from_commoncrawl(
+            self.warc_url, articles.append,
+            callback_on_warc_completed=lambda *counters: completed.append(counters),
+            local_download_dir_warc=self.download_directory, stream_warc=True, **kwargs)
+        return articles, completed
+
+    def state_store(self):
+        return ExtractionStateStore(os.path.join(self.download_directory, DEFAULT_STATE_FILENAME))
+
+    def assertArticles(self, articles, urls):
+        self.assertEqual([article.url for article in articles], urls)
+        for article in articles:
+            self.assertEqual(article.title, TITLE)
+
+    def test_streams_all_records(self):
+        articles, completed = self.extract()
+        self.assertArticles(articles, URLS)
+        self.assertEqual(completed, [(self.warc_url, 3, 0, 0, 3)])
+        self.assertTrue(self.state_store().is_fully_extracted(self.warc_url))
+
+    def test_resumes_at_checkpoint(self):
+        state_store = self.state_store()
+        state_store.set_record_offset(self.warc_url, self.offsets[1])
+        state_store.close()
+
+        articles, completed = self.extract()
+        self.assertArticles(articles, URLS[1:])
+        self.assertEqual(completed, [(self.warc_url, 2, 0, 0, 2)])
+
+    def test_streams_with_worker_processes(self):
+        articles, completed = self.extract(record_extraction_processes=2)
+        self.assertArticles(articles, URLS)
+        self.assertEqual(completed, [(self.warc_url, 3, 0, 0, 3)])
+
+    def test_prefilters_by_date(self):
+        for processes in (1, 2):
+            articles, completed = self.extract(start_date=datetime.datetime(2020, 2, 1),
+                                               end_date=datetime.datetime(2020, 2, 28),
+                                               record_extraction_processes=processes)
+            self.assertEqual(articles, [])
+            self.assertEqual(completed, [(self.warc_url, 0, 3, 0, 3)])
+
+            articles, completed = self.extract(start_date=datetime.datetime(2020, 2, 1),
+                                               end_date=datetime.datetime(2020, 3, 31),
+                                               record_extraction_processes=processes)
+            self.assertArticles(articles, URLS)
+
+    def test_corrupt_warc_is_not_completed(self):
+        pathname = os.path.join(self.serve_directory, 'test.warc.gz')
+        with open(pathname, 'r+b') as file:
+            file.truncate(self.offsets[2])
+            file.seek(self.offsets[2])
+            file.write(b'not a WARC record\r\n' * 10)
+
+        for processes in (1, 2):
+            articles = []
+            with self.assertRaises(ArchiveLoadFailed):
+                CommonCrawlExtractor().extract_from_commoncrawl(
+                    self.warc_url, articles.append, local_download_dir_warc=self.download_directory,
+                    stream_warc=True, continue_after_error=True, record_extraction_processes=processes)
+            self.assertArticles(articles, URLS[:2])
+            self.assertFalse(self.state_store().is_fully_extracted(self.warc_url))
+
+
+if __name__ == '__main__':
+    unittest.main()
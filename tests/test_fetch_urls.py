@@ -0,0 +1,53 @@
+import asyncio
+import os
+import unittest
+
+from local_http_server import LocalHttpServer
+from newsplease import NewsPlease
+from newsplease.crawler import async_crawler
+
+FIXTURES_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+TITLE = 'City council approves new bicycle lanes along the river'
+
+
+class FetchUrlsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = LocalHttpServer(FIXTURES_DIRECTORY).__enter__()
+        self.urls = [self.server.url('article.html'), self.server.url('article.html?page=2')]
+        self.missing_url = self.server.url('missing.html')
+
+    def tearDown(self):
+        self.server.__exit__(None, None, None)
+
+    def assertArticles(self, articles):
+        self.assertEqual(set(articles), set(self.urls + [self.missing_url]))
+        for url in self.urls:
+            self.assertIsNotNone(articles[url], url)
+            self.assertEqual(articles[url].title, TITLE)
+            self.assertIn('twelve kilometres', articles[url].maintext)
+        self.assertIsNone(articles[self.missing_url])
+
+    def test_from_urls(self):
+        self.assertArticles(NewsPlease.from_urls(self.urls + [self.missing_url], timeout=10))
+
+    def test_from_url(self):
+        self.assertEqual(NewsPlease.from_url(self.urls[0], timeout=10).title, TITLE)
+
+    @unittest.skipIf(async_crawler.aiohttp is None, 'requires aiohttp')
+    def test_from_urls_concurrency(self):
+        self.assertArticles(NewsPlease.from_urls(self.urls + [self.missing_url], timeout=10, concurrency=2))
+
+    @unittest.skipIf(async_crawler.aiohttp is None, 'requires aiohttp')
+    def test_from_urls_async(self):
+        articles = asyncio.run(NewsPlease.from_urls_async(self.urls + [self.missing_url], timeout=10))
+        self.assertArticles(articles)
+
+    def test_iter_urls(self):
+        articles = dict(NewsPlease.iter_urls(self.urls + [self.missing_url], timeout=10, download_workers=2,
+                                             extraction_processes=1))
+        self.assertArticles(articles)
+
+
+if __name__ == '__main__':
+    unittest.main()
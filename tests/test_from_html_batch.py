@@ -0,0 +1,37 @@
+import os
+import unittest
+
+from newsplease import NewsPlease
+
+FIXTURE_PATHNAME = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'article.html')
+URL = 'https://www.example.com/local/2020/03/01/bicycle-lanes.html'
+
+
+class FromHtmlBatchTest(unittest.TestCase):
+
+    def setUp(self):
+        with open(FIXTURE_PATHNAME, encoding='utf-8') as fixture:
+            self.html = fixture.read()
+
+    def test_extracts_article(self):
+        articles = list(NewsPlease.from_html_batch([(self.html, URL, '2020-03-02 08:00:00')], processes=1))
+
+        self.assertEqual(len(articles), 1)
+        article = articles[0]
+        self.assertIsNotNone(article)
+        self.assertEqual(article.url, URL)
+        self.assertIn('bicycle lanes', article.title)
+        self.assertIn('twelve kilometres', article.maintext)
+        self.assertIsNone(article.entities)
+        self.assertIsNone(article.count_comment)
+
+    def test_document_without_html_yields_none(self):
+        articles = list(NewsPlease.from_html_batch([(None, URL, None), (self.html, URL, None)], processes=1))
+
+        self.assertIsNone(articles[0])
+        self.assertIsNotNone(articles[1])
+        self.assertEqual(articles[1].url, URL)
+
+
+if __name__ == '__main__':
+    unittest.main()
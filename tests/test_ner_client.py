@@ -0,0 +1,108 @@
+import http.server
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+import requests
+
+from newsplease.pipeline.pitech import NerCache, NerClient
+
+ENTITIES = [{'entity': 'Jakarta', 'label': 'LOCATION'}]
+
+
+class MockNerHandler(http.server.BaseHTTPRequestHandler):
+    """
+    Answers each POST with the next of the server's responses, the last one is repeated
+    """
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        self.server.requests.append((dict(self.headers), body))
+        status, response = self.server.responses[min(len(self.server.requests), len(self.server.responses)) - 1]
+        content = json.dumps(response).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class NerClientTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), MockNerHandler)
+        self.server.requests = []
+        self.server.responses = [(200, {'entities': ENTITIES})]
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.client = NerClient({'x-api-key': 'secret', 'Content-Type': 'application/json'},
+                                url='http://127.0.0.1:%i/v1/entities' % self.server.server_port,
+                                connect_timeout=5, read_timeout=5, retries=2, backoff_factor=0)
+
+    def tearDown(self):
+        self.client.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_request(self):
+        self.assertEqual(self.client.request('Banjir di Jakarta'), ENTITIES)
+        headers, body = self.server.requests[0]
+        self.assertEqual(headers['x-api-key'], 'secret')
+        self.assertEqual(body, {'version': 'v2', 'text': 'Banjir di Jakarta'})
+
+    def test_retries_unavailable_api(self):
+        self.server.responses = [(503, {}), (429, {}), (200, {'entities': ENTITIES})]
+        self.assertEqual(self.client.request('Banjir di Jakarta'), ENTITIES)
+        self.assertEqual(len(self.server.requests), 3)
+
+    def test_gives_up_after_retries(self):
+        self.server.responses = [(503, {})]
+        with self.assertRaises(requests.HTTPError):
+            self.client.request('Banjir di Jakarta')
+        self.assertEqual(len(self.server.requests), 3)
+
+    def test_client_error_is_not_retried(self):
+        self.server.responses = [(400, {'error': 'bad request'})]
+        with self.assertRaises(requests.HTTPError):
+            self.client.request('Banjir di Jakarta')
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_unexpected_response(self):
+        self.server.responses = [(200, ['not', 'a', 'dict'])]
+        with self.assertRaises(ValueError):
+            self.client.request('Banjir di Jakarta')
+
+
+class NerCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache = NerCache(os.path.join(self.directory, 'ner.sqlite'), max_entries=2)
+
+    def tearDown(self):
+        self.cache.close()
+        shutil.rmtree(self.directory)
+
+    def test_normalized_texts_share_entries(self):
+        self.assertEqual(NerCache.get_key('Banjir  di\nJakarta '), NerCache.get_key('Banjir di Jakarta'))
+        self.cache.put(NerCache.get_key('Banjir di Jakarta'), ENTITIES)
+        self.assertEqual(self.cache.get(NerCache.get_key('Banjir  di\nJakarta')), ENTITIES)
+        self.assertIsNone(self.cache.get(NerCache.get_key('Gempa di Bandung')))
+        self.assertEqual((self.cache.counter_hit, self.cache.counter_miss), (1, 1))
+
+    def test_evicts_least_recently_used(self):
+        for text in ('a', 'b', 'c'):
+            self.cache.put(NerCache.get_key(text), ENTITIES)
+        self.cache.get(NerCache.get_key('a'))
+        self.cache._evict()
+        self.assertIsNotNone(self.cache.get(NerCache.get_key('a')))
+        self.assertIsNone(self.cache.get(NerCache.get_key('b')))
+
+
+if __name__ == '__main__':
+    unittest.main()
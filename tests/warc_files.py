@@ -0,0 +1,31 @@
+import io
+import os
+
+from warcio.statusandheaders import StatusAndHeaders
+from warcio.warcwriter import WARCWriter
+
+FIXTURES_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+
+def write_warc(pathname, urls, warc_date='2020-03-02T08:00:00Z'):
+    """
+    Writes a gzipped WARC file that contains one response record with the fixture article per url
+    :param pathname:
+    :param urls:
+    :param warc_date:
+    :return: list of the offsets of the records within the file
+    """
+    with open(os.path.join(FIXTURES_DIRECTORY, 'article.html'), 'rb') as file:
+        html = file.read()
+
+    offsets = []
+    with open(pathname, 'wb') as output:
+        writer = WARCWriter(output, gzip=True)
+        for url in urls:
+            offsets.append(output.tell())
+            http_headers = StatusAndHeaders('200 OK', [('Content-Type', 'text/html; charset=utf-8')],
+                                            protocol='HTTP/1.1')
+            record = writer.create_warc_record(url, 'response', payload=io.BytesIO(html), http_headers=http_headers,
+                                               warc_headers_dict={'WARC-Date': warc_date})
+            writer.write_record(record)
+    return offsets